@@ -0,0 +1,80 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from history import to_iso
+from protocol import FrameDecoder, encode_frame
+
+def _messages(n: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    t = 1700000000.0
+    out = []
+    for _ in range(n):
+        t += rng.random()
+        nid = rng.randrange(100)
+        out.append(
+            {
+                "ts": t,
+                "node": nid,
+                "name": f"node-{nid}",
+                "ip": f"10.0.0.{10 + nid}",
+                "value": rng.uniform(0.0, 100.0),
+                "spike": 1 if rng.random() < 0.1 else 0,
+                "suppressed_total": rng.randrange(1000),
+            }
+        )
+    return out
+
+def _rate(n: int, dt: float) -> float:
+    return n / dt if dt > 0 else 0.0
+
+def run(n: int, seed: int) -> List[Dict[str, Any]]:
+    msgs = _messages(n, seed)
+    rows = []
+    t0 = time.perf_counter()
+    lines = []
+    for m in msgs:
+        obj = dict(m, ts=to_iso(m["ts"]))
+        lines.append((json.dumps(obj) + "\n").encode("utf-8"))
+    dt = time.perf_counter() - t0
+    size = sum(len(x) for x in lines)
+    rows.append({"bench": "codec", "proto": "json", "op": "encode", "messages": n, "msgs_per_s": _rate(n, dt), "bytes_per_msg": size / n})
+    t0 = time.perf_counter()
+    for raw in lines:
+        json.loads(raw.decode("utf-8").strip())
+    dt = time.perf_counter() - t0
+    rows.append({"bench": "codec", "proto": "json", "op": "decode", "messages": n, "msgs_per_s": _rate(n, dt)})
+    t0 = time.perf_counter()
+    frames = [encode_frame(m["node"], m["ts"], m["value"], m["spike"] == 1, m["suppressed_total"]) for m in msgs]
+    dt = time.perf_counter() - t0
+    size = sum(len(x) for x in frames)
+    rows.append({"bench": "codec", "proto": "bin", "op": "encode", "messages": n, "msgs_per_s": _rate(n, dt), "bytes_per_msg": size / n})
+    blob = b"".join(frames)
+    dec = FrameDecoder("node", "10.0.0.1")
+    t0 = time.perf_counter()
+    decoded = dec.feed(blob)
+    dt = time.perf_counter() - t0
+    rows.append({"bench": "codec", "proto": "bin", "op": "decode", "messages": len(decoded), "msgs_per_s": _rate(len(decoded), dt)})
+    return rows
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--messages", type=int, default=100000)
+    p.add_argument("--seed", type=int, default=0)
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    for row in run(args.messages, args.seed):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from queue import Queue
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from collisions import TxEntry, TxIndex
+from gateway import Gateway
+from inhibition import InhibitionState
+from phy import SPREADING_FACTORS, PhyModel
+
+def _arrivals(n: int, inflight: int, airtime: float, seed: int) -> List[tuple[int, float]]:
+    rng = random.Random(seed)
+    n_nodes = max(64, 2 * inflight)
+    dt = airtime / max(1, inflight)
+    t = 1000.0
+    out = []
+    for _ in range(n):
+        t += rng.expovariate(1.0 / dt)
+        out.append((rng.randrange(n_nodes), t))
+    return out
+
+def _legacy(arrivals, airtime: float, retention: float) -> tuple[int, int]:
+    recent: List[Dict[str, Any]] = []
+    collided = 0
+    pairwise = 0
+    for node, start in arrivals:
+        end = start + airtime
+        new_entry = {"node": node, "start": start, "end": end, "is_tx": True, "collided": False}
+        overlaps = []
+        for ent in recent:
+            if not ent.get("is_tx", False):
+                continue
+            if ent.get("node") == node:
+                continue
+            s = float(ent.get("start", 0.0))
+            e = float(ent.get("end", 0.0))
+            if e <= start or s >= end:
+                continue
+            overlaps.append(ent)
+        if overlaps:
+            pairwise += len(overlaps)
+            for ent in overlaps:
+                if not ent["collided"]:
+                    ent["collided"] = True
+                    collided += 1
+            new_entry["collided"] = True
+            collided += 1
+        recent.append(new_entry)
+        cutoff = start - retention
+        recent = [t for t in recent if float(t.get("end", 0.0)) >= cutoff]
+    return collided, pairwise
+
+def _indexed(arrivals, airtime: float, retention: float) -> tuple[int, int]:
+    index = TxIndex()
+    collided = 0
+    pairwise = 0
+    for node, start in arrivals:
+        end = start + airtime
+        new_entry = TxEntry(node, start, end)
+        overlaps = index.overlapping(start, end, exclude_node=node)
+        if overlaps:
+            pairwise += len(overlaps)
+            for ent in overlaps:
+                if not ent.collided:
+                    ent.collided = True
+                    collided += 1
+            new_entry.collided = True
+            collided += 1
+        index.add(new_entry)
+        index.expire(start - retention)
+    return collided, pairwise
+
+def _gateway(arrivals, mode: str, spike_p: float, seed: int, channels: int = 0) -> tuple[float, int]:
+    clock = [0.0]
+    phy = None
+    if channels:
+        nodes = {node for node, _ in arrivals}
+        phy = PhyModel(
+            assignments={
+                n: (n % channels, SPREADING_FACTORS[(n // channels) % len(SPREADING_FACTORS)]) for n in nodes
+            }
+        )
+    gw = Gateway(
+        inq=Queue(),
+        inhibition=InhibitionState(clock=lambda: clock[0]),
+        collision_mode=mode,
+        clock=lambda: clock[0],
+        phy=phy,
+    )
+    rng = random.Random(seed)
+    msgs = [
+        {"ts": "", "node": node, "value": 0.0, "spike": 1 if rng.random() < spike_p else 0, "suppressed_total": 0}
+        for node, _ in arrivals
+    ]
+    t0 = time.perf_counter()
+    for msg, (_, start) in zip(msgs, arrivals):
+        clock[0] = start
+        gw._process_message(msg)
+    return time.perf_counter() - t0, gw._total_collided_messages
+
+def run(
+    inflight_counts: List[int],
+    messages: int,
+    seed: int,
+    legacy_max_s: float,
+    modes: tuple[str, ...] = ("all", "spikes"),
+    spike_p: float = 0.2,
+    channels: int = 3,
+) -> List[Dict[str, Any]]:
+    probe = Gateway(inq=Queue(), inhibition=InhibitionState())
+    airtime = probe._lorawan_airtime(probe.payload_bytes)
+    retention = max(probe.min_retention_s, airtime * probe.retention_multiplier)
+    results = []
+    legacy_ok = True
+    for inflight in inflight_counts:
+        arrivals = _arrivals(messages, inflight, airtime, seed)
+        row: Dict[str, Any] = {"bench": "collisions", "inflight": inflight, "messages": messages}
+        t0 = time.perf_counter()
+        counts = _indexed(arrivals, airtime, retention)
+        dt = time.perf_counter() - t0
+        row["indexed_msgs_per_s"] = messages / dt
+        row["collided"], row["pairwise"] = counts
+        if legacy_ok:
+            t0 = time.perf_counter()
+            legacy_counts = _legacy(arrivals, airtime, retention)
+            dt = time.perf_counter() - t0
+            row["legacy_msgs_per_s"] = messages / dt
+            row["speedup"] = row["indexed_msgs_per_s"] / row["legacy_msgs_per_s"]
+            row["counts_match"] = legacy_counts == counts
+            legacy_ok = dt < legacy_max_s
+        for mode in modes:
+            row[f"gateway_{mode}_msgs_per_s"] = messages / _gateway(arrivals, mode, spike_p, seed)[0]
+        if channels:
+            dt, collided = _gateway(arrivals, "all", spike_p, seed, channels)
+            row["mixed_buckets"] = channels * len(SPREADING_FACTORS)
+            row["gateway_mixed_msgs_per_s"] = messages / dt
+            row["mixed_collided"] = collided
+        results.append(row)
+    return results
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--inflight", type=str, default="1,10,100,1000")
+    p.add_argument("--messages", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--legacy-max-s", type=float, default=30.0)
+    p.add_argument("--modes", type=str, default="all,spikes")
+    p.add_argument("--spike-p", type=float, default=0.2)
+    p.add_argument("--channels", type=int, default=3)
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    counts = [int(x) for x in args.inflight.split(",") if x]
+    modes = tuple(x for x in args.modes.split(",") if x)
+    for row in run(counts, args.messages, args.seed, args.legacy_max_s, modes, args.spike_p, args.channels):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from history import to_iso
+from protocol import PROTO_BIN, PROTO_JSON, encode_frame, hello
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"port {port} did not open")
+
+def fetch_metrics(port: int) -> Dict[str, Any]:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=30) as r:
+        return json.load(r)
+
+def load(host: str, port: int, ids: List[int], duration_s: float, batch: int, spike_p: float, seed: int, proto: str = PROTO_BIN) -> None:
+    rng = random.Random(seed)
+    socks = []
+    for nid in ids:
+        s = socket.create_connection((host, port))
+        if proto == PROTO_BIN:
+            s.sendall(hello(nid, f"node-{nid}", f"10.0.{nid // 250}.{nid % 250}", PROTO_BIN))
+            s.recv(4096)
+        socks.append((nid, s))
+    deadline = time.time() + duration_s
+    while time.time() < deadline:
+        for nid, s in socks:
+            now = time.time()
+            if proto == PROTO_BIN:
+                data = b"".join(
+                    encode_frame(nid, now, rng.random(), rng.random() < spike_p, 0) for _ in range(batch)
+                )
+            else:
+                ts = to_iso(now)
+                data = "".join(
+                    json.dumps(
+                        {
+                            "ts": ts,
+                            "node": nid,
+                            "name": f"node-{nid}",
+                            "value": rng.random(),
+                            "spike": 1 if rng.random() < spike_p else 0,
+                            "suppressed_total": 0,
+                        }
+                    )
+                    + "\n"
+                    for _ in range(batch)
+                ).encode("utf-8")
+            try:
+                s.sendall(data)
+            except OSError:
+                return
+    for _, s in socks:
+        s.close()
+
+def measure(gateway_args: List[str], args: argparse.Namespace, proto: str) -> Dict[str, Any]:
+    port = free_port()
+    dash_port = free_port()
+    cmd = [
+        sys.executable,
+        str(ROOT / "run.py"),
+        "--listen-host", "127.0.0.1",
+        "--listen-port", str(port),
+        "--dashboard-port", str(dash_port),
+    ] + gateway_args
+    gw = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_port(port)
+        wait_port(dash_port)
+        ids = list(range(args.nodes))
+        loaders = [
+            multiprocessing.Process(
+                target=load,
+                args=("127.0.0.1", port, ids[i :: args.loaders], args.warmup_s + args.duration_s, args.frames, args.spike_p, i, proto),
+            )
+            for i in range(args.loaders)
+        ]
+        for p in loaders:
+            p.start()
+        time.sleep(args.warmup_s)
+        m0 = fetch_metrics(dash_port)
+        t0 = time.time()
+        time.sleep(args.duration_s)
+        m1 = fetch_metrics(dash_port)
+        dt = time.time() - t0
+        for p in loaders:
+            p.join(timeout=args.duration_s + 10)
+            if p.is_alive():
+                p.terminate()
+        return {
+            "msgs_per_s": (m1["total_messages"] - m0["total_messages"]) / dt,
+            "fires": m1["aggregator"]["fires"],
+            "metrics": m1,
+        }
+    finally:
+        gw.terminate()
+        try:
+            gw.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            gw.kill()
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    rows = []
+    for transport in [x for x in args.transports.split(",") if x]:
+        for proto in [x for x in args.protos.split(",") if x]:
+            res = measure(["--transport", transport, "--batch-max", str(args.batch_max)], args, proto)
+            rows.append(
+                {
+                    "bench": "e2e",
+                    "transport": transport,
+                    "proto": proto,
+                    "nodes": args.nodes,
+                    "loaders": args.loaders,
+                    "msgs_per_s": res["msgs_per_s"],
+                    "fires": res["fires"],
+                }
+            )
+    return rows
+
+def add_load_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("--nodes", type=int, default=16)
+    p.add_argument("--loaders", type=int, default=2)
+    p.add_argument("--frames", type=int, default=64)
+    p.add_argument("--spike-p", type=float, default=0.05)
+    p.add_argument("--duration-s", type=float, default=5.0)
+    p.add_argument("--warmup-s", type=float, default=1.0)
+    p.add_argument("--batch-max", type=int, default=256)
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--transports", type=str, default="threads,asyncio")
+    p.add_argument("--protos", type=str, default=f"{PROTO_JSON},{PROTO_BIN}")
+    add_load_args(p)
+    return p.parse_args(argv)
+
+def main() -> None:
+    for row in run(parse_args()):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from lif import LIFAggregator, LIFPopulation, LIFSensor, np
+
+def _inputs(n: int, seed: int) -> List[float]:
+    rng = random.Random(seed)
+    return [rng.uniform(0.0, 10.0) for _ in range(n)]
+
+def _sensor(steps: int, seed: int) -> float:
+    lif = LIFSensor(leak=0.99, theta=50.0, refractory=1)
+    inputs = _inputs(steps, seed)
+    step = lif.step
+    t0 = time.perf_counter()
+    for i, x in enumerate(inputs):
+        step(x, 2.0 if i & 64 else 1.0)
+    return time.perf_counter() - t0
+
+def _aggregator(steps: int, seed: int) -> float:
+    agg = LIFAggregator(leak=0.995, theta=10.0)
+    rng = random.Random(seed)
+    inputs = [1.0 if rng.random() < 0.3 else 0.0 for _ in range(steps)]
+    step = agg.step
+    t0 = time.perf_counter()
+    for x in inputs:
+        step(x)
+    return time.perf_counter() - t0
+
+def _population(n: int, steps: int, seed: int) -> float:
+    pop = LIFPopulation(n, leak=0.99, theta=50.0, refractory=1)
+    rng = np.random.default_rng(seed)
+    inputs = rng.uniform(0.0, 10.0, size=(steps, n))
+    t0 = time.perf_counter()
+    for i in range(steps):
+        pop.step(inputs[i], 2.0 if i & 64 else 1.0)
+    return time.perf_counter() - t0
+
+def run(steps: int, population: List[int], seed: int) -> List[Dict[str, Any]]:
+    rows = []
+    dt = _sensor(steps, seed)
+    rows.append({"bench": "lif", "target": "LIFSensor.step", "steps": steps, "steps_per_s": steps / dt})
+    dt = _aggregator(steps, seed)
+    rows.append({"bench": "lif", "target": "LIFAggregator.step", "steps": steps, "steps_per_s": steps / dt})
+    if np is not None:
+        for n in population:
+            pop_steps = max(100, steps // max(1, n))
+            dt = _population(n, pop_steps, seed)
+            rows.append(
+                {
+                    "bench": "lif",
+                    "target": "LIFPopulation.step",
+                    "neurons": n,
+                    "steps": pop_steps,
+                    "steps_per_s": pop_steps / dt,
+                    "neuron_steps_per_s": n * pop_steps / dt,
+                }
+            )
+    return rows
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--steps", type=int, default=500000)
+    p.add_argument("--population", type=str, default="100,10000")
+    p.add_argument("--seed", type=int, default=0)
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    sizes = [int(x) for x in args.population.split(",") if x]
+    for row in run(args.steps, sizes, args.seed):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_e2e import add_load_args, measure
+from protocol import PROTO_BIN
+
+def run_one(shards: int, args: argparse.Namespace) -> Dict[str, Any]:
+    gateway_args = [
+        "--shards", str(shards),
+        "--batch-max", str(args.batch_max),
+        "--history-capacity", str(args.history_capacity),
+    ]
+    res = measure(gateway_args, args, PROTO_BIN)
+    return {
+        "bench": "sharded",
+        "shards": shards,
+        "nodes": args.nodes,
+        "loaders": args.loaders,
+        "msgs_per_s": res["msgs_per_s"],
+        "fires": res["fires"],
+        "shards_reporting": res["metrics"].get("shards_reporting", 1),
+    }
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    if args.shards:
+        counts = [int(x) for x in args.shards.split(",") if x]
+    else:
+        counts = list(range(1, (os.cpu_count() or 1) + 1))
+    return [run_one(shards, args) for shards in counts]
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--shards", type=str, default="")
+    p.add_argument("--history-capacity", type=int, default=5000)
+    add_load_args(p)
+    p.set_defaults(nodes=64)
+    return p.parse_args(argv)
+
+def main() -> None:
+    for row in run(parse_args()):
+        print(json.dumps(row), flush=True)
+
+if __name__ == "__main__":
+    main()
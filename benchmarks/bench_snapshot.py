@@ -0,0 +1,92 @@
+from __future__ import annotations
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+from queue import Queue
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from gateway import Gateway
+from inhibition import InhibitionState, VirtualClock
+
+def run(fill: List[int], nodes: int, capacity: int, repeats: int, seed: int, points: int = 500) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    clock = VirtualClock(1700000000.0)
+    gw = Gateway(
+        inq=Queue(),
+        inhibition=InhibitionState(clock=clock),
+        max_recent=capacity,
+        clock=clock,
+    )
+    rows = []
+    done = 0
+    for target in sorted(fill):
+        while done < target:
+            clock.now += 0.01
+            gw._process_message(
+                {
+                    "ts": clock.now,
+                    "node": rng.randrange(nodes),
+                    "value": rng.random(),
+                    "spike": 1 if rng.random() < 0.1 else 0,
+                    "suppressed_total": 0,
+                }
+            )
+            done += 1
+        samples = []
+        encoded = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            m = gw.snapshot_metrics()
+            t1 = time.perf_counter()
+            size = len(json.dumps(m))
+            samples.append(t1 - t0)
+            encoded.append(time.perf_counter() - t0)
+        samples.sort()
+        encoded.sort()
+        ds = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            ds_size = len(json.dumps(gw.snapshot_metrics(points=points)))
+            ds.append(time.perf_counter() - t0)
+        ds.sort()
+        rows.append(
+            {
+                "bench": "snapshot",
+                "messages": done,
+                "history": min(done, capacity),
+                "nodes": nodes,
+                "p50_ms": 1000.0 * samples[len(samples) // 2],
+                "max_ms": 1000.0 * samples[-1],
+                "encoded_p50_ms": 1000.0 * encoded[len(encoded) // 2],
+                "encoded_bytes": size,
+                "downsampled_points": points,
+                "downsampled_encoded_p50_ms": 1000.0 * ds[len(ds) // 2],
+                "downsampled_bytes": ds_size,
+            }
+        )
+    return rows
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--fill", type=str, default="100,1000,5000,20000")
+    p.add_argument("--nodes", type=int, default=50)
+    p.add_argument("--capacity", type=int, default=5000)
+    p.add_argument("--repeats", type=int, default=20)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--points", type=int, default=500)
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    fill = [int(x) for x in args.fill.split(",") if x]
+    for row in run(fill, args.nodes, args.capacity, args.repeats, args.seed, args.points):
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import bench_codec
+import bench_collisions
+import bench_e2e
+import bench_lif
+import bench_snapshot
+
+def _git_rev() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10)
+        return out.stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def suites(quick: bool) -> Dict[str, Callable[[], List[Dict[str, Any]]]]:
+    scale = 10 if quick else 1
+    e2e_argv = ["--duration-s", "2" if quick else "5"]
+    return {
+        "lif": lambda: bench_lif.run(500000 // scale, [100, 10000], 0),
+        "collisions": lambda: bench_collisions.run([1, 10, 100, 1000], 20000 // scale, 0, 30.0),
+        "snapshot": lambda: bench_snapshot.run([100, 1000, 5000, 20000], 50, 5000, 20 // (2 if quick else 1), 0),
+        "codec": lambda: bench_codec.run(100000 // scale, 0),
+        "e2e": lambda: bench_e2e.run(bench_e2e.parse_args(e2e_argv)),
+    }
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--only", type=str, default="")
+    p.add_argument("--skip", type=str, default="")
+    p.add_argument("--quick", action="store_true")
+    p.add_argument("--out", type=str, default="")
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    only = {x for x in args.only.split(",") if x}
+    skip = {x for x in args.skip.split(",") if x}
+    results: List[Dict[str, Any]] = []
+    durations: Dict[str, float] = {}
+    for name, fn in suites(args.quick).items():
+        if (only and name not in only) or name in skip:
+            continue
+        t0 = time.perf_counter()
+        rows = fn()
+        durations[name] = time.perf_counter() - t0
+        results.extend(rows)
+        print(f"bench: {name} done in {durations[name]:.1f}s", file=sys.stderr)
+    report = {
+        "meta": {
+            "time": time.time(),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "suite_s": durations,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+from bisect import insort
+from collections import deque
+from typing import Dict, Hashable, Iterator, List, Optional
+
+class TxEntry:
+    __slots__ = ("node", "start", "end", "collided", "ref")
+
+    def __init__(self, node: int, start: float, end: float, collided: bool = False, ref: int = -1) -> None:
+        self.node = node
+        self.start = start
+        self.end = end
+        self.collided = collided
+        self.ref = ref
+
+class TxIndex:
+    def __init__(self) -> None:
+        self._by_end: deque[TxEntry] = deque()
+
+    def __len__(self) -> int:
+        return len(self._by_end)
+
+    def __iter__(self) -> Iterator[TxEntry]:
+        return iter(self._by_end)
+
+    def add(self, entry: TxEntry) -> None:
+        q = self._by_end
+        if not q or entry.end >= q[-1].end:
+            q.append(entry)
+        else:
+            insort(q, entry, key=lambda e: e.end)
+
+    def overlapping(self, start: float, end: float, exclude_node: Optional[int] = None) -> List[TxEntry]:
+        out: List[TxEntry] = []
+        for ent in reversed(self._by_end):
+            if ent.end <= start:
+                break
+            if ent.start >= end or ent.node == exclude_node:
+                continue
+            out.append(ent)
+        return out
+
+    def expire(self, cutoff: float) -> int:
+        q = self._by_end
+        n = 0
+        while q and q[0].end < cutoff:
+            q.popleft()
+            n += 1
+        return n
+
+    def clear(self) -> None:
+        self._by_end.clear()
+
+class BucketedTxIndex:
+    def __init__(self) -> None:
+        self._buckets: Dict[Hashable, TxIndex] = {}
+
+    def __len__(self) -> int:
+        return sum(len(idx) for idx in self._buckets.values())
+
+    def __iter__(self) -> Iterator[TxEntry]:
+        for idx in list(self._buckets.values()):
+            yield from idx
+
+    def bucket(self, key: Hashable) -> TxIndex:
+        idx = self._buckets.get(key)
+        if idx is None:
+            idx = self._buckets[key] = TxIndex()
+        return idx
+
+    def buckets(self) -> Dict[Hashable, int]:
+        return {key: len(idx) for key, idx in self._buckets.items()}
+
+    def expire(self, cutoff: float) -> int:
+        return sum(idx.expire(cutoff) for idx in self._buckets.values())
+
+    def clear(self) -> None:
+        self._buckets.clear()
@@ -1,7 +1,15 @@
 from __future__ import annotations
+import gzip
+import hashlib
 import json
-from wsgiref.simple_server import make_server
-from typing import Callable
+import time
+from socketserver import ThreadingMixIn
+from threading import Event, Lock
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, make_server
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from downsample import METHODS
+from promstats import Histogram
 
 HTML = """
 <!doctype html>
@@ -153,24 +161,32 @@ let rateChart;
 let selectedNodes={};
 let rateHistory=[];
 let fetchTimer=null;
+let stream=null;
+let streamOk=false;
+let renderPending=false;
+const POLL_POINTS=600;
+const MAX_LIVE_POINTS=20000;
+const live={seq:0,capacity:5000,series:{},order:[],summary:{},counters:{}};
 function initCharts(){
 const tsCtx=document.getElementById("tsChart").getContext("2d");
 const enCtx=document.getElementById("energyChart").getContext("2d");
 const colCtx=document.getElementById("collisionChart").getContext("2d");
 const rateCtx=document.getElementById("rateChart").getContext("2d");
-tsChart=new Chart(tsCtx,{type:"line",data:{labels:[],datasets:[]},options:{responsive:true,maintainAspectRatio:false,plugins:{legend:{display:true,position:"top",labels:{font:{size:11}}}},scales:{x:{ticks:{maxRotation:0,font:{size:10}}},y:{ticks:{font:{size:10}}}}}});
+tsChart=new Chart(tsCtx,{type:"line",data:{datasets:[]},options:{responsive:true,maintainAspectRatio:false,animation:false,plugins:{legend:{display:true,position:"top",labels:{font:{size:11}}}},scales:{x:{type:"linear",ticks:{maxRotation:0,font:{size:10},callback:function(v){return formatTime(v)}}},y:{ticks:{font:{size:10}}}}}});
 energyChart=new Chart(enCtx,{type:"bar",data:{labels:[],datasets:[{label:"Energy (J)",data:[]}]},options:{responsive:true,maintainAspectRatio:false,plugins:{legend:{display:false}},scales:{x:{ticks:{font:{size:10}}},y:{ticks:{font:{size:10}},beginAtZero:true}}}});
 collisionChart=new Chart(colCtx,{type:"bar",data:{labels:[],datasets:[{label:"Overlapping TX",data:[]}]},options:{responsive:true,maintainAspectRatio:false,plugins:{legend:{display:false}},scales:{x:{ticks:{font:{size:10}}},y:{ticks:{font:{size:10}},beginAtZero:true,precision:0}}}});
 rateChart=new Chart(rateCtx,{type:"line",data:{labels:[],datasets:[{label:"msg/s",data:[]}]},options:{responsive:true,maintainAspectRatio:false,plugins:{legend:{display:false}},scales:{x:{ticks:{maxRotation:0,font:{size:10}}},y:{ticks:{font:{size:10}},beginAtZero:true}}}});
 }
 function formatTime(ts){
 if(!ts)return"";
-const d=new Date(ts);
+const d=typeof ts==="number"?new Date(ts*1000):new Date(ts);
 return d.toLocaleTimeString("en-GB",{hour12:false});
 }
 function buildNodeList(nodes){
 const ids=Object.keys(nodes).sort(function(a,b){return Number(a)-Number(b)});
 const container=document.getElementById("nodeList");
+if(container.dataset.ids===ids.join(","))return;
+container.dataset.ids=ids.join(",");
 container.innerHTML="";
 let selected=0;
 ids.forEach(function(id){
@@ -181,31 +197,48 @@ span.textContent="Node "+id;
 span.onclick=function(){
 selectedNodes[id]=!selectedNodes[id];
 if(selectedNodes[id])span.classList.add("active");else span.classList.remove("active");
+updateNodeMeta(ids);
+scheduleRender();
 };
 container.appendChild(span);
 if(selectedNodes[id])selected+=1;
 });
+updateNodeMeta(ids);
+}
+function updateNodeMeta(ids){
+const selected=ids.filter(function(id){return selectedNodes[id]}).length;
 document.getElementById("nodeMeta").textContent="selected: "+selected+"/"+ids.length;
 }
-function updateCharts(metrics){
-const ts=metrics.timestamps||[];
+function seriesFromSnapshot(metrics){
 const nodes=metrics.nodes||{};
-buildNodeList(nodes);
+const series={};
+Object.keys(nodes).forEach(function(id){
+const ts=nodes[id].ts||metrics.timestamps||[];
+const vals=nodes[id].values||[];
+const pts=[];
+for(let i=0;i<vals.length;i++){
+if(vals[i]===null||vals[i]===undefined)continue;
+pts.push({x:ts[i],y:vals[i]});
+}
+series[id]=pts;
+});
+return series;
+}
+function renderSeries(series){
+buildNodeList(series);
 const datasets=[];
 let globalMin=null;
 let globalMax=null;
-Object.keys(nodes).forEach(function(id){
+Object.keys(series).forEach(function(id){
 if(!selectedNodes[id])return;
-const vals=nodes[id].values||[];
-datasets.push({label:"Node "+id,data:vals,borderWidth:1,pointRadius:0.5});
-for(let i=0;i<vals.length;i++){
-const v=vals[i];
-if(v===null||v===undefined)continue;
+const pts=series[id];
+datasets.push({label:"Node "+id,data:pts,borderWidth:1,pointRadius:0.5});
+for(let i=0;i<pts.length;i++){
+const v=pts[i].y;
 if(globalMin===null||v<globalMin)globalMin=v;
 if(globalMax===null||v>globalMax)globalMax=v;
 }
 });
-tsChart.data.labels=ts.map(formatTime);
 tsChart.data.datasets=datasets;
 if(globalMin!==null&&globalMax!==null){
 if(globalMin===globalMax){globalMin=globalMin-1;globalMax=globalMax+1;}
@@ -219,8 +252,9 @@ tsChart.options.scales.y.min=undefined;
 tsChart.options.scales.y.max=undefined;
 document.getElementById("rangeInfo").textContent="range: -";
 }
-tsChart.update();
-const summary=metrics.summary||{};
+tsChart.update("none");
+}
+function renderSummary(summary){
 const nodeIds=Object.keys(summary).sort(function(a,b){return Number(a)-Number(b)});
 energyChart.data.labels=nodeIds.map(function(id){return"Node "+id});
 energyChart.data.datasets[0].data=nodeIds.map(function(id){return summary[id].energy_total||0});
@@ -228,6 +262,8 @@ energyChart.update();
 collisionChart.data.labels=nodeIds.map(function(id){return"Node "+id});
 collisionChart.data.datasets[0].data=nodeIds.map(function(id){return summary[id].collisions||0});
 collisionChart.update();
+}
+function renderStatus(metrics){
 const nowIso=metrics.last_updated_iso;
 if(nowIso)document.getElementById("lastUpdated").textContent=formatTime(nowIso);
 const rate=metrics.msgs_per_sec||0;
@@ -238,6 +274,11 @@ rateChart.data.labels=rateHistory.map(function(r){return formatTime(r.ts)});
 rateChart.data.datasets[0].data=rateHistory.map(function(r){return r.rate});
 rateChart.update();
 }
+function updateCharts(metrics){
+renderSeries(seriesFromSnapshot(metrics));
+renderSummary(metrics.summary||{});
+renderStatus(metrics);
+}
 function updateKpis(metrics){
 const nodes=metrics.nodes||{};
 document.getElementById("kpiNodes").textContent=Object.keys(nodes).length;
@@ -266,48 +307,395 @@ const expiry=inh.expiry_ts||0;
 document.getElementById("kpiInhState").textContent=expiry>now?"active":"idle";
 }
 function timeNowSeconds(){return Date.now()/1000.0;}
+function applyDelta(d){
+if(d.reset){live.series={};live.order=[];live.summary={};live.counters={};}
+if(d.capacity)live.capacity=Math.min(d.capacity,MAX_LIVE_POINTS);
+const m=d.messages||{};
+const ts=m.ts||[];
+const nd=m.node||[];
+const vals=m.value||[];
+for(let i=0;i<ts.length;i++){
+const id=nd[i];
+live.order.push(id);
+if(id===null)continue;
+let s=live.series[id];
+if(!s)s=live.series[id]=[];
+s.push({x:ts[i],y:vals[i]});
+}
+const extra=live.order.length-live.capacity;
+if(extra>0){
+live.order.splice(0,extra).forEach(function(id){
+if(id===null)return;
+const s=live.series[id];
+if(!s)return;
+s.shift();
+if(!s.length)delete live.series[id];
+});
+}
+Object.assign(live.summary,d.summary||{});
+(d.removed||[]).forEach(function(k){delete live.summary[k]});
+Object.assign(live.counters,d.counters||{});
+live.seq=d.seq;
+scheduleRender();
+}
+function scheduleRender(){
+if(renderPending)return;
+renderPending=true;
+requestAnimationFrame(function(){
+renderPending=false;
+const view=Object.assign({},live.counters,{nodes:live.series,summary:live.summary});
+updateKpis(view);
+renderSeries(live.series);
+renderSummary(live.summary);
+renderStatus(view);
+});
+}
 async function fetchMetrics(){
 if(document.getElementById("pause").checked)return;
 try{
-const r=await fetch("/metrics");
+const r=await fetch("/metrics?points="+POLL_POINTS);
 const m=await r.json();
 updateKpis(m);
 updateCharts(m);
 }catch(e){}
 }
-function scheduleFetch(){
-if(fetchTimer!==null)clearInterval(fetchTimer);
+function refreshSeconds(){
 let interval=parseInt(document.getElementById("refresh").value,10);
 if(!interval||interval<1)interval=2;
-fetchTimer=setInterval(fetchMetrics,interval*1000);
+return interval;
 }
-document.getElementById("refresh").addEventListener("change",scheduleFetch);
-initCharts();
+function scheduleFetch(){
+if(fetchTimer!==null)clearInterval(fetchTimer);
+fetchTimer=setInterval(fetchMetrics,refreshSeconds()*1000);
+}
+function startPolling(){
+if(stream!==null){stream.close();stream=null;}
 scheduleFetch();
 fetchMetrics();
+}
+function startStream(){
+if(!window.EventSource){startPolling();return;}
+if(stream!==null)stream.close();
+stream=new EventSource("/stream?since="+live.seq+"&interval_ms="+refreshSeconds()*1000+"&points="+POLL_POINTS);
+stream.addEventListener("delta",function(e){streamOk=true;applyDelta(JSON.parse(e.data));});
+stream.onerror=function(){if(!streamOk)startPolling();};
+}
+document.getElementById("refresh").addEventListener("change",function(){
+if(fetchTimer!==null)scheduleFetch();else startStream();
+});
+document.getElementById("pause").addEventListener("change",function(e){
+if(fetchTimer!==null)return;
+if(e.target.checked){if(stream!==null){stream.close();stream=null;}}
+else startStream();
+});
+initCharts();
+startStream();
 </script>
 </body>
 </html>
 """
 
-def make_app(gateway) -> Callable:
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+def _sse(event: str, data: Any, event_id: Any = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+def _diff(prev: Dict[str, Any], cur: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in cur.items() if prev.get(k) != v}
+
+def stream_deltas(
+    gateway,
+    since: int = 0,
+    interval_s: float = 1.0,
+    heartbeat_s: float = 15.0,
+    points: Optional[int] = None,
+) -> Iterator[bytes]:
+    cursor = int(since)
+    last_summary: Dict[str, Any] = {}
+    last_counters: Dict[str, Any] = {}
+    idle = 0.0
+    yield b"retry: 2000\n\n"
+    while True:
+        d = gateway.delta_since(cursor, points)
+        cursor = d["seq"]
+        summary = d.pop("summary")
+        counters = d.pop("counters")
+        if d["reset"]:
+            last_summary = {}
+            last_counters = {}
+        d["summary"] = _diff(last_summary, summary)
+        d["removed"] = [k for k in last_summary if k not in summary]
+        d["counters"] = _diff(last_counters, counters)
+        last_summary = summary
+        last_counters = counters
+        if d["reset"] or d["messages"]["ts"] or d["summary"] or d["removed"] or d["counters"]:
+            yield _sse("delta", d, cursor)
+            idle = 0.0
+        elif idle >= heartbeat_s:
+            yield b": ping\n\n"
+            idle = 0.0
+        time.sleep(interval_s)
+        idle += interval_s
+
+def _snapshot_args(environ) -> Dict[str, Any]:
+    qs = parse_qs(environ.get("QUERY_STRING", ""))
+    if "points" not in qs:
+        return {}
+    args: Dict[str, Any] = {"points": max(3, int(qs["points"][0]))}
+    for name in ("start", "end"):
+        if name in qs:
+            args[name] = float(qs[name][0])
+    method = qs.get("method", ["lttb"])[0]
+    if method not in METHODS:
+        raise ValueError(f"unknown downsampling method {method!r}")
+    args["method"] = method
+    return args
+
+class CachedBody:
+    def __init__(self, generation: Optional[int], body: bytes) -> None:
+        self.generation = generation
+        self.created = time.monotonic()
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self._gz: Optional[bytes] = None
+        self._gz_lock = Lock()
+
+class _Pending:
+    def __init__(self) -> None:
+        self.done = Event()
+        self.entry: Optional[CachedBody] = None
+        self.error: Optional[BaseException] = None
+
+class SnapshotCache:
+    def __init__(
+        self,
+        gateway,
+        ttl_s: float = 0.5,
+        gzip_level: int = 5,
+        gzip_min_bytes: int = 1024,
+        max_entries: int = 32,
+    ) -> None:
+        self.gateway = gateway
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.gzip_level = int(gzip_level)
+        self.gzip_min_bytes = int(gzip_min_bytes)
+        self.max_entries = max(1, int(max_entries))
+        self._entries: Dict[Tuple[Any, ...], CachedBody] = {}
+        self._pending: Dict[Tuple[Any, ...], _Pending] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.gzip_responses = 0
+        self.last_encode_s = 0.0
+        self.encode_hist = Histogram(
+            "neuroedge_metrics_encode_seconds", "Time to compute and JSON-encode a /metrics body on a cache miss."
+        )
+        self.gzip_hist = Histogram("neuroedge_metrics_gzip_seconds", "Time to gzip a cached /metrics body.")
+
+    def _generation(self) -> Optional[int]:
+        return getattr(self.gateway, "generation", None)
+
+    def get(self, args: Dict[str, Any]) -> CachedBody:
+        key = tuple(sorted(args.items()))
+        while True:
+            with self._lock:
+                gen = self._generation()
+                entry = self._entries.get(key)
+                if (
+                    entry is not None
+                    and time.monotonic() - entry.created < self.ttl_s
+                    and (gen is None or entry.generation == gen)
+                ):
+                    self.hits += 1
+                    return entry
+                pending = self._pending.get(key)
+                owner = pending is None
+                if owner:
+                    pending = self._pending[key] = _Pending()
+                    self.misses += 1
+            if owner:
+                break
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            if pending.entry is not None:
+                with self._lock:
+                    self.coalesced += 1
+                return pending.entry
+        try:
+            t0 = time.perf_counter()
+            body = json.dumps(self.gateway.snapshot_metrics(**args)).encode("utf-8")
+            entry = CachedBody(gen, body)
+            elapsed = time.perf_counter() - t0
+            self.encode_hist.observe(elapsed)
+            self.last_encode_s = elapsed
+        except BaseException as e:
+            pending.error = e
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.done.set()
+            raise
+        pending.entry = entry
+        with self._lock:
+            self._pending.pop(key, None)
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k].created)
+                del self._entries[oldest]
+        pending.done.set()
+        return entry
+
+    def gzipped(self, entry: CachedBody) -> bytes:
+        with entry._gz_lock:
+            if entry._gz is None:
+                t0 = time.perf_counter()
+                entry._gz = gzip.compress(entry.body, compresslevel=self.gzip_level, mtime=0)
+                self.gzip_hist.observe(time.perf_counter() - t0)
+            return entry._gz
+
+    def respond(self, environ, start_response):
+        try:
+            args = _snapshot_args(environ)
+        except ValueError as e:
+            payload = json.dumps({"error": str(e)}).encode("utf-8")
+            start_response("400 Bad Request", [("Content-Type", "application/json"), ("Content-Length", str(len(payload)))])
+            return [payload]
+        entry = self.get(args)
+        headers = [
+            ("Content-Type", "application/json"),
+            ("Access-Control-Allow-Origin", "*"),
+            ("Cache-Control", "no-cache"),
+            ("ETag", entry.etag),
+            ("Vary", "Accept-Encoding"),
+        ]
+        if _etag_matches(environ.get("HTTP_IF_NONE_MATCH", ""), entry.etag):
+            with self._lock:
+                self.not_modified += 1
+            start_response("304 Not Modified", headers)
+            return [b""]
+        body = entry.body
+        if len(body) >= self.gzip_min_bytes and _accepts_gzip(environ.get("HTTP_ACCEPT_ENCODING", "")):
+            body = self.gzipped(entry)
+            headers.append(("Content-Encoding", "gzip"))
+            with self._lock:
+                self.gzip_responses += 1
+        headers.append(("Content-Length", str(len(body))))
+        start_response("200 OK", headers)
+        return [body]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.hits
+            coalesced = self.coalesced
+            misses = self.misses
+            entries = len(self._entries)
+        total = hits + coalesced + misses
+        return {
+            "ttl_s": self.ttl_s,
+            "requests": total,
+            "hits": hits,
+            "coalesced": coalesced,
+            "misses": misses,
+            "hit_rate": (hits + coalesced) / total if total else 0.0,
+            "not_modified": self.not_modified,
+            "gzip_responses": self.gzip_responses,
+            "entries": entries,
+            "last_encode_ms": 1000.0 * self.last_encode_s,
+            "mean_encode_ms": 1000.0 * self.encode_hist.sum / self.encode_hist.count if self.encode_hist.count else 0.0,
+        }
+
+    def register(self, gateway) -> None:
+        prom = getattr(gateway, "prom", None)
+        if prom is None:
+            return
+        prom.register(self.encode_hist)
+        prom.register(self.gzip_hist)
+        prom.family(
+            "neuroedge_metrics_cache_requests_total",
+            "/metrics requests by cache outcome.",
+            "counter",
+            ("outcome",),
+            lambda: {("hit",): self.hits, ("coalesced",): self.coalesced, ("miss",): self.misses},
+        )
+        prom.family(
+            "neuroedge_metrics_not_modified_total",
+            "/metrics requests answered with 304 Not Modified.",
+            "counter",
+            (),
+            lambda: {(): self.not_modified},
+        )
+
+def _etag_matches(header: str, etag: str) -> bool:
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag or tag == "*":
+            return True
+    return False
+
+def _accepts_gzip(header: str) -> bool:
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def make_app(gateway, cache_ttl_s: float = 0.5) -> Callable:
+    cache = SnapshotCache(gateway, ttl_s=cache_ttl_s)
+    cache.register(gateway)
+
     def app(environ, start_response):
         path = environ.get("PATH_INFO", "")
         if path == "/metrics":
             try:
-                metrics = gateway.snapshot_metrics()
-                data = json.dumps(metrics)
-                headers = [
-                    ("Content-Type", "application/json"),
-                    ("Content-Length", str(len(data))),
-                    ("Access-Control-Allow-Origin", "*"),
-                ]
-                start_response("200 OK", headers)
-                return [data.encode("utf-8")]
+                return cache.respond(environ, start_response)
             except Exception as e:
                 payload = json.dumps({"error": str(e)})
                 start_response("500 Internal Server Error", [("Content-Type", "application/json")])
                 return [payload.encode("utf-8")]
+        if path == "/stream":
+            if not hasattr(gateway, "delta_since"):
+                start_response("404 Not Found", [("Content-Type", "text/plain")])
+                return [b"Not Found"]
+            qs = parse_qs(environ.get("QUERY_STRING", ""))
+            try:
+                since = int(environ.get("HTTP_LAST_EVENT_ID") or qs.get("since", ["0"])[0])
+                interval_s = max(0.05, float(qs.get("interval_ms", ["1000"])[0]) / 1000.0)
+            except ValueError:
+                since, interval_s = 0, 1.0
+            try:
+                points = max(3, int(qs["points"][0])) if "points" in qs else None
+            except ValueError:
+                points = None
+            headers = [
+                ("Content-Type", "text/event-stream"),
+                ("Cache-Control", "no-cache"),
+                ("Access-Control-Allow-Origin", "*"),
+            ]
+            start_response("200 OK", headers)
+            return stream_deltas(gateway, since, interval_s, points=points)
+        if path == "/metrics/cache":
+            data = json.dumps(cache.snapshot()).encode("utf-8")
+            headers = [("Content-Type", "application/json"), ("Content-Length", str(len(data)))]
+            start_response("200 OK", headers)
+            return [data]
+        if path == "/metrics/prom":
+            prom = getattr(gateway, "prom", None)
+            if prom is None:
+                start_response("404 Not Found", [("Content-Type", "text/plain")])
+                return [b"Not Found"]
+            data = prom.render().encode("utf-8")
+            headers = [
+                ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+                ("Content-Length", str(len(data))),
+            ]
+            start_response("200 OK", headers)
+            return [data]
         if path == "/":
             headers = [("Content-Type", "text/html; charset=utf-8")]
             start_response("200 OK", headers)
@@ -316,7 +704,7 @@ def make_app(gateway) -> Callable:
         return [b"Not Found"]
     return app
 
-def run_http(gateway, host: str, port: int) -> None:
-    app = make_app(gateway)
-    server = make_server(host, port, app)
+def run_http(gateway, host: str, port: int, cache_ttl_s: float = 0.5) -> None:
+    app = make_app(gateway, cache_ttl_s)
+    server = make_server(host, port, app, server_class=ThreadingWSGIServer)
     server.serve_forever()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import List, Sequence, Tuple
+
+METHODS = ("lttb", "minmax")
+
+def lttb(xs: Sequence[float], ys: Sequence[float], threshold: int) -> Tuple[List[float], List[float]]:
+    n = len(xs)
+    threshold = max(3, int(threshold))
+    if threshold >= n:
+        return list(xs), list(ys)
+    out_x = [xs[0]]
+    out_y = [ys[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        span = avg_end - avg_start
+        if span > 0:
+            avg_x = sum(xs[avg_start:avg_end]) / span
+            avg_y = sum(ys[avg_start:avg_end]) / span
+        else:
+            avg_x = xs[n - 1]
+            avg_y = ys[n - 1]
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax = xs[a]
+        ay = ys[a]
+        best = -1.0
+        best_j = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best:
+                best = area
+                best_j = j
+        out_x.append(xs[best_j])
+        out_y.append(ys[best_j])
+        a = best_j
+    out_x.append(xs[n - 1])
+    out_y.append(ys[n - 1])
+    return out_x, out_y
+
+def minmax(xs: Sequence[float], ys: Sequence[float], threshold: int) -> Tuple[List[float], List[float]]:
+    n = len(xs)
+    if threshold >= n:
+        return list(xs), list(ys)
+    buckets = max(1, threshold // 2)
+    size = n / buckets
+    out_x: List[float] = []
+    out_y: List[float] = []
+    for b in range(buckets):
+        lo = int(b * size)
+        hi = min(int((b + 1) * size), n)
+        if hi <= lo:
+            continue
+        seg = ys[lo:hi]
+        i_min = lo + min(range(hi - lo), key=seg.__getitem__)
+        i_max = lo + max(range(hi - lo), key=seg.__getitem__)
+        for i in sorted({i_min, i_max}):
+            out_x.append(xs[i])
+            out_y.append(ys[i])
+    return out_x, out_y
+
+def downsample(xs: Sequence[float], ys: Sequence[float], threshold: int, method: str = "lttb") -> Tuple[List[float], List[float]]:
+    if method == "minmax":
+        return minmax(xs, ys, threshold)
+    if method == "lttb":
+        return lttb(xs, ys, threshold)
+    raise ValueError(f"unknown downsampling method {method!r}")
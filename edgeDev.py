@@ -1,10 +1,12 @@
 from __future__ import annotations
+import argparse
 import subprocess
 import sys
 import time
 import signal
 import socket
 from pathlib import Path
+from nodehost import node_specs
 
 ROOT = Path(__file__).resolve().parent
 
@@ -20,13 +22,7 @@ LIF_REFRACTORY = 0
 BASELINE_INTERVAL = 0
 NODE_STAGGER_S = 0.5
 
-NODE_CONFIG = [
-    {"id": 60, "name": "node-60"},
-    {"id": 61, "name": "node-61"},
-    {"id": 62, "name": "node-62"},
-    {"id": 63, "name": "node-63"},
-    {"id": 64, "name": "node-64"},
-]
+NODE_IDS = "60-64"
 
 PROCS: list[subprocess.Popen] = []
 
@@ -46,14 +42,8 @@ def wait_for_port(host: str, port: int, timeout: float) -> bool:
     return False
 
 
-def start_node(node_id: int, name: str) -> subprocess.Popen:
-    cmd = [
-        sys.executable,
-        str(ROOT / "node.py"),
-        "--id",
-        str(node_id),
-        "--name",
-        name,
+def _node_args(shm_inhibit: str = "") -> list[str]:
+    args = [
         "--host",
         GATEWAY_HOST,
         "--port",
@@ -73,11 +63,48 @@ def start_node(node_id: int, name: str) -> subprocess.Popen:
         "--baseline-interval",
         str(BASELINE_INTERVAL),
     ]
+    if shm_inhibit:
+        args += ["--shm-inhibit", shm_inhibit]
+    return args
+
+
+def start_node(node_id: int, name: str, sf: int = 0, channel: int = 0, shm_inhibit: str = "") -> subprocess.Popen:
+    cmd = [
+        sys.executable,
+        str(ROOT / "node.py"),
+        "--id",
+        str(node_id),
+        "--name",
+        name,
+    ] + _node_args(shm_inhibit)
+    if sf:
+        cmd += ["--sf", str(sf), "--channel", str(channel)]
     p = subprocess.Popen(cmd, cwd=str(ROOT))
     PROCS.append(p)
     return p
 
 
+def start_host(args: argparse.Namespace) -> subprocess.Popen:
+    cmd = [sys.executable, str(ROOT / "nodehost.py"), "--shards", str(args.shards)] + _node_args(args.shm_inhibit)
+    if args.nodes:
+        cmd += ["--ids", args.nodes]
+    if args.spec:
+        cmd += ["--spec", args.spec]
+    p = subprocess.Popen(cmd, cwd=str(ROOT))
+    PROCS.append(p)
+    return p
+
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--nodes", type=str, default=NODE_IDS)
+    p.add_argument("--spec", type=str, default="")
+    p.add_argument("--mode", type=str, default="proc", choices=["proc", "host"])
+    p.add_argument("--shards", type=int, default=1)
+    p.add_argument("--shm-inhibit", type=str, default="")
+    return p.parse_args()
+
+
 def shutdown(signum=None, frame=None) -> None:
     for p in PROCS[::-1]:
         if p.poll() is None:
@@ -96,6 +123,10 @@ def shutdown(signum=None, frame=None) -> None:
 
 
 def main() -> None:
+    args = parse_args()
+    if args.spec and args.nodes == NODE_IDS:
+        args.nodes = ""
+    nodes = node_specs(args.nodes, args.spec)
     signal.signal(signal.SIGINT, shutdown)
     signal.signal(signal.SIGTERM, shutdown)
 
@@ -103,11 +134,16 @@ def main() -> None:
         print(f"gateway {GATEWAY_HOST}:{GATEWAY_PORT} not reachable")
         sys.exit(1)
 
-    for cfg in NODE_CONFIG:
-        start_node(cfg["id"], cfg["name"])
-        time.sleep(NODE_STAGGER_S)
+    if args.mode == "host":
+        start_host(args)
+    else:
+        for cfg in nodes:
+            start_node(
+                cfg["id"], cfg["name"], int(cfg.get("sf") or 0), int(cfg.get("channel") or 0), args.shm_inhibit
+            )
+            time.sleep(NODE_STAGGER_S)
 
-    print(f"started {len(NODE_CONFIG)} nodes against {GATEWAY_HOST}:{GATEWAY_PORT}")
+    print(f"started {len(nodes)} nodes ({args.mode} mode) against {GATEWAY_HOST}:{GATEWAY_PORT}")
     while True:
         time.sleep(1.0)
 
@@ -0,0 +1,361 @@
+from __future__ import annotations
+import asyncio
+from abc import ABC, abstractmethod
+import selectors
+import socket
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from threading import Lock, RLock, Thread
+from typing import Any, Dict, Optional
+from promstats import Histogram
+
+COALESCE_KINDS = frozenset({"inhibit"})
+POLICIES = ("drop_oldest", "drop_new", "disconnect")
+_SEND_FLAGS = getattr(socket, "MSG_DONTWAIT", 0)
+
+@dataclass
+class FanoutStats:
+    broadcasts: int = 0
+    enqueued: int = 0
+    sent: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    disconnects: int = 0
+    broadcast_s_total: float = 0.0
+    broadcast_s_max: float = 0.0
+    latency_s_total: float = 0.0
+    latency_s_max: float = 0.0
+
+class _Outbox(ABC):
+    def __init__(self, fanout: "Fanout", key: Any) -> None:
+        self.fanout = fanout
+        self.key = key
+        self.closed = False
+        self._items: deque[list] = deque()
+
+    def depth(self) -> int:
+        return len(self._items)
+
+    def _enqueue(self, kind: str, data: bytes, t: float) -> bool:
+        f = self.fanout
+        if kind in COALESCE_KINDS:
+            for item in self._items:
+                if item[0] == kind:
+                    item[1] = data
+                    item[2] = t
+                    f._count("coalesced")
+                    return False
+        if len(self._items) >= f.maxlen:
+            f._count("dropped")
+            if f.policy == "drop_new":
+                return False
+            if f.policy == "disconnect":
+                f._count("disconnects")
+                self.close()
+                return False
+            self._items.popleft()
+        self._items.append([kind, data, t])
+        f._count("enqueued")
+        return True
+
+    @abstractmethod
+    def put(self, kind: str, data: bytes, t: float) -> None: ...
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+class ThreadOutbox(_Outbox):
+    def __init__(self, fanout: "Fanout", key: Any, sock: socket.socket, writer: "_ThreadWriter") -> None:
+        super().__init__(fanout, key)
+        self.sock = sock
+        self._writer = writer
+        self._cur: Optional[memoryview] = None
+        self._t = 0.0
+        self._deadline = 0.0
+
+    def put(self, kind: str, data: bytes, t: float) -> None:
+        w = self._writer
+        with w.lock:
+            if self.closed:
+                return
+            queued = self._enqueue(kind, data, t)
+        if queued:
+            w.notify(self)
+
+    def close(self) -> None:
+        w = self._writer
+        with w.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._items.clear()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        w.notify(self)
+
+class _ThreadWriter:
+    def __init__(self, fanout: "Fanout") -> None:
+        self.fanout = fanout
+        self.lock = RLock()
+        self._pending: set = set()
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ)
+        self._active: set = set()
+        self._thread = Thread(target=self._run, name="fanout-writer", daemon=True)
+        self._thread.start()
+
+    def notify(self, box: ThreadOutbox) -> None:
+        with self.lock:
+            self._pending.add(box)
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _run(self) -> None:
+        active = self._active
+        while True:
+            timeout = None
+            if active:
+                timeout = max(0.0, min(box._deadline for box in active) - time.perf_counter())
+            for key, _ in self._sel.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._pump(key.data)
+            with self.lock:
+                pending = self._pending
+                self._pending = set()
+            for box in pending:
+                self._pump(box)
+            now = time.perf_counter()
+            for box in [box for box in active if box._deadline <= now]:
+                self._fail(box)
+
+    def _pump(self, box: ThreadOutbox) -> None:
+        f = self.fanout
+        try:
+            while True:
+                if box._cur is None:
+                    with self.lock:
+                        if box.closed or not box._items:
+                            break
+                        _, data, t = box._items.popleft()
+                    box._cur = memoryview(data)
+                    box._t = t
+                    box._deadline = time.perf_counter() + f.write_timeout_s
+                n = box.sock.send(box._cur, _SEND_FLAGS)
+                box._cur = box._cur[n:]
+                if box._cur:
+                    continue
+                box._cur = None
+                f._record_sent(time.perf_counter() - box._t)
+        except BlockingIOError:
+            try:
+                self._watch(box)
+            except (KeyError, ValueError, OSError):
+                self._fail(box)
+            return
+        except Exception:
+            self._fail(box)
+            return
+        self._unwatch(box)
+
+    def _watch(self, box: ThreadOutbox) -> None:
+        if box in self._active:
+            return
+        try:
+            self._sel.register(box.sock, selectors.EVENT_WRITE, box)
+        except KeyError:
+            stale = self._sel.get_key(box.sock)
+            self._unwatch(stale.data)
+            self._sel.register(box.sock, selectors.EVENT_WRITE, box)
+        self._active.add(box)
+
+    def _unwatch(self, box: ThreadOutbox) -> None:
+        if box not in self._active:
+            return
+        self._active.discard(box)
+        try:
+            self._sel.unregister(box.sock)
+        except (KeyError, ValueError):
+            pass
+
+    def _fail(self, box: ThreadOutbox) -> None:
+        self._unwatch(box)
+        box._cur = None
+        if not box.closed:
+            self.fanout._count("disconnects")
+            box.close()
+
+class AsyncOutbox(_Outbox):
+    def __init__(
+        self,
+        fanout: "Fanout",
+        key: Any,
+        writer: asyncio.StreamWriter,
+        loop: asyncio.AbstractEventLoop,
+    ) -> None:
+        super().__init__(fanout, key)
+        self.writer = writer
+        self.loop = loop
+        self._event = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def put(self, kind: str, data: bytes, t: float) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self._put_local(kind, data, t)
+        else:
+            self.loop.call_soon_threadsafe(self._put_local, kind, data, t)
+
+    def _put_local(self, kind: str, data: bytes, t: float) -> None:
+        if self.closed:
+            return
+        if self._enqueue(kind, data, t):
+            self._event.set()
+
+    async def _run(self) -> None:
+        while not self.closed:
+            await self._event.wait()
+            self._event.clear()
+            while self._items and not self.closed:
+                _, data, t = self._items.popleft()
+                try:
+                    self.writer.write(data)
+                    await asyncio.wait_for(self.writer.drain(), self.fanout.write_timeout_s)
+                except Exception:
+                    self.fanout._count("disconnects")
+                    self.close()
+                    return
+                self.fanout._record_sent(time.perf_counter() - t)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._items.clear()
+        self._event.set()
+        self.writer.close()
+
+class Fanout:
+    def __init__(self, maxlen: int = 16, policy: str = "drop_oldest", write_timeout_s: float = 1.0) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"unknown fan-out policy {policy!r}")
+        self.maxlen = max(1, int(maxlen))
+        self.policy = policy
+        self.write_timeout_s = float(write_timeout_s)
+        self.stats = FanoutStats()
+        self.broadcast_hist = Histogram(
+            "neuroedge_inhibit_broadcast_seconds", "Time to fan an inhibit command out to all client queues."
+        )
+        self.latency_hist = Histogram(
+            "neuroedge_inhibit_delivery_seconds", "Time from broadcast until the command is written to a client socket."
+        )
+        self._clients: Dict[Any, _Outbox] = {}
+        self._lock = Lock()
+        self._stats_lock = Lock()
+        self._writer: Optional[_ThreadWriter] = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self.stats, name, getattr(self.stats, name) + n)
+
+    def _record_sent(self, latency_s: float) -> None:
+        self.latency_hist.observe(latency_s)
+        with self._stats_lock:
+            st = self.stats
+            st.sent += 1
+            st.latency_s_total += latency_s
+            if latency_s > st.latency_s_max:
+                st.latency_s_max = latency_s
+
+    def _add(self, box: _Outbox) -> _Outbox:
+        with self._lock:
+            old = self._clients.get(box.key)
+            self._clients[box.key] = box
+        if old is not None and old is not box:
+            old.close()
+        return box
+
+    def add_thread_client(self, key: Any, sock: socket.socket) -> ThreadOutbox:
+        with self._lock:
+            if self._writer is None:
+                self._writer = _ThreadWriter(self)
+            writer = self._writer
+        return self._add(ThreadOutbox(self, key, sock, writer))
+
+    def add_async_client(
+        self,
+        key: Any,
+        writer: asyncio.StreamWriter,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> AsyncOutbox:
+        return self._add(AsyncOutbox(self, key, writer, loop or asyncio.get_running_loop()))
+
+    def remove(self, key: Any, box: Optional[_Outbox] = None) -> None:
+        with self._lock:
+            current = self._clients.get(key)
+            if current is None or (box is not None and current is not box):
+                current = None
+            else:
+                del self._clients[key]
+        if box is not None:
+            box.close()
+        elif current is not None:
+            current.close()
+
+    def broadcast(self, data: bytes, kind: str = "inhibit") -> None:
+        t0 = time.perf_counter()
+        with self._lock:
+            boxes = list(self._clients.values())
+        for box in boxes:
+            box.put(kind, data, t0)
+        dt = time.perf_counter() - t0
+        self.broadcast_hist.observe(dt)
+        with self._stats_lock:
+            st = self.stats
+            st.broadcasts += 1
+            st.broadcast_s_total += dt
+            if dt > st.broadcast_s_max:
+                st.broadcast_s_max = dt
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            depths = [box.depth() for box in self._clients.values()]
+        with self._stats_lock:
+            st = asdict(self.stats)
+        sent = max(1, st["sent"])
+        broadcasts = max(1, st["broadcasts"])
+        return {
+            "clients": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths) if depths else 0,
+            "policy": self.policy,
+            "broadcasts": st["broadcasts"],
+            "enqueued": st["enqueued"],
+            "sent": st["sent"],
+            "coalesced": st["coalesced"],
+            "dropped": st["dropped"],
+            "disconnects": st["disconnects"],
+            "mean_broadcast_ms": 1000.0 * st["broadcast_s_total"] / broadcasts,
+            "max_broadcast_ms": 1000.0 * st["broadcast_s_max"],
+            "mean_latency_ms": 1000.0 * st["latency_s_total"] / sent,
+            "max_latency_ms": 1000.0 * st["latency_s_max"],
+        }
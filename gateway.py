@@ -1,18 +1,96 @@
 from __future__ import annotations
+import heapq
 import time
 from collections import deque
-from dataclasses import dataclass
+from bisect import bisect_left
+from dataclasses import dataclass, field
 from queue import Queue, Empty
 from threading import Event, Lock
-from typing import Any, Dict, Optional, Callable
+from typing import Any, Dict, Iterable, Optional, Callable, Tuple
 from lif import LIFAggregator
 from inhibition import InhibitionState
+from collisions import BucketedTxIndex, TxEntry
+from history import FLAG_SPIKE, MessageHistory, to_epoch, to_iso
+from msglog import FLAG_COLLIDED, FLAG_UPDATE, MessageLog
+from promstats import Registry
+from downsample import downsample
+from phy import PhyModel
 
 @dataclass
 class GatewayStats:
     fires: int = 0
     suppressed_total: int = 0
 
+BATCH_SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024)
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    messages: int = 0
+    max_size: int = 0
+    wait_s_total: float = 0.0
+    wait_s_max: float = 0.0
+    process_s_total: float = 0.0
+    process_s_max: float = 0.0
+    size_hist: list[int] = field(default_factory=lambda: [0] * (len(BATCH_SIZE_BUCKETS) + 1))
+
+    def record(self, size: int, wait_s: float, process_s: float) -> None:
+        self.batches += 1
+        self.messages += size
+        if size > self.max_size:
+            self.max_size = size
+        self.wait_s_total += wait_s
+        if wait_s > self.wait_s_max:
+            self.wait_s_max = wait_s
+        self.process_s_total += process_s
+        if process_s > self.process_s_max:
+            self.process_s_max = process_s
+        self.size_hist[bisect_left(BATCH_SIZE_BUCKETS, size)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        n = max(1, self.batches)
+        labels = [f"<={b}" for b in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "mean_size": self.messages / n,
+            "max_size": self.max_size,
+            "mean_wait_ms": 1000.0 * self.wait_s_total / n,
+            "max_wait_ms": 1000.0 * self.wait_s_max,
+            "mean_process_ms": 1000.0 * self.process_s_total / n,
+            "max_process_ms": 1000.0 * self.process_s_max,
+            "size_hist": dict(zip(labels, self.size_hist)),
+        }
+
+TIME_MODES = ("arrival", "event")
+
+@dataclass
+class ReorderStats:
+    admitted: int = 0
+    released: int = 0
+    reordered: int = 0
+    late_dropped: int = 0
+    forced: int = 0
+    clamped: int = 0
+    idle_flushes: int = 0
+    max_buffered: int = 0
+    delay_s_total: float = 0.0
+    delay_s_max: float = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "admitted": self.admitted,
+            "released": self.released,
+            "reordered": self.reordered,
+            "late_dropped": self.late_dropped,
+            "forced": self.forced,
+            "clamped": self.clamped,
+            "idle_flushes": self.idle_flushes,
+            "max_buffered": self.max_buffered,
+            "mean_delay_ms": 1000.0 * self.delay_s_total / max(1, self.released),
+            "max_delay_ms": 1000.0 * self.delay_s_max,
+        }
+
 class Gateway:
     def __init__(
         self,
@@ -29,7 +107,22 @@ class Gateway:
         min_retention_s: float = 2.0,
         max_recent: int = 5000,
         on_fire: Optional[Callable[[float, int], None]] = None,
+        clock: Callable[[], float] = time.time,
+        batch_max: int = 1,
+        batch_wait_s: float = 0.0,
+        on_spike: Optional[Callable[[Dict[str, Any]], None]] = None,
+        log: Optional[MessageLog] = None,
+        phy: Optional[PhyModel] = None,
+        time_mode: str = "arrival",
+        reorder_window_s: float = 0.5,
+        reorder_max: int = 10000,
+        max_future_s: float = 5.0,
+        checkpoint_s: float = 5.0,
+        dense_max_cells: int = 1 << 20,
+        auto_points: int = 1000,
     ) -> None:
+        if time_mode not in TIME_MODES:
+            raise ValueError(f"unknown time mode {time_mode!r}")
         self.inq = inq
         self.inhibition = inhibition
         self.aggregator = LIFAggregator(leak=agg_leak, theta=agg_theta)
@@ -40,59 +133,208 @@ class Gateway:
         self.collision_mode = str(collision_mode)
         self.retention_multiplier = float(retention_multiplier)
         self.min_retention_s = float(min_retention_s)
-        self._recent_msgs: deque[Dict[str, Any]] = deque(maxlen=max_recent)
-        self._recent_tx: list[Dict[str, Any]] = []
+        self._history = MessageHistory(max_recent)
+        self.phy = phy if phy is not None else PhyModel(payload=self.payload_bytes)
+        self._recent_tx = BucketedTxIndex()
+        self._per_bucket: Dict[Tuple[int, int], list] = {}
+        self._recent_summary: Dict[str, Dict[str, float]] = {}
+        self._rate_window_s = 60.0
+        self._rate_starts: deque[float] = deque(maxlen=self._history.capacity)
         self._total_messages = 0
         self._total_collided_messages = 0
         self._total_pairwise_overlaps = 0
+        self._total_energy_j = 0.0
         self._per_node_collisions: Dict[int, int] = {}
         self._per_node_pairwise: Dict[int, int] = {}
         self._per_node_suppressed: Dict[int, int] = {}
+        self._per_node_messages: Dict[int, int] = {}
         self.stats = GatewayStats()
         self._lock = Lock()
         self._stop = Event()
         self._on_fire = on_fire
+        self._clock = clock
+        self._on_spike = on_spike
+        self._log = log
+        self.checkpoint_s = max(0.0, float(checkpoint_s))
+        self.dense_max_cells = max(0, int(dense_max_cells))
+        self.auto_points = max(2, int(auto_points))
+        self._next_checkpoint = time.monotonic() + self.checkpoint_s
+        self.batch_max = max(1, int(batch_max))
+        self.batch_wait_s = max(0.0, float(batch_wait_s))
+        self.batch_stats = BatchStats()
+        self._metrics_sources: Dict[str, Callable[[], Any]] = {}
+        self.time_mode = time_mode
+        self.reorder_window_s = max(0.0, float(reorder_window_s))
+        self.reorder_max = max(1, int(reorder_max))
+        self.max_future_s = float(max_future_s)
+        self.reorder_stats = ReorderStats()
+        self._reorder: list = []
+        self._reorder_seq = 0
+        self._watermark = float("-inf")
+        self._max_event = float("-inf")
+        self._last_released_seq = 0
+        self._last_arrival = float("-inf")
+        self.prom = Registry()
+        self._init_prom()
+
+    def _init_prom(self) -> None:
+        prom = self.prom
+        prom.gauge("neuroedge_inq_depth", "Messages waiting in the gateway input queue.", lambda: self.inq.qsize())
+        self._h_ingest = prom.histogram(
+            "neuroedge_ingest_latency_seconds", "Time from receipt by the connection handler to processing completion."
+        )
+        self._h_process = prom.histogram("neuroedge_process_seconds", "Duration of a single _process_message call.")
+        self._h_lock_wait = prom.histogram("neuroedge_lock_wait_seconds", "Time spent waiting for the gateway lock.")
+        self._h_snapshot = prom.histogram("neuroedge_snapshot_seconds", "Duration of snapshot_metrics.")
+        self._h_snapshot_lock = prom.histogram(
+            "neuroedge_snapshot_lock_hold_seconds", "Time snapshot_metrics holds the gateway lock."
+        )
+        prom.family("neuroedge_messages_total", "Messages processed.", "counter", (), lambda: {(): self._total_messages})
+        prom.family(
+            "neuroedge_collided_messages_total",
+            "Messages involved in at least one collision.",
+            "counter",
+            (),
+            lambda: {(): self._total_collided_messages},
+        )
+        prom.family(
+            "neuroedge_pairwise_overlaps_total",
+            "Pairwise transmission overlaps.",
+            "counter",
+            (),
+            lambda: {(): self._total_pairwise_overlaps},
+        )
+        prom.family("neuroedge_aggregator_fires_total", "Aggregator fires.", "counter", (), lambda: {(): self.stats.fires})
+        prom.family(
+            "neuroedge_suppressed_total", "Spikes suppressed by inhibition (node reported).", "counter", (),
+            lambda: {(): self.stats.suppressed_total},
+        )
+        prom.gauge("neuroedge_inhibition_beta", "Current inhibition factor.", self.inhibition.current_beta)
+        prom.family(
+            "neuroedge_node_messages_total",
+            "Messages processed per node.",
+            "counter",
+            ("node",),
+            lambda: {(k,): v for k, v in list(self._per_node_messages.items())},
+        )
+        prom.family(
+            "neuroedge_node_collisions_total",
+            "Collided messages per node.",
+            "counter",
+            ("node",),
+            lambda: {(k,): v for k, v in list(self._per_node_collisions.items())},
+        )
+        prom.gauge("neuroedge_reorder_buffered", "Messages held in the event-time reorder buffer.", lambda: len(self._reorder))
+        prom.family(
+            "neuroedge_late_dropped_total",
+            "Messages dropped because their event time was behind the watermark.",
+            "counter",
+            (),
+            lambda: {(): self.reorder_stats.late_dropped},
+        )
+        prom.family(
+            "neuroedge_bucket_tx_total",
+            "Transmissions per (channel, spreading factor) collision bucket.",
+            "counter",
+            ("channel", "sf"),
+            lambda: {k: v[0] for k, v in list(self._per_bucket.items())},
+        )
+        prom.family(
+            "neuroedge_bucket_collided_total",
+            "Collided transmissions per (channel, spreading factor) collision bucket.",
+            "counter",
+            ("channel", "sf"),
+            lambda: {k: v[1] for k, v in list(self._per_bucket.items())},
+        )
+
+    @property
+    def generation(self) -> int:
+        return self._history.seq
 
     def stop(self) -> None:
         self._stop.set()
 
+    def add_metrics_source(self, name: str, fn: Callable[[], Any]) -> None:
+        self._metrics_sources[name] = fn
+
     def _lorawan_airtime(self, payload: int) -> float:
-        sf = 7
-        bw = 125000.0
-        cr = 1
-        preamble = 8
-        de = 1 if sf >= 11 and bw == 125000.0 else 0
-        tsym = (2.0 ** sf) / bw
-        num = 8 * payload - 4 * sf + 28 + 16
-        den = 4 * (sf - 2 * de)
-        payload_symb = 8 + max(int(num / den) * (cr + 4), 0)
-        t_pre = (preamble + 4.25) * tsym
-        t_pay = payload_symb * tsym
-        return t_pre + t_pay
+        return self.phy.airtime(self.phy.default[1], payload)
+
+    def _summary_entry(self, summary: Dict[str, Dict[str, float]], key: str) -> Dict[str, float]:
+        entry = summary.get(key)
+        if entry is None:
+            entry = {"count": 0, "energy_total": 0.0, "collisions": 0, "pairwise_collisions": 0}
+            summary[key] = entry
+        return entry
+
+    def _merge_collisions(self, summary: Dict[str, Dict[str, float]], collisions: Dict[int, int], pairwise: Dict[int, int]) -> None:
+        for node_int, c in collisions.items():
+            self._summary_entry(summary, str(node_int))["collisions"] = c
+        for node_int, p in pairwise.items():
+            self._summary_entry(summary, str(node_int))["pairwise_collisions"] = p
+
+    def _append_recent(self, msg: Dict[str, Any], node_raw: Any, spike_flag: bool, start_s: float, airtime: float, energy: float) -> tuple[float, float]:
+        hist = self._history
+        if node_raw is not None:
+            node_idx = hist.nodes.intern(str(node_raw), msg.get("name"), msg.get("ip"))
+        else:
+            node_idx = -1
+        try:
+            value = float(msg.get("value", 0.0))
+        except Exception:
+            value = 0.0
+        ts = to_epoch(msg.get("ts"), start_s)
+        evicted = hist.append(ts, node_idx, value, FLAG_SPIKE if spike_flag else 0, start_s, airtime, energy)
+        if evicted is not None and evicted[0] >= 0:
+            key = hist.nodes.keys[evicted[0]]
+            entry = self._recent_summary.get(key)
+            if entry is not None:
+                entry["count"] -= 1
+                if entry["count"] <= 0:
+                    del self._recent_summary[key]
+                else:
+                    entry["energy_total"] -= evicted[1]
+        if node_idx >= 0:
+            entry = self._summary_entry(self._recent_summary, hist.nodes.keys[node_idx])
+            entry["count"] += 1
+            entry["energy_total"] += energy
+        rate = self._rate_starts
+        rate.append(start_s)
+        horizon = start_s - self._rate_window_s
+        while rate and rate[0] < horizon:
+            rate.popleft()
+        return ts, value
 
     def _process_message(self, msg: Dict[str, Any]) -> None:
-        now = time.time()
-        airtime = self._lorawan_airtime(self.payload_bytes)
+        now = msg.get("event_s") if self.time_mode == "event" else None
+        if now is None:
+            now = self._clock()
+        node_raw = msg.get("node")
+        try:
+            node_id = int(node_raw)
+        except Exception:
+            node_id = None
+        ch, sf = self.phy.radio(node_id, msg)
+        airtime = self.phy.airtime(sf)
         energy = airtime * self.tx_power_w
         start_s = now
         end_s = now + airtime
+        msg["ch"] = ch
+        msg["sf"] = sf
         msg["airtime_s"] = airtime
         msg["energy_j"] = energy
         msg["start_s"] = start_s
         msg["end_s"] = end_s
         spike_flag = int(msg.get("spike", 0)) == 1
-        if spike_flag:
+        if spike_flag and self._on_spike is not None:
+            self._on_spike(msg)
+        elif spike_flag:
             fired = self.aggregator.step(1.0)
             if fired:
                 self.stats.fires += 1
                 self.inhibition.activate(self.beta, self.t_inh_steps)
                 if self._on_fire is not None:
                     self._on_fire(self.beta, self.t_inh_steps)
-        node_raw = msg.get("node")
-        try:
-            node_id = int(node_raw)
-        except Exception:
-            node_id = None
         st = msg.get("suppressed_total")
         if st is not None and node_id is not None:
             try:
@@ -103,148 +345,476 @@ class Gateway:
                 prev = self._per_node_suppressed.get(node_id, 0)
                 if st_int != prev:
                     self._per_node_suppressed[node_id] = st_int
-                    self.stats.suppressed_total = sum(self._per_node_suppressed.values())
-        self._recent_msgs.append(msg)
+                    self.stats.suppressed_total += st_int - prev
+        ts, value = self._append_recent(msg, node_raw, spike_flag, start_s, airtime, energy)
         self._total_messages += 1
+        self._total_energy_j += energy
+        flags = FLAG_SPIKE if spike_flag else 0
+        if node_id is not None:
+            self._per_node_messages[node_id] = self._per_node_messages.get(node_id, 0) + 1
         if node_id is None:
+            if self._log is not None:
+                self._log.append(ts, None, value, flags, start_s, airtime, energy)
             return
         if self.collision_mode == "spikes":
             is_tx = spike_flag
         else:
             is_tx = True
-        new_entry = {
-            "node": node_id,
-            "start": start_s,
-            "end": end_s,
-            "is_tx": bool(is_tx),
-            "collided": False,
-        }
         if is_tx:
-            overlaps: list[Dict[str, Any]] = []
-            for ent in self._recent_tx:
-                if not ent.get("is_tx", False):
-                    continue
-                if ent.get("node") == node_id:
-                    continue
-                s = float(ent.get("start", 0.0))
-                e = float(ent.get("end", 0.0))
-                if e <= start_s or s >= end_s:
-                    continue
-                overlaps.append(ent)
+            key = (ch, sf)
+            index = self._recent_tx.bucket(key)
+            index.expire(now - max(self.min_retention_s, airtime * self.retention_multiplier))
+            counts = self._per_bucket.get(key)
+            if counts is None:
+                counts = self._per_bucket[key] = [0, 0]
+            counts[0] += 1
+            new_entry = TxEntry(node_id, start_s, end_s)
+            overlaps = index.overlapping(start_s, end_s, exclude_node=node_id)
             if overlaps:
                 self._total_pairwise_overlaps += len(overlaps)
                 for ent in overlaps:
-                    other = int(ent["node"])
+                    other = ent.node
                     self._per_node_pairwise[other] = self._per_node_pairwise.get(other, 0) + 1
-                    if not ent.get("collided", False):
-                        ent["collided"] = True
+                    flipped = not ent.collided
+                    if flipped:
+                        ent.collided = True
+                        counts[1] += 1
                         self._total_collided_messages += 1
                         self._per_node_collisions[other] = self._per_node_collisions.get(other, 0) + 1
-                new_entry["collided"] = True
+                    if self._log is not None:
+                        self._log.update(ent.ref, ts, other, ent.start, flipped)
+                new_entry.collided = True
+                counts[1] += 1
                 self._total_collided_messages += 1
                 self._per_node_collisions[node_id] = self._per_node_collisions.get(node_id, 0) + 1
                 self._per_node_pairwise[node_id] = self._per_node_pairwise.get(node_id, 0) + len(overlaps)
-        self._recent_tx.append(new_entry)
-        cutoff = time.time() - max(self.min_retention_s, airtime * self.retention_multiplier)
-        self._recent_tx = [t for t in self._recent_tx if float(t.get("end", 0.0)) >= cutoff]
+                flags |= FLAG_COLLIDED
+            if self._log is not None:
+                new_entry.ref = self._log.append(
+                    ts, node_id, value, flags, start_s, airtime, energy, self._per_node_suppressed.get(node_id, 0), len(overlaps)
+                )
+            index.add(new_entry)
+        elif self._log is not None:
+            self._log.append(ts, node_id, value, flags, start_s, airtime, energy, self._per_node_suppressed.get(node_id, 0))
+        if self._log is not None and self.checkpoint_s > 0.0:
+            t = time.monotonic()
+            if t >= self._next_checkpoint:
+                self._next_checkpoint = t + self.checkpoint_s
+                self._log.checkpoint(self._counters_state())
+
+    def _counters_state(self) -> Dict[str, Any]:
+        return {
+            "total_messages": self._total_messages,
+            "total_collided_messages": self._total_collided_messages,
+            "total_pairwise_overlaps": self._total_pairwise_overlaps,
+            "total_energy_j": self._total_energy_j,
+            "per_node_messages": dict(self._per_node_messages),
+            "per_node_collisions": dict(self._per_node_collisions),
+            "per_node_pairwise": dict(self._per_node_pairwise),
+            "per_node_suppressed": dict(self._per_node_suppressed),
+            "fires": self.stats.fires,
+            "aggregator": {"v": self.aggregator.v, "r": self.aggregator._r},
+            "inhibition": self.inhibition.snapshot(),
+        }
+
+    def _load_counters(self, counters: Dict[str, Any]) -> None:
+        self._total_messages = int(counters.get("total_messages", 0))
+        self._total_collided_messages = int(counters.get("total_collided_messages", 0))
+        self._total_pairwise_overlaps = int(counters.get("total_pairwise_overlaps", 0))
+        self._total_energy_j = float(counters.get("total_energy_j", 0.0))
+        for name in ("per_node_messages", "per_node_collisions", "per_node_pairwise", "per_node_suppressed"):
+            getattr(self, "_" + name).update({int(k): int(v) for k, v in counters.get(name, {}).items()})
+        self.stats.fires = int(counters.get("fires", 0))
+        agg = counters.get("aggregator") or {}
+        self.aggregator.v = float(agg.get("v", 0.0))
+        self.aggregator._r = int(agg.get("r", 0))
+        inh = counters.get("inhibition")
+        if inh:
+            self.inhibition.restore(float(inh.get("beta", 1.0)), float(inh.get("expiry_ts", 0.0)), self.t_inh_steps)
+
+    def _replay_record(self, rec: tuple) -> None:
+        node, sup, flags, pairwise = rec[5], rec[6], rec[7], rec[8]
+        if flags & FLAG_UPDATE:
+            self._per_node_pairwise[node] = self._per_node_pairwise.get(node, 0) + pairwise
+            if flags & FLAG_COLLIDED:
+                self._total_collided_messages += 1
+                self._per_node_collisions[node] = self._per_node_collisions.get(node, 0) + 1
+            return
+        self._total_messages += 1
+        self._total_energy_j += rec[4]
+        if flags & FLAG_SPIKE and self._on_spike is None and self.aggregator.step(1.0):
+            self.stats.fires += 1
+            self.inhibition.restore(self.beta, rec[1] + self.t_inh_steps * self.inhibition.step_s, self.t_inh_steps)
+        if node < 0:
+            return
+        self._per_node_messages[node] = self._per_node_messages.get(node, 0) + 1
+        if pairwise:
+            self._total_collided_messages += 1
+            self._total_pairwise_overlaps += pairwise
+            self._per_node_collisions[node] = self._per_node_collisions.get(node, 0) + 1
+            self._per_node_pairwise[node] = self._per_node_pairwise.get(node, 0) + pairwise
+        self._per_node_suppressed[node] = sup
+
+    def checkpoint_log(self) -> None:
+        if self._log is None:
+            return
+        with self._lock:
+            self._log.checkpoint(self._counters_state())
+
+    def restore_from_log(self, log: MessageLog) -> int:
+        ckpt = log.read_checkpoint()
+        records = log.tail(self._history.capacity)
+        with self._lock:
+            if ckpt is not None:
+                self._load_counters(ckpt["counters"])
+                replay = log.records_after(ckpt.get("segment"), int(ckpt.get("index", 0)))
+            else:
+                replay = log.records_after()
+            for rec in replay:
+                self._replay_record(rec)
+            self.stats.suppressed_total = sum(self._per_node_suppressed.values())
+            for rec in records:
+                self._append_recent(
+                    {"ts": rec["ts"], "value": rec["value"]},
+                    rec["node"],
+                    bool(rec["spike"]),
+                    rec["start_s"],
+                    rec["airtime_s"],
+                    rec["energy_j"],
+                )
+        return len(records)
 
     def loop_once(self, timeout: float = 0.5):
         try:
             msg = self.inq.get(timeout=timeout)
         except Empty:
+            self.flush_reorder()
             return None
+        self.process_many(msg if isinstance(msg, list) else (msg,))
+        return msg
+
+    def process_many(self, msgs: Iterable[Dict[str, Any]]) -> int:
+        t0 = time.perf_counter()
         with self._lock:
+            self._h_lock_wait.observe(time.perf_counter() - t0)
+            if self.time_mode == "event":
+                msgs = self._admit(msgs)
+            return self._process_locked(msgs)
+
+    def _process_locked(self, msgs: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        perf = time.perf_counter
+        h_process = self._h_process
+        h_ingest = self._h_ingest
+        t = perf()
+        for msg in msgs:
             self._process_message(msg)
-        return msg
+            t1 = perf()
+            h_process.observe(t1 - t)
+            recv = msg.get("recv_mono")
+            if recv is not None:
+                h_ingest.observe(t1 - recv)
+            t = t1
+            n += 1
+        return n
+
+    def _admit(self, msgs: Iterable[Dict[str, Any]]) -> list[Dict[str, Any]]:
+        rs = self.reorder_stats
+        heap = self._reorder
+        wall = self._clock()
+        self._last_arrival = wall
+        horizon = wall + self.max_future_s
+        for msg in msgs:
+            ev = to_epoch(msg.get("ts"), wall)
+            if ev > horizon:
+                ev = wall
+                rs.clamped += 1
+            if ev < self._watermark:
+                rs.late_dropped += 1
+                continue
+            rs.admitted += 1
+            msg["event_s"] = ev
+            msg["arrival_s"] = wall
+            self._reorder_seq += 1
+            heapq.heappush(heap, (ev, self._reorder_seq, msg))
+            if ev > self._max_event:
+                self._max_event = ev
+        if len(heap) > rs.max_buffered:
+            rs.max_buffered = len(heap)
+        return self._release(self._max_event - self.reorder_window_s)
+
+    def _release(self, watermark: float) -> list[Dict[str, Any]]:
+        heap = self._reorder
+        rs = self.reorder_stats
+        limit = self.reorder_max
+        out: list[Dict[str, Any]] = []
+        last_seq = self._last_released_seq
+        while heap and (heap[0][0] <= watermark or len(heap) > limit):
+            ev, seq, msg = heapq.heappop(heap)
+            if ev > watermark:
+                rs.forced += 1
+                watermark = ev
+            if seq < last_seq:
+                rs.reordered += 1
+            else:
+                last_seq = seq
+            out.append(msg)
+        self._last_released_seq = last_seq
+        if watermark > self._watermark:
+            self._watermark = watermark
+        if out:
+            wall = self._clock()
+            rs.released += len(out)
+            for msg in out:
+                d = wall - msg["arrival_s"]
+                rs.delay_s_total += d
+                if d > rs.delay_s_max:
+                    rs.delay_s_max = d
+        return out
+
+    def flush_reorder(self, force: bool = False) -> int:
+        if self.time_mode != "event" or not self._reorder:
+            return 0
+        with self._lock:
+            if not self._reorder or (not force and self._clock() - self._last_arrival < self.reorder_window_s):
+                return 0
+            self.reorder_stats.idle_flushes += 1
+            return self._process_locked(self._release(self._max_event))
+
+    def run_flusher(self, interval_s: float = 0.1) -> None:
+        while not self._stop.wait(interval_s):
+            self.flush_reorder()
+
+    def _event_time_snapshot(self) -> Optional[Dict[str, Any]]:
+        if self.time_mode != "event":
+            return None
+        wm = self._watermark
+        return {
+            "window_s": self.reorder_window_s,
+            "buffered": len(self._reorder),
+            "watermark_iso": to_iso(wm) if wm > float("-inf") else None,
+            "watermark_lag_s": self._clock() - wm if wm > float("-inf") else None,
+            **self.reorder_stats.snapshot(),
+        }
+
+    def loop_batch(self, timeout: float = 0.5) -> list[Dict[str, Any]]:
+        try:
+            msg = self.inq.get(timeout=timeout)
+        except Empty:
+            self.flush_reorder()
+            return []
+        t0 = time.perf_counter()
+        batch = msg if isinstance(msg, list) else [msg]
+        deadline = t0 + self.batch_wait_s
+        while len(batch) < self.batch_max:
+            try:
+                msg = self.inq.get_nowait()
+            except Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    msg = self.inq.get(timeout=remaining)
+                except Empty:
+                    break
+            if isinstance(msg, list):
+                batch.extend(msg)
+            else:
+                batch.append(msg)
+        t1 = time.perf_counter()
+        self.process_many(batch)
+        self.batch_stats.record(len(batch), t1 - t0, time.perf_counter() - t1)
+        return batch
 
     def run(self, timeout: float = 0.5) -> None:
+        step = self.loop_batch if self.batch_max > 1 else self.loop_once
         while not self._stop.is_set():
-            self.loop_once(timeout=timeout)
+            step(timeout=timeout)
+
+    def _aligned_series(self, timestamps: list, node_col, value_col, keys: list) -> Dict[str, Dict[str, Any]]:
+        n = len(timestamps)
+        series: Dict[int, list] = {}
+        for i, (node_idx, v) in enumerate(zip(node_col, value_col)):
+            if node_idx < 0:
+                continue
+            values = series.get(node_idx)
+            if values is None:
+                values = series[node_idx] = [None] * n
+            values[i] = v
+        return {keys[idx]: {"values": values} for idx, values in series.items()}
 
-    def snapshot_metrics(self) -> Dict[str, Any]:
+    def _downsampled_series(
+        self,
+        timestamps: list,
+        node_col,
+        value_col,
+        keys: list,
+        points: int,
+        start: Optional[float],
+        end: Optional[float],
+        method: str,
+    ) -> Dict[str, Dict[str, Any]]:
+        lo = float("-inf") if start is None else float(start)
+        hi = float("inf") if end is None else float(end)
+        series: Dict[int, tuple] = {}
+        for ts, node_idx, v in zip(timestamps, node_col, value_col):
+            if node_idx < 0 or ts < lo or ts > hi:
+                continue
+            xy = series.get(node_idx)
+            if xy is None:
+                xy = series[node_idx] = ([], [])
+            xy[0].append(ts)
+            xy[1].append(v)
+        nodes: Dict[str, Dict[str, Any]] = {}
+        for idx, (xs, ys) in series.items():
+            dx, dy = downsample(xs, ys, points, method)
+            nodes[keys[idx]] = {"ts": dx, "values": dy, "count": len(xs)}
+        return nodes
+
+    def _downsampled_messages(self, ts_col, node_col, value_col, keys: list, points: int) -> Dict[str, list]:
+        series = self._downsampled_series(ts_col, node_col, value_col, keys, points, None, None, "lttb")
+        rows = sorted((ts, key, v) for key, ent in series.items() for ts, v in zip(ent["ts"], ent["values"]))
+        return {"ts": [r[0] for r in rows], "node": [r[1] for r in rows], "value": [r[2] for r in rows]}
+
+    def _phy_snapshot(self) -> Dict[str, Any]:
+        inflight = self._recent_tx.buckets()
+        buckets = {
+            f"ch{ch}/sf{sf}": {"channel": ch, "sf": sf, "tx": c[0], "collided": c[1], "inflight": inflight.get((ch, sf), 0)}
+            for (ch, sf), c in sorted(self._per_bucket.items())
+        }
+        return {**self.phy.describe(), "buckets": buckets}
+
+    def delta_since(self, seq: int, points: Optional[int] = None) -> Dict[str, Any]:
+        points = self.auto_points if points is None else max(3, int(points))
         with self._lock:
-            data = list(self._recent_msgs)
-            timestamps = [d.get("ts") for d in data]
-            nodes_values: Dict[str, Dict[str, float]] = {}
-            for d in data:
-                ts = d.get("ts")
-                node = d.get("node")
-                if ts is None or node is None:
-                    continue
-                key = str(node)
-                nodes_values.setdefault(key, {})
-                try:
-                    nodes_values[key][ts] = float(d.get("value", 0.0))
-                except Exception:
-                    nodes_values[key][ts] = 0.0
-            nodes: Dict[str, Dict[str, Any]] = {}
-            for key, series in nodes_values.items():
-                nodes[key] = {"values": [series.get(ts) for ts in timestamps]}
-            if data:
-                now = time.time()
-                window = 60.0
-                count = 0
-                for d in data:
-                    ss = d.get("start_s")
-                    if ss is None:
-                        continue
-                    try:
-                        ssv = float(ss)
-                    except Exception:
-                        continue
-                    if ssv >= now - window:
-                        count += 1
-                msgs_per_sec = count / window
-                last_iso = data[-1].get("ts")
+            hist = self._history
+            n_new = hist.seq - int(seq)
+            reset = seq <= 0 or n_new < 0 or n_new > len(hist)
+            n = len(hist) if reset else n_new
+            ts_col = hist.tail("ts", n)
+            node_col = hist.tail("node", n)
+            value_col = hist.tail("value", n)
+            reduce = reset and n > points
+            if reduce:
+                keys = list(hist.nodes.keys)
             else:
-                msgs_per_sec = 0.0
-                last_iso = None
-            summary: Dict[str, Dict[str, float]] = {}
-            for d in data:
-                node = d.get("node")
-                if node is None:
-                    continue
-                key = str(node)
-                entry = summary.setdefault(
-                    key,
-                    {"count": 0, "energy_total": 0.0, "collisions": 0, "pairwise_collisions": 0},
-                )
-                entry["count"] += 1
-                e = d.get("energy_j")
-                if e is not None:
-                    try:
-                        entry["energy_total"] += float(e)
-                    except Exception:
-                        pass
-            for node_int, c in self._per_node_collisions.items():
-                key = str(node_int)
-                entry = summary.setdefault(
-                    key,
-                    {"count": 0, "energy_total": 0.0, "collisions": 0, "pairwise_collisions": 0},
-                )
-                entry["collisions"] = c
-            for node_int, p in self._per_node_pairwise.items():
-                key = str(node_int)
-                entry = summary.setdefault(
-                    key,
-                    {"count": 0, "energy_total": 0.0, "collisions": 0, "pairwise_collisions": 0},
-                )
-                entry["pairwise_collisions"] = p
+                keys = hist.nodes.keys
+                nodes = [keys[i] if i >= 0 else None for i in node_col]
+            cur = hist.seq
+            now = self._clock()
+            horizon = now - self._rate_window_s
+            rate = self._rate_starts
+            while rate and rate[0] < horizon:
+                rate.popleft()
+            rate_count = len(rate)
+            summary = {key: dict(entry) for key, entry in self._recent_summary.items()}
+            collisions = dict(self._per_node_collisions)
+            pairwise = dict(self._per_node_pairwise)
+            last_ts = hist.last("ts")
+            counters = {
+                "total_messages": self._total_messages,
+                "total_collided_messages": self._total_collided_messages,
+                "total_pairwise_overlaps": self._total_pairwise_overlaps,
+                "total_energy_j": self._total_energy_j,
+                "aggregator": {
+                    "fires": self.stats.fires,
+                    "theta": self.aggregator.theta,
+                    "suppressed_total": self.stats.suppressed_total,
+                },
+            }
+        self._merge_collisions(summary, collisions, pairwise)
+        counters["msgs_per_sec"] = rate_count / self._rate_window_s if len(hist) else 0.0
+        counters["collision_mode"] = self.collision_mode
+        counters["inhibition"] = self.inhibition.snapshot()
+        counters["last_updated_iso"] = to_iso(last_ts) if last_ts is not None else None
+        if reduce:
+            messages = self._downsampled_messages(ts_col, node_col, value_col, keys, points)
+        else:
+            messages = {"ts": ts_col.tolist(), "node": nodes, "value": value_col.tolist()}
+        delta = {
+            "seq": cur,
+            "reset": reset,
+            "capacity": hist.capacity,
+            "messages": messages,
+            "summary": summary,
+            "counters": counters,
+        }
+        if reduce:
+            delta["downsample"] = {"method": "lttb", "points": points}
+        return delta
+
+    def snapshot_metrics(
+        self,
+        points: Optional[int] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        method: str = "lttb",
+    ) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        with self._lock:
+            t_locked = time.perf_counter()
+            self._h_lock_wait.observe(t_locked - t0)
+            hist = self._history
+            ts_col = hist.column("ts")
+            node_col = hist.column("node")
+            value_col = hist.column("value")
+            keys = list(hist.nodes.keys)
+            now = self._clock()
+            horizon = now - self._rate_window_s
+            rate = self._rate_starts
+            while rate and rate[0] < horizon:
+                rate.popleft()
+            rate_count = len(rate)
+            summary = {key: dict(entry) for key, entry in self._recent_summary.items()}
+            collisions = dict(self._per_node_collisions)
+            pairwise = dict(self._per_node_pairwise)
             agg = {
                 "fires": self.stats.fires,
                 "theta": self.aggregator.theta,
                 "suppressed_total": self.stats.suppressed_total,
             }
-            return {
-                "nodes": nodes,
-                "timestamps": timestamps,
-                "summary": summary,
-                "msgs_per_sec": msgs_per_sec,
-                "aggregator": agg,
+            ingest = self.batch_stats.snapshot() if self.batch_max > 1 else None
+            totals = {
                 "total_messages": self._total_messages,
                 "total_collided_messages": self._total_collided_messages,
                 "total_pairwise_overlaps": self._total_pairwise_overlaps,
-                "collision_mode": self.collision_mode,
-                "inhibition": self.inhibition.snapshot(),
-                "last_updated_iso": last_iso,
-            }
\ No newline at end of file
+                "total_energy_j": self._total_energy_j,
+            }
+            phy = self._phy_snapshot()
+            event_time = self._event_time_snapshot()
+            self._h_snapshot_lock.observe(time.perf_counter() - t_locked)
+        timestamps = ts_col.tolist()
+        n = len(timestamps)
+        if points is None and n * len(keys) > self.dense_max_cells:
+            points = self.auto_points
+        if points is None:
+            nodes = self._aligned_series(timestamps, node_col, value_col, keys)
+        else:
+            nodes = self._downsampled_series(timestamps, node_col, value_col, keys, points, start, end, method)
+        if n:
+            msgs_per_sec = rate_count / self._rate_window_s
+            last_iso = to_iso(timestamps[-1])
+        else:
+            msgs_per_sec = 0.0
+            last_iso = None
+        self._merge_collisions(summary, collisions, pairwise)
+        metrics = {
+            "nodes": nodes,
+            "timestamps": timestamps if points is None else None,
+            "summary": summary,
+            "msgs_per_sec": msgs_per_sec,
+            "aggregator": agg,
+            **totals,
+            "collision_mode": self.collision_mode,
+            "inhibition": self.inhibition.snapshot(),
+            "last_updated_iso": last_iso,
+            "ingest": ingest,
+            "phy": phy,
+            "event_time": event_time,
+        }
+        if points is not None:
+            metrics["downsample"] = {"method": method, "points": int(points), "start": start, "end": end}
+        for name, fn in list(self._metrics_sources.items()):
+            metrics[name] = fn()
+        self._h_snapshot.observe(time.perf_counter() - t0)
+        return metrics
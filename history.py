@@ -0,0 +1,133 @@
+from __future__ import annotations
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+FLAG_SPIKE = 1
+MAX_EPOCH = 253402300799.0
+
+def to_epoch(ts: Any, default: float) -> float:
+    if isinstance(ts, (int, float)):
+        try:
+            ts = float(ts)
+        except OverflowError:
+            return default
+        return ts if 0.0 <= ts <= MAX_EPOCH else default
+    if isinstance(ts, str) and ts:
+        try:
+            dt = datetime.fromisoformat(ts)
+        except ValueError:
+            return default
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        ts = dt.timestamp()
+        return ts if 0.0 <= ts <= MAX_EPOCH else default
+    return default
+
+def to_iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+class NodeTable:
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self.names: List[str] = []
+        self.ips: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def intern(self, key: str, name: Any = None, ip: Any = None) -> int:
+        idx = self._index.get(key)
+        if idx is None:
+            idx = len(self.keys)
+            self._index[key] = idx
+            self.keys.append(key)
+            self.names.append(str(name) if name is not None else "")
+            self.ips.append(str(ip) if ip is not None else "")
+            return idx
+        if name is not None and self.names[idx] != name:
+            self.names[idx] = str(name)
+        if ip is not None and self.ips[idx] != ip:
+            self.ips[idx] = str(ip)
+        return idx
+
+    def lookup(self, key: str) -> Optional[int]:
+        return self._index.get(key)
+
+class MessageHistory:
+    COLUMNS = {
+        "ts": "d",
+        "start_s": "d",
+        "value": "d",
+        "airtime_s": "d",
+        "energy_j": "d",
+        "node": "i",
+        "flags": "B",
+    }
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, int(capacity))
+        self.nodes = NodeTable()
+        self._cols: Dict[str, array] = {
+            name: array(code, [0]) * self.capacity for name, code in self.COLUMNS.items()
+        }
+        self._head = 0
+        self._size = 0
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(
+        self,
+        ts: float,
+        node: int,
+        value: float,
+        flags: int,
+        start_s: float,
+        airtime_s: float,
+        energy_j: float,
+    ) -> Optional[Tuple[int, float]]:
+        cols = self._cols
+        i = self._head
+        evicted = None
+        if self._size == self.capacity:
+            evicted = (cols["node"][i], cols["energy_j"][i])
+        else:
+            self._size += 1
+        cols["ts"][i] = ts
+        cols["start_s"][i] = start_s
+        cols["value"][i] = value
+        cols["airtime_s"][i] = airtime_s
+        cols["energy_j"][i] = energy_j
+        cols["node"][i] = node
+        cols["flags"][i] = flags
+        self._head = i + 1 if i + 1 < self.capacity else 0
+        self.seq += 1
+        return evicted
+
+    def column(self, name: str) -> array:
+        col = self._cols[name]
+        if self._size < self.capacity:
+            return col[: self._size]
+        h = self._head
+        return col[h:] + col[:h]
+
+    def tail(self, name: str, n: int) -> array:
+        col = self._cols[name]
+        n = max(0, min(int(n), self._size))
+        h = self._head
+        start = h - n
+        if start >= 0:
+            return col[start:h]
+        return col[start + self.capacity :] + col[:h]
+
+    def last(self, name: str) -> Any:
+        if self._size == 0:
+            return None
+        return self._cols[name][self._head - 1]
+
+    def clear(self) -> None:
+        self._head = 0
+        self._size = 0
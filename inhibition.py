@@ -1,30 +1,156 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
 from threading import Lock
+from typing import Callable, Tuple
+import os
+import struct
 import time
 
+_SEQ = struct.Struct("<Q")
+_BODY = struct.Struct("<Qddq")
+SHM_SIZE = _SEQ.size + _BODY.size
+READ_DEADLINE_S = 0.05
+_CREATED: set = set()
+
+class VirtualClock:
+    def __init__(self, start: float = 0.0) -> None:
+        self.now = float(start)
+
+    def __call__(self) -> float:
+        return self.now
+
 @dataclass
 class InhibitionState:
     beta: float = 1.0
     expiry_ts: float = 0.0
     step_s: float = 1.0
+    clock: Callable[[], float] = field(default=time.time, repr=False)
     _lock: Lock = field(default_factory=Lock, init=False, repr=False)
 
     def activate(self, beta: float, t_inh_steps: int) -> None:
         with self._lock:
             self.beta = float(beta)
-            self.expiry_ts = time.time() + max(0, int(t_inh_steps)) * float(self.step_s)
+            self.expiry_ts = self.clock() + max(0, int(t_inh_steps)) * float(self.step_s)
+
+    def restore(self, beta: float, expiry_ts: float, t_inh_steps: int = 0) -> None:
+        with self._lock:
+            self.beta = float(beta)
+            self.expiry_ts = float(expiry_ts)
 
     def current_beta(self) -> float:
         with self._lock:
-            if self.expiry_ts <= time.time():
+            if self.expiry_ts <= self.clock():
                 return 1.0
             return self.beta
 
     def snapshot(self) -> dict:
         with self._lock:
-            if self.expiry_ts <= time.time():
+            if self.expiry_ts <= self.clock():
                 b = 1.0
             else:
                 b = self.beta
-            return {"beta": float(b), "expiry_ts": float(self.expiry_ts)}
\ No newline at end of file
+            return {"beta": float(b), "expiry_ts": float(self.expiry_ts)}
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix" and shm.name not in _CREATED:
+            resource_tracker.unregister("/" + shm.name, "shared_memory")
+        return shm
+
+class SharedInhibitionState:
+    def __init__(
+        self,
+        name: str,
+        create: bool = False,
+        step_s: float = 1.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.name = name
+        self.step_s = float(step_s)
+        self.clock = clock
+        self.owner = bool(create)
+        self.retries = 0
+        self.stale_reads = 0
+        self._last: Tuple[int, float, float, int] = (0, 1.0, 0.0, 0)
+        self._lock = Lock()
+        if create:
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=SHM_SIZE)
+            except FileExistsError:
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=SHM_SIZE)
+            _CREATED.add(self._shm.name)
+            _SEQ.pack_into(self._shm.buf, 0, 0)
+            _BODY.pack_into(self._shm.buf, _SEQ.size, 0, 1.0, 0.0, 0)
+        else:
+            self._shm = _attach(name)
+        self._buf = self._shm.buf
+
+    def _write(self, beta: float, expiry_ts: float, t_inh_steps: int) -> None:
+        buf = self._buf
+        with self._lock:
+            seq = _SEQ.unpack_from(buf, 0)[0]
+            seq += seq & 1
+            gen = _BODY.unpack_from(buf, _SEQ.size)[0]
+            _SEQ.pack_into(buf, 0, seq + 1)
+            _BODY.pack_into(buf, _SEQ.size, gen + 1, beta, expiry_ts, t_inh_steps)
+            _SEQ.pack_into(buf, 0, seq + 2)
+
+    def read(self) -> Tuple[int, float, float, int]:
+        buf = self._buf
+        deadline = None
+        while True:
+            seq = _SEQ.unpack_from(buf, 0)[0]
+            if not seq & 1:
+                body = _BODY.unpack_from(buf, _SEQ.size)
+                if _SEQ.unpack_from(buf, 0)[0] == seq:
+                    self._last = body
+                    return body
+            self.retries += 1
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + READ_DEADLINE_S
+            elif now >= deadline:
+                self.stale_reads += 1
+                return self._last
+            time.sleep(0)
+
+    def activate(self, beta: float, t_inh_steps: int) -> None:
+        t_inh = max(0, int(t_inh_steps))
+        self._write(float(beta), self.clock() + t_inh * self.step_s, t_inh)
+
+    def restore(self, beta: float, expiry_ts: float, t_inh_steps: int = 0) -> None:
+        self._write(float(beta), float(expiry_ts), max(0, int(t_inh_steps)))
+
+    def current_beta(self) -> float:
+        _, beta, expiry_ts, _ = self.read()
+        if expiry_ts <= self.clock():
+            return 1.0
+        return beta
+
+    def snapshot(self) -> dict:
+        gen, beta, expiry_ts, _ = self.read()
+        b = 1.0 if expiry_ts <= self.clock() else beta
+        return {
+            "beta": float(b),
+            "expiry_ts": float(expiry_ts),
+            "generation": gen,
+            "shm": self.name,
+            "stale_reads": self.stale_reads,
+        }
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+        if self.owner:
+            _CREATED.discard(self._shm.name)
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,6 +1,11 @@
 from __future__ import annotations
 from dataclasses import dataclass
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 @dataclass
 class LIFConfig:
     leak: float = 0.99
@@ -59,4 +64,46 @@ class LIFAggregator:
             self.v = 0.0
             self._r = self.refractory
             return True
-        return False
\ No newline at end of file
+        return False
+
+class LIFPopulation:
+    def __init__(self, n: int, leak=0.99, theta=50.0, refractory=0):
+        if np is None:
+            raise RuntimeError("LIFPopulation requires numpy")
+        self.n = int(n)
+        self.leak = np.broadcast_to(np.asarray(leak, dtype=np.float64), (self.n,)).copy()
+        self.theta_base = np.broadcast_to(np.asarray(theta, dtype=np.float64), (self.n,)).copy()
+        self.theta = self.theta_base.copy()
+        self.refractory = np.broadcast_to(np.asarray(refractory, dtype=np.int64), (self.n,)).copy()
+        self.u = np.zeros(self.n, dtype=np.float64)
+        self._r = np.zeros(self.n, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def reset(self) -> None:
+        self.u.fill(0.0)
+        self._r.fill(0)
+
+    def step(self, I, beta=1.0) -> tuple["np.ndarray", "np.ndarray"]:
+        I = np.broadcast_to(np.asarray(I, dtype=np.float64), (self.n,))
+        beta = np.broadcast_to(np.asarray(beta, dtype=np.float64), (self.n,))
+        refr = self._r > 0
+        active = ~refr
+        self._r[refr] -= 1
+        np.multiply(self.theta_base, beta, out=self.theta, where=active)
+        u_candidate = self.leak * self.u + I
+        spikes = active & (u_candidate >= self.theta)
+        suppressed = active & ~spikes & (beta > 1.0) & (u_candidate >= self.theta_base)
+        quiet = active & ~spikes
+        self.u[quiet] = u_candidate[quiet]
+        self.u[spikes] = 0.0
+        self._r[spikes] = self.refractory[spikes]
+        return spikes, suppressed
+
+    def sensor(self, i: int) -> LIFSensor:
+        s = LIFSensor(leak=self.leak[i], theta=self.theta_base[i], refractory=self.refractory[i])
+        s.theta = float(self.theta[i])
+        s.u = float(self.u[i])
+        s._r = int(self._r[i])
+        return s
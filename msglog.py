@@ -0,0 +1,505 @@
+from __future__ import annotations
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from history import FLAG_SPIKE, to_epoch, to_iso
+
+FLAG_COLLIDED = 0x02
+FLAG_UPDATE = 0x04
+MAGIC = b"NEMLOG01"
+HEADER = struct.Struct("<8sQdd")
+RECORD = struct.Struct("<dddddiIBxH")
+FLAGS_OFFSET = 48
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".nel"
+CHECKPOINT_NAME = "counters.json"
+_SCAN_CHUNK = 4096
+_FLAGS = struct.Struct("<B")
+_APPEND = None
+
+def segment_path(directory: str, start_ts: float) -> str:
+    return os.path.join(directory, f"{SEGMENT_PREFIX}{int(round(start_ts * 1000)):015d}{SEGMENT_SUFFIX}")
+
+def list_segments(directory: str) -> List[Tuple[float, str]]:
+    out = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return out
+    for name in names:
+        if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+            continue
+        try:
+            start = int(name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)]) / 1000.0
+        except ValueError:
+            continue
+        out.append((start, os.path.join(directory, name)))
+    out.sort()
+    return out
+
+def read_header(path: str) -> Optional[Tuple[int, float, float]]:
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except OSError:
+        return None
+    if len(raw) < HEADER.size:
+        return None
+    magic, count, min_ts, max_ts = HEADER.unpack(raw)
+    if magic != MAGIC:
+        return None
+    return count, min_ts, max_ts
+
+def _record_dict(rec: tuple) -> Dict[str, Any]:
+    ts, start_s, value, airtime, energy, node, sup, flags, pairwise = rec
+    return {
+        "ts": ts,
+        "node": node if node >= 0 else None,
+        "value": value,
+        "spike": 1 if flags & FLAG_SPIKE else 0,
+        "collided": 1 if flags & FLAG_COLLIDED else 0,
+        "pairwise": pairwise,
+        "suppressed_total": sup,
+        "start_s": start_s,
+        "airtime_s": airtime,
+        "energy_j": energy,
+    }
+
+def _segment_records(path: str, start: int = 0) -> Iterator[tuple]:
+    hdr = read_header(path)
+    if hdr is None or hdr[0] <= start:
+        return
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        count = min(hdr[0], (len(mm) - HEADER.size) // RECORD.size)
+        pos = start
+        while pos < count:
+            n = min(_SCAN_CHUNK, count - pos)
+            off = HEADER.size + pos * RECORD.size
+            chunk = mm[off : off + n * RECORD.size]
+            pos += n
+            yield from RECORD.iter_unpack(chunk)
+    finally:
+        mm.close()
+
+def read_checkpoint(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, CHECKPOINT_NAME)) as f:
+            ckpt = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return ckpt if isinstance(ckpt, dict) and "counters" in ckpt else None
+
+def records_after(directory: str, segment: Optional[str] = None, index: int = 0) -> Iterator[tuple]:
+    for _, path in list_segments(directory):
+        name = os.path.basename(path)
+        if segment is not None and name < segment:
+            continue
+        yield from _segment_records(path, index if name == segment else 0)
+
+def scan(directory: str, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+    lo = -math.inf if start_ts is None else float(start_ts)
+    hi = math.inf if end_ts is None else float(end_ts)
+    for _, path in list_segments(directory):
+        hdr = read_header(path)
+        if hdr is None:
+            continue
+        count, min_ts, max_ts = hdr
+        if count == 0 or max_ts < lo or min_ts > hi:
+            continue
+        inside = lo <= min_ts and max_ts <= hi
+        for rec in _segment_records(path):
+            if rec[7] & FLAG_UPDATE:
+                continue
+            if inside or lo <= rec[0] <= hi:
+                yield _record_dict(rec)
+
+def tail(directory: str, n: int) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    need = max(0, int(n))
+    for _, path in reversed(list_segments(directory)):
+        if need <= 0:
+            break
+        hdr = read_header(path)
+        if hdr is None or hdr[0] == 0:
+            continue
+        count = hdr[0]
+        with open(path, "rb") as f:
+            while need > 0 and count > 0:
+                take = min(max(need, _SCAN_CHUNK), count)
+                count -= take
+                f.seek(HEADER.size + count * RECORD.size)
+                raw = f.read(take * RECORD.size)
+                recs = [
+                    _record_dict(rec)
+                    for rec in RECORD.iter_unpack(raw[: len(raw) - len(raw) % RECORD.size])
+                    if not rec[7] & FLAG_UPDATE
+                ]
+                recs = recs[-need:]
+                out[:0] = recs
+                need -= len(recs)
+    return out
+
+@dataclass
+class MessageLogStats:
+    appended: int = 0
+    updates: int = 0
+    patched: int = 0
+    checkpoints: int = 0
+    written: int = 0
+    dropped: int = 0
+    errors: int = 0
+    flushes: int = 0
+    segments_created: int = 0
+    segments_deleted: int = 0
+    flush_s_total: float = 0.0
+    flush_s_max: float = 0.0
+
+class _Segment:
+    def __init__(self, path: str, start_ts: float, capacity: int) -> None:
+        self.path = path
+        self.start_ts = start_ts
+        size = HEADER.size + capacity * RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            size = os.fstat(fd).st_size
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self.capacity = (size - HEADER.size) // RECORD.size
+        magic, count, min_ts, max_ts = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            count, min_ts, max_ts = 0, math.inf, -math.inf
+        self.count = min(count, self.capacity)
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+        self._dirty_from = self.count
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def mark(self, index: int, flags: int) -> None:
+        off = HEADER.size + index * RECORD.size + FLAGS_OFFSET
+        self.mm[off] |= flags
+        if index < self._dirty_from:
+            self._dirty_from = index
+
+    def write(self, rec: tuple) -> None:
+        RECORD.pack_into(self.mm, HEADER.size + self.count * RECORD.size, *rec)
+        self.count += 1
+        ts = rec[0]
+        if ts < self.min_ts:
+            self.min_ts = ts
+        if ts > self.max_ts:
+            self.max_ts = ts
+
+    def sync(self) -> None:
+        HEADER.pack_into(self.mm, 0, MAGIC, self.count, self.min_ts, self.max_ts)
+        start = HEADER.size + self._dirty_from * RECORD.size
+        page = mmap.ALLOCATIONGRANULARITY
+        start -= start % page
+        end = HEADER.size + self.count * RECORD.size
+        self.mm.flush(0, HEADER.size)
+        if end > start:
+            self.mm.flush(start, end - start)
+        self._dirty_from = self.count
+
+    def close(self) -> None:
+        self.sync()
+        self.mm.close()
+
+class MessageLog:
+    def __init__(
+        self,
+        directory: str,
+        segment_s: float = 3600.0,
+        segment_records: int = 1 << 16,
+        retention_s: float = 7 * 86400.0,
+        flush_interval_s: float = 0.2,
+        max_pending: int = 1 << 18,
+        max_locations: int = 1 << 16,
+    ) -> None:
+        self.directory = directory
+        self.segment_s = max(1.0, float(segment_s))
+        self.segment_records = max(1, int(segment_records))
+        self.retention_s = float(retention_s)
+        self.flush_interval_s = max(0.001, float(flush_interval_s))
+        self.max_pending = max(1, int(max_pending))
+        self.max_locations = max(1, int(max_locations))
+        self.stats = MessageLogStats()
+        self._pending: deque[tuple] = deque()
+        self._next_ref = 0
+        self._written_ref = 0
+        self._now = -math.inf
+        self._where: Dict[int, Tuple[str, int]] = {}
+        self._where_order: deque[int] = deque()
+        self._segment: Optional[_Segment] = None
+        self._segment_end = -math.inf
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def append(
+        self,
+        ts: float,
+        node: Optional[int],
+        value: float,
+        flags: int,
+        start_s: float,
+        airtime_s: float,
+        energy_j: float,
+        suppressed_total: int = 0,
+        pairwise: int = 0,
+    ) -> int:
+        if len(self._pending) >= self.max_pending:
+            self.stats.dropped += 1
+            return -1
+        rec = (
+            ts,
+            start_s,
+            value,
+            airtime_s,
+            energy_j,
+            -1 if node is None else node,
+            suppressed_total & 0xFFFFFFFF,
+            flags,
+            min(pairwise, 0xFFFF),
+        )
+        self._pending.append((rec, _APPEND))
+        self.stats.appended += 1
+        ref = self._next_ref
+        self._next_ref += 1
+        return ref
+
+    def update(self, ref: int, ts: float, node: int, start_s: float, collided: bool) -> None:
+        if ref < 0 or len(self._pending) >= self.max_pending:
+            self.stats.dropped += 1
+            return
+        flags = FLAG_UPDATE | (FLAG_COLLIDED if collided else 0)
+        self._pending.append(((ts, start_s, 0.0, 0.0, 0.0, node, 0, flags, 1), ref))
+        self.stats.updates += 1
+
+    def checkpoint(self, counters: Dict[str, Any]) -> None:
+        self._pending.append((None, counters))
+
+    def start(self) -> "MessageLog":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="msglog-flusher", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval_s):
+            self._flush_logged()
+        self._flush_logged()
+
+    def _flush_logged(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            self.stats.errors += 1
+            print(f"msglog: flush failed in {self.directory}: {e!r}")
+
+    def _open_segment(self, now: float) -> _Segment:
+        if self._segment is not None:
+            self._segment.close()
+        start = math.floor(now / self.segment_s) * self.segment_s
+        self._segment_end = start + self.segment_s
+        existing = list_segments(self.directory)
+        if existing and existing[-1][0] >= start:
+            last_start, last_path = existing[-1]
+            hdr = read_header(last_path)
+            full = hdr is not None and hdr[0] >= self.segment_records
+            start = last_start + 0.001 if full else last_start
+        path = segment_path(self.directory, start)
+        if not os.path.exists(path):
+            self.stats.segments_created += 1
+        self._segment = _Segment(path, start, self.segment_records)
+        self._expire(now)
+        return self._segment
+
+    def _expire(self, now: float) -> None:
+        if self.retention_s <= 0:
+            return
+        cutoff = now - self.retention_s
+        active = self._segment.path if self._segment is not None else None
+        for start, path in list_segments(self.directory):
+            if path == active:
+                continue
+            hdr = read_header(path)
+            if hdr is None or hdr[0] == 0 or start + self.segment_s < cutoff:
+                try:
+                    os.remove(path)
+                    self.stats.segments_deleted += 1
+                except OSError:
+                    pass
+
+    def flush(self) -> int:
+        pending = self._pending
+        if not pending:
+            return 0
+        t0 = time.perf_counter()
+        n = 0
+        with self._write_lock:
+            seg = self._segment
+            while pending:
+                rec, ref = pending.popleft()
+                if rec is None:
+                    if seg is not None:
+                        seg.sync()
+                    self._write_checkpoint(ref, seg)
+                    continue
+                now = self._advance(rec[1])
+                if seg is None or seg.full() or now >= self._segment_end:
+                    seg = self._open_segment(now)
+                if ref is _APPEND:
+                    self._remember(self._written_ref, seg.path, seg.count)
+                    self._written_ref += 1
+                elif rec[7] & FLAG_COLLIDED:
+                    self._patch(ref, FLAG_COLLIDED)
+                seg.write(rec)
+                n += 1
+            if seg is not None:
+                seg.sync()
+        dt = time.perf_counter() - t0
+        st = self.stats
+        st.written += n
+        st.flushes += 1
+        st.flush_s_total += dt
+        if dt > st.flush_s_max:
+            st.flush_s_max = dt
+        return n
+
+    def _advance(self, start_s: float) -> float:
+        if math.isfinite(start_s) and start_s > self._now:
+            self._now = start_s
+        elif not math.isfinite(self._now):
+            self._now = time.time()
+        return self._now
+
+    def _remember(self, ref: int, path: str, index: int) -> None:
+        self._where[ref] = (path, index)
+        self._where_order.append(ref)
+        while len(self._where_order) > self.max_locations:
+            self._where.pop(self._where_order.popleft(), None)
+
+    def _patch(self, ref: int, flags: int) -> None:
+        loc = self._where.get(ref)
+        if loc is None:
+            return
+        path, index = loc
+        seg = self._segment
+        if seg is not None and seg.path == path:
+            seg.mark(index, flags)
+        else:
+            off = HEADER.size + index * RECORD.size + FLAGS_OFFSET
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except OSError:
+                return
+            try:
+                cur = os.pread(fd, 1, off)
+                if len(cur) == 1:
+                    os.pwrite(fd, _FLAGS.pack(cur[0] | flags), off)
+            finally:
+                os.close(fd)
+        self.stats.patched += 1
+
+    def _write_checkpoint(self, counters: Dict[str, Any], seg: Optional[_Segment]) -> None:
+        ckpt = {
+            "segment": os.path.basename(seg.path) if seg is not None else None,
+            "index": seg.count if seg is not None else 0,
+            "counters": counters,
+        }
+        path = os.path.join(self.directory, CHECKPOINT_NAME)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(ckpt, f)
+        os.replace(tmp, path)
+        self.stats.checkpoints += 1
+
+    def read_checkpoint(self) -> Optional[Dict[str, Any]]:
+        return read_checkpoint(self.directory)
+
+    def records_after(self, segment: Optional[str] = None, index: int = 0) -> Iterator[tuple]:
+        return records_after(self.directory, segment, index)
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def scan(self, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        return scan(self.directory, start_ts, end_ts)
+
+    def tail(self, n: int) -> List[Dict[str, Any]]:
+        return tail(self.directory, n)
+
+    def snapshot(self) -> Dict[str, Any]:
+        st = asdict(self.stats)
+        segs = list_segments(self.directory)
+        flushes = max(1, st["flushes"])
+        return {
+            "directory": self.directory,
+            "segments": len(segs),
+            "pending": len(self._pending),
+            "appended": st["appended"],
+            "updates": st["updates"],
+            "patched": st["patched"],
+            "checkpoints": st["checkpoints"],
+            "written": st["written"],
+            "dropped": st["dropped"],
+            "errors": st["errors"],
+            "flushes": st["flushes"],
+            "segments_created": st["segments_created"],
+            "segments_deleted": st["segments_deleted"],
+            "mean_flush_ms": 1000.0 * st["flush_s_total"] / flushes,
+            "max_flush_ms": 1000.0 * st["flush_s_max"],
+        }
+
+def _parse_ts(value: str, default: float) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return to_epoch(value, default)
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("directory", type=str)
+    p.add_argument("--start", type=str, default="")
+    p.add_argument("--end", type=str, default="")
+    p.add_argument("--tail", type=int, default=0)
+    p.add_argument("--iso", action="store_true")
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    if args.tail > 0:
+        records = iter(tail(args.directory, args.tail))
+    else:
+        records = scan(args.directory, _parse_ts(args.start, -math.inf), _parse_ts(args.end, math.inf))
+    for rec in records:
+        if args.iso:
+            rec["ts"] = to_iso(rec["ts"])
+        print(json.dumps(rec))
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,84 @@
 from __future__ import annotations
 import argparse
+import errno
 import json
 import math
+import os
 import random
+import selectors
+import signal
 import socket
-import threading
 import time
+from collections import deque
+from dataclasses import asdict, dataclass
 from datetime import datetime, timezone
+from inhibition import SharedInhibitionState
 from lif import LIFSensor
+from phy import pack_radio
+from protocol import PROTO_BIN, PROTO_JSON, PROTOCOLS, encode_frame, hello
+
+DEFAULT_BATCH_LATENCY_S = 0.1
+CONNECT_TIMEOUT_S = 5.0
+HELLO_TIMEOUT_S = 2.0
+_CONNECT_PENDING = (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK))
+
+@dataclass
+class SendStats:
+    messages: int = 0
+    writes: int = 0
+    max_batch: int = 0
+    flush_count: int = 0
+    flush_latency: int = 0
+    flush_spike: int = 0
+    flush_final: int = 0
+    added_latency_s_total: float = 0.0
+    added_latency_s_max: float = 0.0
+
+    def snapshot(self) -> dict:
+        d = asdict(self)
+        d["mean_batch"] = self.messages / max(1, self.writes)
+        d["mean_added_latency_ms"] = 1000.0 * self.added_latency_s_total / max(1, self.messages)
+        d["max_added_latency_ms"] = 1000.0 * self.added_latency_s_max
+        return d
+
+@dataclass
+class LoopStats:
+    ticks: int = 0
+    overruns: int = 0
+    lag_s_total: float = 0.0
+    lag_s_max: float = 0.0
+    wakeups: int = 0
+    reads: int = 0
+    write_stalls: int = 0
+    backpressured: int = 0
+
+    def snapshot(self) -> dict:
+        n = max(1, self.ticks)
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "lag_ms_mean": 1000.0 * self.lag_s_total / n,
+            "lag_ms_max": 1000.0 * self.lag_s_max,
+            "wakeups": self.wakeups,
+            "reads": self.reads,
+            "write_stalls": self.write_stalls,
+            "backpressured": self.backpressured,
+        }
+
+@dataclass
+class LinkStats:
+    connects: int = 0
+    disconnects: int = 0
+    connect_failures: int = 0
+    buffered: int = 0
+    dropped: int = 0
+    replayed: int = 0
+    backoff_s_total: float = 0.0
+
+    def snapshot(self, backlog: int = 0) -> dict:
+        d = asdict(self)
+        d["backlog"] = backlog
+        return d
 
 class NodeClient:
     def __init__(
@@ -24,6 +95,18 @@ class NodeClient:
         lif_leak: float,
         lif_refractory: int,
         baseline_interval: int,
+        proto: str = PROTO_JSON,
+        batch_latency_s: float = 0.0,
+        batch_max: int = 1,
+        strict_spikes: bool = False,
+        sf: int = 0,
+        channel: int = 0,
+        shm_inhibit: str = "",
+        reconnect: bool = True,
+        backoff_initial_s: float = 0.5,
+        backoff_max_s: float = 30.0,
+        offline_buffer: int = 1000,
+        max_write_buffer: int = 1 << 18,
     ) -> None:
         self.node_id = int(node_id)
         self.host = host
@@ -41,10 +124,49 @@ class NodeClient:
         self.inhibited_steps = 0
         self.total_spikes = 0
         self.suppressed_total = 0
+        self.proto = proto
+        self._proto = PROTO_JSON
         self.sock: socket.socket | None = None
+        self._csock: socket.socket | None = None
+        self._cstage = ""
+        self._cdeadline = 0.0
+        self._hello_shm: SharedInhibitionState | None = None
+        self._next_connect = 0.0
+        self._attempt = 0
+        self._sel: selectors.BaseSelector | None = None
+        self._rbuf = bytearray()
+        self._wbuf = bytearray()
+        self._wsent = 0
+        self._wpending: deque[tuple[int, dict]] = deque()
+        self.loop_stats = LoopStats()
+        self.batch_latency_s = max(0.0, float(batch_latency_s))
+        self.batch_max = max(1, int(batch_max))
+        if self.batch_max > 1 and self.batch_latency_s <= 0.0:
+            self.batch_latency_s = DEFAULT_BATCH_LATENCY_S
+        self.strict_spikes = bool(strict_spikes)
+        self.sf = int(sf)
+        self.channel = int(channel)
+        self._radio = pack_radio(self.sf, self.channel)
+        self.shm_inhibit = shm_inhibit
+        self._shm: SharedInhibitionState | None = None
+        self._shm_gen = 0
+        self.send_stats = SendStats()
+        self._outbuf: list[bytes] = []
+        self._outbuf_t: list[float] = []
+        self._outbuf_msgs: list[dict] = []
+        self.reconnect = bool(reconnect)
+        self.backoff_initial_s = max(0.001, float(backoff_initial_s))
+        self.backoff_max_s = max(self.backoff_initial_s, float(backoff_max_s))
+        self.offline_buffer = max(0, int(offline_buffer))
+        self.max_write_buffer = max(1, int(max_write_buffer))
+        self.link_stats = LinkStats()
+        self._backlog: deque[dict] = deque()
+        self._rng = random.Random()
 
-    def _now_iso(self) -> str:
-        return datetime.now(timezone.utc).isoformat()
+    def _now_iso(self, now: float | None = None) -> str:
+        if now is None:
+            return datetime.now(timezone.utc).isoformat()
+        return datetime.fromtimestamp(now, timezone.utc).isoformat()
 
     def _drive_value(self) -> float:
         t = self._i * self.step_s
@@ -52,84 +174,490 @@ class NodeClient:
         noise = random.gauss(0.0, 1.0)
         return base + noise
 
-    def _recv_loop(self) -> None:
-        if self.sock is None:
+    def attach_shm(self) -> SharedInhibitionState | None:
+        if not self.shm_inhibit:
+            return None
+        try:
+            return SharedInhibitionState(self.shm_inhibit)
+        except (FileNotFoundError, OSError) as e:
+            print(f"node {self.node_id}: shared inhibition {self.shm_inhibit!r} unavailable: {e}")
+            return None
+
+    def use_shm(self, shm: SharedInhibitionState | None) -> None:
+        self._shm = shm
+        self._shm_gen = 0
+
+    def _poll_shm(self, now: float) -> None:
+        gen, beta, expiry_ts, t_inh = self._shm.read()
+        if gen != self._shm_gen:
+            self._shm_gen = gen
+            if expiry_ts > now:
+                self.beta = beta
+                self.inhibited_steps = t_inh
+
+    def _finish_hello(self, line: bytes | None) -> None:
+        shm = self._hello_shm
+        self._hello_shm = None
+        ack = None
+        if line is not None:
+            try:
+                ack = json.loads(line)
+            except Exception:
+                ack = None
+        if isinstance(ack, dict) and ack.get("cmd") == "hello" and ack.get("proto") in PROTOCOLS:
+            self._proto = ack["proto"]
+            if shm is not None and ack.get("shm") == self.shm_inhibit:
+                self.use_shm(shm)
+        if shm is not None and self._shm is None:
+            shm.close()
+
+    def _encode(self, msg: dict) -> bytes:
+        if self._proto == PROTO_BIN:
+            return encode_frame(
+                self.node_id, msg["ts"], msg["value"], msg["spike"] == 1, msg["suppressed_total"], self._radio
+            )
+        return (json.dumps({**msg, "ts": self._now_iso(msg["ts"])}) + "\n").encode("utf-8")
+
+    def _buffer(self, msg: dict) -> None:
+        if self.offline_buffer <= 0:
+            self.link_stats.dropped += 1
+            return
+        backlog = self._backlog
+        while len(backlog) >= self.offline_buffer:
+            backlog.popleft()
+            self.link_stats.dropped += 1
+        backlog.append(msg)
+        self.link_stats.buffered += 1
+
+    def _requeue(self, msgs: list[dict]) -> None:
+        if not msgs:
             return
-        f = self.sock.makefile("r")
-        while self.running:
+        backlog = self._backlog
+        backlog.extendleft(reversed(msgs))
+        self.link_stats.buffered += len(msgs)
+        while len(backlog) > self.offline_buffer:
+            backlog.popleft()
+            self.link_stats.dropped += 1
+
+    def _replay_backlog(self) -> None:
+        msgs = list(self._backlog)
+        if not msgs:
+            return
+        self._backlog.clear()
+        self.link_stats.replayed += len(msgs)
+        self._write([self._encode(m) for m in msgs], msgs)
+
+    def _encode_backlog(self, limit: int = 0) -> tuple[int, bytes]:
+        chunks: list[bytes] = []
+        size = 0
+        for m in self._backlog:
+            data = self._encode(m)
+            chunks.append(data)
+            size += len(data)
+            if limit and size >= limit:
+                break
+        return len(chunks), b"".join(chunks)
+
+    def _backlog_sent(self, n: int) -> None:
+        for _ in range(n):
+            self._backlog.popleft()
+        self.link_stats.replayed += n
+
+    def _backoff_s(self, attempt: int) -> float:
+        cap = min(self.backoff_max_s, self.backoff_initial_s * (2 ** min(attempt, 30)))
+        delay = self._rng.uniform(0.0, cap)
+        self.link_stats.backoff_s_total += delay
+        return delay
+
+    def _dispatch_lines(self) -> None:
+        if b"\n" not in self._rbuf:
+            return
+        *lines, rest = self._rbuf.split(b"\n")
+        self._rbuf = bytearray(rest)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
             try:
-                line = f.readline()
-                if not line:
-                    time.sleep(0.05)
-                    continue
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                except Exception:
-                    continue
-                if obj.get("cmd") == "inhibit":
-                    self.beta = float(obj.get("beta", 1.0))
-                    self.inhibited_steps = int(obj.get("t_inh", 0))
+                obj = json.loads(line)
             except Exception:
-                time.sleep(0.05)
+                continue
+            if isinstance(obj, dict):
+                self._apply_command(obj)
 
-    def run(self) -> None:
-        self.running = True
+    def _on_readable(self) -> None:
         try:
-            self.sock = socket.create_connection((self.host, self.port))
-        except Exception as e:
+            chunk = self.sock.recv(65536)
+        except BlockingIOError:
+            return
+        if not chunk:
+            raise ConnectionResetError("connection closed by gateway")
+        self.loop_stats.reads += 1
+        self._rbuf += chunk
+        self._dispatch_lines()
+
+    def _write(self, chunks: list[bytes], msgs: list[dict]) -> None:
+        data = b"".join(chunks) if len(chunks) > 1 else chunks[0]
+        sent = 0
+        err: OSError | None = None
+        queued = len(self._wbuf)
+        if not queued:
+            try:
+                sent = self.sock.send(data)
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                err = e
+            if sent == len(data):
+                return
+        end = self._wsent + queued - sent
+        for chunk, msg in zip(chunks, msgs):
+            end += len(chunk)
+            if end > self._wsent:
+                self._wpending.append((end, msg))
+        if err is not None:
+            raise err
+        if not queued:
+            self.loop_stats.write_stalls += 1
+            self._sel.modify(self.sock, selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self._wbuf += data[sent:]
+
+    def _on_writable(self) -> None:
+        try:
+            n = self.sock.send(self._wbuf)
+        except BlockingIOError:
+            return
+        del self._wbuf[:n]
+        self._wsent += n
+        pending = self._wpending
+        while pending and pending[0][0] <= self._wsent:
+            pending.popleft()
+        if not self._wbuf:
+            self._sel.modify(self.sock, selectors.EVENT_READ)
+            if self._backlog:
+                self._replay_backlog()
+
+    def _apply_command(self, obj: dict) -> None:
+        if obj.get("cmd") == "inhibit":
+            self.beta = float(obj.get("beta", 1.0))
+            self.inhibited_steps = int(obj.get("t_inh", 0))
+
+    def _tick(self, now: float) -> dict | None:
+        if self._shm is not None:
+            self._poll_shm(now)
+        v = self._drive_value()
+        I = float(v) * self.lif_scale
+        spike, suppressed = self._lif.step(I, beta=self.beta)
+        msg = {
+            "ts": now,
+            "node": self.node_id,
+            "name": self.name,
+            "ip": self.ip,
+            "value": float(v),
+        }
+        if spike:
+            msg["spike"] = 1
+            self.total_spikes += 1
+        else:
+            msg["spike"] = 0
+        if suppressed:
+            self.suppressed_total += 1
+        msg["suppressed_total"] = int(self.suppressed_total)
+        if self.sf:
+            msg["sf"] = self.sf
+            msg["ch"] = self.channel
+        send = False
+        if spike:
+            send = True
+        elif self.baseline_interval > 0 and (self._i % self.baseline_interval == 0):
+            send = True
+        if self.inhibited_steps > 0:
+            self.inhibited_steps -= 1
+            if self.inhibited_steps == 0:
+                self.beta = 1.0
+        self._i += 1
+        return msg if send else None
+
+    def _batching(self) -> bool:
+        return self.batch_latency_s > 0.0 or self.batch_max > 1
+
+    def _send(self, msg: dict, now: float) -> None:
+        if self._backlog or len(self._wbuf) >= self.max_write_buffer:
+            self.loop_stats.backpressured += 1
+            self._buffer(msg)
+            return
+        data = self._encode(msg)
+        if not self._batching():
+            self._write([data], [msg])
+            st = self.send_stats
+            st.messages += 1
+            st.writes += 1
+            st.max_batch = max(st.max_batch, 1)
+            return
+        self._outbuf.append(data)
+        self._outbuf_t.append(now)
+        self._outbuf_msgs.append(msg)
+        if self.strict_spikes and msg.get("spike") == 1:
+            self._flush(now, "spike")
+        elif len(self._outbuf) >= self.batch_max:
+            self._flush(now, "count")
+
+    def _flush_deadline(self) -> float | None:
+        if not self._outbuf_t or self.batch_latency_s <= 0.0:
+            return None
+        return self._outbuf_t[0] + self.batch_latency_s
+
+    def _flush(self, now: float, reason: str = "latency") -> None:
+        if not self._outbuf:
+            return
+        n = len(self._outbuf)
+        chunks = self._outbuf
+        msgs = self._outbuf_msgs
+        times = self._outbuf_t
+        self._outbuf = []
+        self._outbuf_t = []
+        self._outbuf_msgs = []
+        self._write(chunks, msgs)
+        st = self.send_stats
+        st.messages += n
+        st.writes += 1
+        st.max_batch = max(st.max_batch, n)
+        setattr(st, f"flush_{reason}", getattr(st, f"flush_{reason}") + 1)
+        waited = [now - t for t in times]
+        st.added_latency_s_total += sum(waited)
+        st.added_latency_s_max = max(st.added_latency_s_max, max(waited))
+
+    def _start_connect(self, now: float) -> None:
+        family, kind, proto, _, addr = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)[0]
+        sock = socket.socket(family, kind, proto)
+        try:
+            sock.setblocking(False)
+            err = sock.connect_ex(addr)
+            if err not in _CONNECT_PENDING:
+                raise OSError(err, os.strerror(err))
+            self._sel.register(sock, selectors.EVENT_WRITE)
+        except OSError:
+            sock.close()
+            raise
+        self._csock = sock
+        self._cstage = "connect"
+        self._cdeadline = now + CONNECT_TIMEOUT_S
+
+    def _on_connect_event(self, now: float) -> None:
+        sock = self._csock
+        if self._cstage == "connect":
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise OSError(err, os.strerror(err))
+            self._rbuf = bytearray()
+            self._proto = PROTO_JSON
+            if self._shm is not None:
+                self._shm.close()
+                self._shm = None
+            shm = self.attach_shm()
+            if self.proto == PROTO_JSON and shm is None:
+                self._link_up()
+                return
+            self._hello_shm = shm
+            sock.sendall(hello(self.node_id, self.name, self.ip, self.proto, self.shm_inhibit if shm else ""))
+            self._cstage = "hello"
+            self._cdeadline = now + HELLO_TIMEOUT_S
+            self._sel.modify(sock, selectors.EVENT_READ)
+            return
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionResetError("connection closed by gateway")
+        self._rbuf += chunk
+        if b"\n" not in self._rbuf:
+            return
+        line, _, rest = bytes(self._rbuf).partition(b"\n")
+        self._rbuf = bytearray(rest)
+        self._finish_hello(line)
+        self._link_up()
+
+    def _connect_timeout(self, now: float) -> None:
+        if self._cstage == "connect":
+            self._connect_failed(TimeoutError("timed out"), now)
+            return
+        self._finish_hello(None)
+        self._link_up()
+
+    def _link_up(self) -> None:
+        sock = self._csock
+        self._csock = None
+        self._cstage = ""
+        self.sock = sock
+        self._wbuf = bytearray()
+        self._wsent = 0
+        self._wpending.clear()
+        self._sel.modify(sock, selectors.EVENT_READ)
+        self.link_stats.connects += 1
+        self._attempt = 0
+        self._dispatch_lines()
+        self._replay_backlog()
+        print(
+            f"node {self.node_id} connected to {self.host}:{self.port} name={self.name} ip={self.ip} proto={self._proto}"
+            f" shm={self.shm_inhibit if self._shm is not None else '-'}"
+            f" replayed={self.link_stats.replayed}"
+        )
+
+    def _abort_connect(self) -> None:
+        sock = self._csock
+        self._csock = None
+        self._cstage = ""
+        if self._hello_shm is not None:
+            self._hello_shm.close()
+            self._hello_shm = None
+        if sock is None:
+            return
+        try:
+            self._sel.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+    def _connect_failed(self, e: OSError, now: float) -> None:
+        self._abort_connect()
+        self.link_stats.connect_failures += 1
+        if not self.reconnect:
             print(f"node {self.node_id}: connect failed to {self.host}:{self.port}: {e}")
+            self.running = False
             return
-        print(f"node {self.node_id} connected to {self.host}:{self.port} name={self.name} ip={self.ip}")
-        recv_t = threading.Thread(target=self._recv_loop, daemon=True)
-        recv_t.start()
+        delay = self._backoff_s(self._attempt)
+        self._attempt += 1
+        self._next_connect = now + delay
+        print(f"node {self.node_id}: connect failed to {self.host}:{self.port}: {e}; retry in {delay:.2f}s")
+
+    def _close_link(self) -> None:
+        sock = self.sock
+        self.sock = None
+        self._requeue([msg for _, msg in self._wpending] + self._outbuf_msgs)
+        self._wpending.clear()
+        self._outbuf = []
+        self._outbuf_t = []
+        self._outbuf_msgs = []
+        self._rbuf = bytearray()
+        self._wbuf = bytearray()
+        if sock is None:
+            return
+        self.link_stats.disconnects += 1
+        try:
+            if self._sel is not None:
+                self._sel.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            sock.close()
+        except Exception:
+            pass
+
+    def _drain_writes(self) -> None:
+        if self.sock is None or not self._wbuf:
+            return
+        self._sel.unregister(self.sock)
+        self.sock.setblocking(True)
+        self.sock.sendall(self._wbuf)
+        self._wbuf = bytearray()
+        self._wpending.clear()
+
+    def run(self) -> None:
+        self.running = True
+        self._sel = selectors.DefaultSelector()
+        period = self.step_s / max(1.0, self.accelerate)
+        next_tick = time.monotonic()
+        self._next_connect = next_tick
+        self._attempt = 0
+        ls = self.loop_stats
         try:
             while self.running:
-                v = self._drive_value()
-                I = float(v) * self.lif_scale
-                spike, suppressed = self._lif.step(I, beta=self.beta)
-                msg = {
-                    "ts": self._now_iso(),
-                    "node": self.node_id,
-                    "name": self.name,
-                    "ip": self.ip,
-                    "value": float(v),
-                }
-                if spike:
-                    msg["spike"] = 1
-                    self.total_spikes += 1
-                else:
-                    msg["spike"] = 0
-                if suppressed:
-                    self.suppressed_total += 1
-                msg["suppressed_total"] = int(self.suppressed_total)
-                send = False
-                if spike:
-                    send = True
-                elif self.baseline_interval > 0 and (self._i % self.baseline_interval == 0):
-                    send = True
-                if send and self.sock is not None:
+                now = time.monotonic()
+                if self.sock is None and self._csock is None and now >= self._next_connect:
                     try:
-                        payload = json.dumps(msg) + "\n"
-                        self.sock.sendall(payload.encode("utf-8"))
-                    except BrokenPipeError:
-                        print(f"node {self.node_id}: connection closed by gateway")
+                        self._start_connect(now)
+                    except OSError as e:
+                        self._connect_failed(e, now)
+                        if not self.running:
+                            break
+                elif self._csock is not None and now >= self._cdeadline:
+                    self._connect_timeout(now)
+                    if not self.running:
                         break
-                if self.inhibited_steps > 0:
-                    self.inhibited_steps -= 1
-                    if self.inhibited_steps == 0:
-                        self.beta = 1.0
-                self._i += 1
-                time.sleep(self.step_s / max(1.0, self.accelerate))
+                try:
+                    if now >= next_tick:
+                        lag = now - next_tick
+                        ls.ticks += 1
+                        ls.lag_s_total += lag
+                        if lag > ls.lag_s_max:
+                            ls.lag_s_max = lag
+                        msg = self._tick(time.time())
+                        if msg is not None:
+                            if self.sock is None:
+                                self._buffer(msg)
+                            else:
+                                self._send(msg, now)
+                        next_tick += period
+                        t = time.monotonic()
+                        if t >= next_tick:
+                            ls.overruns += 1
+                            if t - next_tick > period:
+                                next_tick = t
+                    deadline = self._flush_deadline()
+                    if deadline is not None and now >= deadline:
+                        self._flush(now, "latency")
+                    wake = next_tick
+                    deadline = self._flush_deadline()
+                    if deadline is not None and deadline < wake:
+                        wake = deadline
+                    if self._csock is not None and self._cdeadline < wake:
+                        wake = self._cdeadline
+                    if self.sock is None and self._csock is None:
+                        if self._next_connect < wake:
+                            wake = self._next_connect
+                        time.sleep(max(0.0, wake - time.monotonic()))
+                        continue
+                    ls.wakeups += 1
+                    for key, events in self._sel.select(max(0.0, wake - time.monotonic())):
+                        if key.fileobj is self._csock:
+                            try:
+                                self._on_connect_event(time.monotonic())
+                            except OSError as e:
+                                self._connect_failed(e, time.monotonic())
+                            continue
+                        if events & selectors.EVENT_READ:
+                            self._on_readable()
+                        if events & selectors.EVENT_WRITE and self.sock is not None:
+                            self._on_writable()
+                except OSError as e:
+                    print(f"node {self.node_id}: connection lost: {e}")
+                    self._close_link()
+                    if not self.reconnect:
+                        break
+                    self._next_connect = now + self._backoff_s(self._attempt)
+                    self._attempt += 1
         finally:
             self.running = False
+            self._abort_connect()
+            try:
+                if self._outbuf and self.sock is not None:
+                    self._flush(time.monotonic(), "final")
+                self._drain_writes()
+            except OSError:
+                pass
+            if self._batching():
+                print(f"node {self.node_id}: send stats {json.dumps(self.send_stats.snapshot())}")
+            if self.reconnect:
+                print(f"node {self.node_id}: link stats {json.dumps(self.link_stats.snapshot(len(self._backlog)))}")
+            print(f"node {self.node_id}: loop stats {json.dumps(ls.snapshot())}")
             try:
                 if self.sock is not None:
                     self.sock.close()
             except Exception:
                 pass
+            self._sel.close()
+            self._sel = None
+            if self._shm is not None:
+                self._shm.close()
+                self._shm = None
 
     def stop(self) -> None:
         self.running = False
@@ -148,6 +676,18 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--lif-scale", type=float, default=1.0)
     p.add_argument("--lif-refractory", type=int, default=0)
     p.add_argument("--baseline-interval", type=int, default=0)
+    p.add_argument("--proto", type=str, default=PROTO_JSON, choices=list(PROTOCOLS))
+    p.add_argument("--batch-latency-ms", type=float, default=0.0)
+    p.add_argument("--batch-max", type=int, default=1)
+    p.add_argument("--strict-spikes", action="store_true")
+    p.add_argument("--sf", type=int, default=0)
+    p.add_argument("--channel", type=int, default=0)
+    p.add_argument("--shm-inhibit", type=str, default="")
+    p.add_argument("--no-reconnect", action="store_true")
+    p.add_argument("--backoff-initial-ms", type=float, default=500.0)
+    p.add_argument("--backoff-max-s", type=float, default=30.0)
+    p.add_argument("--offline-buffer", type=int, default=1000)
+    p.add_argument("--max-write-buffer", type=int, default=1 << 18)
     return p.parse_args()
 
 def main() -> None:
@@ -170,7 +710,20 @@ def main() -> None:
         lif_leak=args.lif_leak,
         lif_refractory=args.lif_refractory,
         baseline_interval=args.baseline_interval,
+        proto=args.proto,
+        batch_latency_s=args.batch_latency_ms / 1000.0,
+        batch_max=args.batch_max,
+        strict_spikes=args.strict_spikes,
+        sf=args.sf,
+        channel=args.channel,
+        shm_inhibit=args.shm_inhibit,
+        reconnect=not args.no_reconnect,
+        backoff_initial_s=args.backoff_initial_ms / 1000.0,
+        backoff_max_s=args.backoff_max_s,
+        offline_buffer=args.offline_buffer,
+        max_write_buffer=args.max_write_buffer,
     )
+    signal.signal(signal.SIGTERM, lambda signum, frame: client.stop())
     try:
         client.run()
     except KeyboardInterrupt:
@@ -0,0 +1,391 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+from typing import Any, Dict, List, Optional
+from node import NodeClient
+from protocol import PROTO_JSON, PROTOCOLS, hello
+
+def parse_ids(spec: str) -> List[int]:
+    ids: List[int] = []
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            a, b = part.split("-", 1)
+            ids.extend(range(int(a), int(b) + 1))
+        else:
+            ids.append(int(part))
+    return ids
+
+def node_specs(ids: str = "", spec_file: str = "") -> List[Dict[str, Any]]:
+    specs: List[Dict[str, Any]] = []
+    if spec_file:
+        with open(spec_file) as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get("nodes", [])
+        for ent in data:
+            if "range" in ent:
+                base = {k: v for k, v in ent.items() if k != "range"}
+                for nid in parse_ids(ent["range"]):
+                    specs.append(dict(base, id=nid))
+            else:
+                specs.append(dict(ent))
+    specs.extend({"id": nid} for nid in parse_ids(ids))
+    for d in specs:
+        nid = int(d["id"])
+        d["id"] = nid
+        d["name"] = str(d.get("name") or "node-{id}").format(id=nid)
+        d["ip"] = str(d.get("ip") or f"10.0.0.{10 + nid}").format(id=nid)
+    return specs
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def _raise_nofile() -> None:
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
+
+class NodeHost:
+    def __init__(
+        self,
+        specs: List[Dict[str, Any]],
+        host: str,
+        port: int,
+        node_kwargs: Dict[str, Any],
+        proto: str = PROTO_JSON,
+        slots: int = 100,
+        report_s: float = 10.0,
+        connect_concurrency: int = 256,
+        shard: int = 0,
+    ) -> None:
+        self.host = host
+        self.port = int(port)
+        self.proto = proto
+        self.report_s = float(report_s)
+        self.connect_concurrency = max(1, int(connect_concurrency))
+        self.shard = int(shard)
+        self.nodes: List[NodeClient] = []
+        for d in specs:
+            kwargs = dict(node_kwargs)
+            kwargs.update({k: v for k, v in d.items() if k in kwargs})
+            self.nodes.append(
+                NodeClient(node_id=d["id"], host=host, port=port, name=d["name"], ip=d["ip"], proto=proto, **kwargs)
+            )
+        self.slots = max(1, min(int(slots), len(self.nodes) or 1))
+        self.running = False
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.sent = 0
+        self.backpressured = 0
+        self._pumps: set = set()
+        self.ticks = 0
+        self.overruns = 0
+        self._lag_sum = 0.0
+        self._lag_max = 0.0
+        self._lag_n = 0
+        self.shm_nodes = 0
+        self._shm = self.nodes[0].attach_shm() if self.nodes else None
+
+    async def _open(self, node: NodeClient, sem: asyncio.Semaphore) -> bool:
+        async with sem:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                self.connect_failures += 1
+                node.link_stats.connect_failures += 1
+                if not node.reconnect:
+                    print(f"nodehost: node {node.node_id} connect failed to {self.host}:{self.port}: {e}")
+                return False
+            if self._shm is None and node.shm_inhibit:
+                self._shm = node.attach_shm()
+            shm = self._shm
+            node._proto = PROTO_JSON
+            if node.proto != PROTO_JSON or shm is not None:
+                writer.write(hello(node.node_id, node.name, node.ip, node.proto, node.shm_inhibit if shm else ""))
+                try:
+                    ack = json.loads(await asyncio.wait_for(reader.readline(), 2.0))
+                    if ack.get("cmd") == "hello" and ack.get("proto") in PROTOCOLS:
+                        node._proto = ack["proto"]
+                        if shm is not None and ack.get("shm") == node.shm_inhibit:
+                            node.use_shm(shm)
+                            self.shm_nodes += 1
+                except Exception:
+                    pass
+            self.connects += 1
+            node.link_stats.connects += 1
+            self._writers[node.node_id] = writer
+            if node._backlog:
+                self._start_pump(node, writer)
+            asyncio.get_running_loop().create_task(self._read(node, reader, sem))
+            return True
+
+    def _start_pump(self, node: NodeClient, writer: asyncio.StreamWriter) -> None:
+        if node.node_id not in self._pumps:
+            self._pumps.add(node.node_id)
+            asyncio.get_running_loop().create_task(self._pump(node, writer))
+
+    async def _pump(self, node: NodeClient, writer: asyncio.StreamWriter) -> None:
+        try:
+            while self._writers.get(node.node_id) is writer:
+                await writer.drain()
+                if not node._backlog or self._writers.get(node.node_id) is not writer:
+                    break
+                n, data = node._encode_backlog(node.max_write_buffer)
+                writer.write(data)
+                node._backlog_sent(n)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._pumps.discard(node.node_id)
+
+    async def _reconnect(self, node: NodeClient, sem: asyncio.Semaphore) -> None:
+        attempt = 0
+        while self.running:
+            await asyncio.sleep(node._backoff_s(attempt))
+            attempt += 1
+            if self.running and await self._open(node, sem):
+                return
+
+    async def _read(self, node: NodeClient, reader: asyncio.StreamReader, sem: asyncio.Semaphore) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    obj = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(obj, dict):
+                    node._apply_command(obj)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer = self._writers.pop(node.node_id, None)
+            if writer is not None:
+                self.disconnects += 1
+                node.link_stats.disconnects += 1
+                writer.close()
+                if node._shm is not None:
+                    node.use_shm(None)
+                    self.shm_nodes -= 1
+                    if self.shm_nodes == 0 and self._shm is not None:
+                        self._shm.close()
+                        self._shm = None
+                if self.running and node.reconnect:
+                    asyncio.get_running_loop().create_task(self._reconnect(node, sem))
+
+    def stats(self) -> Dict[str, Any]:
+        n = max(1, self._lag_n)
+        buffered = dropped = replayed = backlog = 0
+        for node in self.nodes:
+            ls = node.link_stats
+            buffered += ls.buffered
+            dropped += ls.dropped
+            replayed += ls.replayed
+            backlog += len(node._backlog)
+        return {
+            "shard": self.shard,
+            "nodes": len(self.nodes),
+            "connected": len(self._writers),
+            "connects": self.connects,
+            "connect_failures": self.connect_failures,
+            "shm_nodes": self.shm_nodes,
+            "disconnects": self.disconnects,
+            "sent": self.sent,
+            "backpressured": self.backpressured,
+            "buffered": buffered,
+            "dropped": dropped,
+            "replayed": replayed,
+            "backlog": backlog,
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "tick_lag_ms_mean": 1000.0 * self._lag_sum / n,
+            "tick_lag_ms_max": 1000.0 * self._lag_max,
+            "rss_mb": _rss_bytes() / 1e6,
+            "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        }
+
+    def _report(self) -> None:
+        print("nodehost: " + json.dumps(self.stats()), flush=True)
+        self._lag_sum = 0.0
+        self._lag_max = 0.0
+        self._lag_n = 0
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.running = True
+        sem = asyncio.Semaphore(self.connect_concurrency)
+        opened = await asyncio.gather(*(self._open(node, sem) for node in self.nodes))
+        print(f"nodehost[{self.shard}]: {len(self._writers)}/{len(self.nodes)} nodes connected to {self.host}:{self.port}")
+        groups = [self.nodes[i :: self.slots] for i in range(self.slots)]
+        if not self.nodes:
+            return
+        for node, ok in zip(self.nodes, opened):
+            if not ok and node.reconnect:
+                loop.create_task(self._reconnect(node, sem))
+        reconnect = any(node.reconnect for node in self.nodes)
+        period = self.nodes[0].step_s / max(1.0, self.nodes[0].accelerate)
+        slot_s = period / self.slots
+        next_t = loop.time()
+        next_report = next_t + self.report_s
+        k = 0
+        while self.running and (self._writers or reconnect):
+            lag = loop.time() - next_t
+            self._lag_sum += lag
+            self._lag_n += 1
+            if lag > self._lag_max:
+                self._lag_max = lag
+            now = time.time()
+            writers = self._writers
+            for node in groups[k]:
+                writer = writers.get(node.node_id)
+                if writer is None and not node.reconnect:
+                    continue
+                msg = node._tick(now)
+                self.ticks += 1
+                if msg is not None:
+                    if writer is None:
+                        node._buffer(msg)
+                    elif node._backlog or writer.transport.get_write_buffer_size() >= node.max_write_buffer:
+                        self.backpressured += 1
+                        node._buffer(msg)
+                        self._start_pump(node, writer)
+                    else:
+                        writer.write(node._encode(msg))
+                        self.sent += 1
+            k = k + 1 if k + 1 < self.slots else 0
+            next_t += slot_s
+            t = loop.time()
+            if t >= next_report:
+                self._report()
+                next_report = t + self.report_s
+            delay = next_t - t
+            if delay < 0:
+                self.overruns += 1
+                if -delay > period:
+                    next_t = t
+                delay = 0.0
+            await asyncio.sleep(delay)
+        self._report()
+        if self._shm is not None:
+            for node in self.nodes:
+                node.use_shm(None)
+            self._shm.close()
+            self._shm = None
+
+    def stop(self) -> None:
+        self.running = False
+
+def _node_kwargs(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "step_s": args.step_s,
+        "accelerate": args.accelerate,
+        "lif_scale": args.lif_scale,
+        "lif_theta": args.lif_theta,
+        "lif_leak": args.lif_leak,
+        "lif_refractory": args.lif_refractory,
+        "baseline_interval": args.baseline_interval,
+        "sf": args.sf,
+        "channel": args.channel,
+        "shm_inhibit": args.shm_inhibit,
+        "reconnect": not args.no_reconnect,
+        "backoff_initial_s": args.backoff_initial_ms / 1000.0,
+        "backoff_max_s": args.backoff_max_s,
+        "offline_buffer": args.offline_buffer,
+        "max_write_buffer": args.max_write_buffer,
+    }
+
+def run_shard(shard: int, specs: List[Dict[str, Any]], args: argparse.Namespace) -> None:
+    _raise_nofile()
+    host = NodeHost(
+        specs,
+        host=args.host,
+        port=args.port,
+        node_kwargs=_node_kwargs(args),
+        proto=args.proto,
+        slots=args.slots,
+        report_s=args.report_s,
+        shard=shard,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: host.stop())
+    try:
+        asyncio.run(host.run())
+    except KeyboardInterrupt:
+        pass
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--ids", type=str, default="")
+    p.add_argument("--spec", type=str, default="")
+    p.add_argument("--host", type=str, default="127.0.0.1")
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--step-s", type=float, default=300.0)
+    p.add_argument("--accelerate", type=float, default=60.0)
+    p.add_argument("--lif-theta", type=float, default=50.0)
+    p.add_argument("--lif-leak", type=float, default=0.99)
+    p.add_argument("--lif-scale", type=float, default=1.0)
+    p.add_argument("--lif-refractory", type=int, default=0)
+    p.add_argument("--baseline-interval", type=int, default=0)
+    p.add_argument("--sf", type=int, default=0)
+    p.add_argument("--channel", type=int, default=0)
+    p.add_argument("--shm-inhibit", type=str, default="")
+    p.add_argument("--no-reconnect", action="store_true")
+    p.add_argument("--backoff-initial-ms", type=float, default=500.0)
+    p.add_argument("--backoff-max-s", type=float, default=30.0)
+    p.add_argument("--offline-buffer", type=int, default=1000)
+    p.add_argument("--max-write-buffer", type=int, default=1 << 18)
+    p.add_argument("--proto", type=str, default=PROTO_JSON, choices=list(PROTOCOLS))
+    p.add_argument("--slots", type=int, default=100)
+    p.add_argument("--report-s", type=float, default=10.0)
+    p.add_argument("--shards", type=int, default=1)
+    return p.parse_args(argv)
+
+def main() -> None:
+    args = parse_args()
+    specs = node_specs(args.ids, args.spec)
+    if not specs:
+        print("nodehost: no nodes given (use --ids and/or --spec)")
+        sys.exit(1)
+    shards = max(1, min(int(args.shards), len(specs)))
+    if shards == 1:
+        run_shard(0, specs, args)
+        return
+    procs = [
+        multiprocessing.Process(target=run_shard, args=(i, specs[i::shards], args), daemon=False)
+        for i in range(shards)
+    ]
+    for p in procs:
+        p.start()
+
+    def shutdown(signum=None, frame=None) -> None:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    for p in procs:
+        p.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SPREADING_FACTORS = (7, 8, 9, 10, 11, 12)
+BANDWIDTHS = (125000, 250000, 500000)
+CODING_RATES = (1, 2, 3, 4)
+MAX_CHANNELS = 16
+
+Radio = Tuple[int, int]
+
+@lru_cache(maxsize=4096)
+def airtime(sf: int, bw: int = 125000, cr: int = 1, payload: int = 12, preamble: int = 8) -> float:
+    tsym = (2.0 ** sf) / bw
+    de = 1 if tsym > 0.016 else 0
+    num = 8 * payload - 4 * sf + 28 + 16
+    den = 4 * (sf - 2 * de)
+    payload_symb = 8 + max(int(num / den) * (cr + 4), 0)
+    return (preamble + 4.25) * tsym + payload_symb * tsym
+
+def airtime_table(
+    payloads: Iterable[int],
+    sfs: Iterable[int] = SPREADING_FACTORS,
+    bws: Iterable[int] = BANDWIDTHS,
+    crs: Iterable[int] = CODING_RATES,
+) -> Dict[Tuple[int, int, int, int], float]:
+    payloads = list(payloads)
+    return {
+        (sf, bw, cr, payload): airtime(sf, bw, cr, payload)
+        for sf in sfs
+        for bw in bws
+        for cr in crs
+        for payload in payloads
+    }
+
+def pack_radio(sf: int, channel: int) -> int:
+    if not sf:
+        return 0
+    return ((int(channel) & 0x0F) << 4) | (int(sf) & 0x0F)
+
+def unpack_radio(b: int) -> Tuple[Optional[int], Optional[int]]:
+    if not b:
+        return None, None
+    return b & 0x0F, b >> 4
+
+def assignments_from_specs(specs: List[Dict[str, Any]]) -> Dict[int, Radio]:
+    out: Dict[int, Radio] = {}
+    for d in specs:
+        if d.get("sf") is None and d.get("channel") is None:
+            continue
+        out[int(d["id"])] = (int(d.get("channel") or 0), int(d.get("sf") or 0))
+    return out
+
+class PhyModel:
+    def __init__(
+        self,
+        bw: int = 125000,
+        cr: int = 1,
+        payload: int = 12,
+        sf: int = 7,
+        channel: int = 0,
+        assignments: Optional[Dict[int, Radio]] = None,
+    ) -> None:
+        if bw not in BANDWIDTHS:
+            raise ValueError(f"unsupported bandwidth {bw}")
+        if cr not in CODING_RATES:
+            raise ValueError(f"unsupported coding rate 4/{cr + 4}")
+        self.bw = int(bw)
+        self.cr = int(cr)
+        self.payload = int(payload)
+        self.default = self._check(int(channel), int(sf))
+        self.assignments: Dict[int, Radio] = {}
+        for node, (ch, s) in (assignments or {}).items():
+            self.assignments[int(node)] = self._check(ch, s or self.default[1])
+        self._airtime = {s: airtime(s, self.bw, self.cr, self.payload) for s in SPREADING_FACTORS}
+
+    def _check(self, channel: int, sf: int) -> Radio:
+        if sf not in SPREADING_FACTORS:
+            raise ValueError(f"unsupported spreading factor SF{sf}")
+        if not 0 <= channel < MAX_CHANNELS:
+            raise ValueError(f"channel {channel} out of range")
+        return channel, sf
+
+    def airtime(self, sf: int, payload: Optional[int] = None) -> float:
+        if payload is None or payload == self.payload:
+            return self._airtime[sf]
+        return airtime(sf, self.bw, self.cr, payload)
+
+    def radio(self, node_id: Optional[int], msg: Dict[str, Any]) -> Radio:
+        ch, sf = self.assignments.get(node_id, self.default) if node_id is not None else self.default
+        msf = msg.get("sf")
+        if msf is not None:
+            try:
+                msf = int(msf)
+            except (TypeError, ValueError):
+                msf = None
+            if msf in self._airtime:
+                sf = msf
+        mch = msg.get("ch")
+        if mch is not None:
+            try:
+                mch = int(mch)
+            except (TypeError, ValueError):
+                mch = None
+            if mch is not None and 0 <= mch < MAX_CHANNELS:
+                ch = mch
+        return ch, sf
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "bw": self.bw,
+            "cr": f"4/{self.cr + 4}",
+            "payload_bytes": self.payload,
+            "default_channel": self.default[0],
+            "default_sf": self.default[1],
+            "assigned_nodes": len(self.assignments),
+            "airtime_s": {f"sf{s}": a for s, a in self._airtime.items()},
+        }
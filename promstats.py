@@ -0,0 +1,152 @@
+from __future__ import annotations
+import math
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if v == -math.inf:
+        return "-Inf"
+    if isinstance(v, int) or float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs: Tuple[Tuple[str, str], ...]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._lock = Lock()
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, (), self.value)]
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Optional[Callable[[], float]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0.0
+        self._fn = fn
+
+    def set(self, v: float) -> None:
+        self.value = float(v)
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, (), self._fn() if self._fn is not None else self.value)]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, v: float) -> None:
+        i = bisect_left(self.bounds, v)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+            n = self.count
+        out: List[Sample] = []
+        acc = 0
+        for bound, c in zip(self.bounds + (math.inf,), counts):
+            acc += c
+            out.append((self.name + "_bucket", (("le", _fmt(bound)),), acc))
+        out.append((self.name + "_sum", (), total))
+        out.append((self.name + "_count", (), n))
+        return out
+
+class Family:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        labelnames: Tuple[str, ...],
+        fn: Callable[[], Dict[Tuple[Any, ...], float]],
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self._fn = fn
+
+    def samples(self) -> List[Sample]:
+        names = self.labelnames
+        return [
+            (self.name, tuple(zip(names, (str(v) for v in key))), value)
+            for key, value in sorted(self._fn().items(), key=lambda kv: tuple(str(v) for v in kv[0]))
+        ]
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric: Any) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, fn: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, help, fn))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def family(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        labelnames: Tuple[str, ...],
+        fn: Callable[[], Dict[Tuple[Any, ...], float]],
+    ) -> Family:
+        return self.register(Family(name, help, kind, labelnames, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_labels(labels)} {_fmt(value)}")
+        lines.append("")
+        return "\n".join(lines)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import json
+import math
+import struct
+from typing import Any, Dict, List, Optional
+
+PROTO_JSON = "json"
+PROTO_BIN = "bin"
+PROTOCOLS = (PROTO_JSON, PROTO_BIN)
+
+FLAG_SPIKE = 0x01
+
+FRAME = struct.Struct("<HBBdfI")
+MAX_LINE = 1 << 20
+MAX_FRAME_NODE = 0xFFFF
+MAX_FRAME_SUPPRESSED = 0xFFFFFFFF
+
+def frame_node_ok(node_id: Any) -> bool:
+    try:
+        node = int(node_id)
+    except (TypeError, ValueError):
+        return False
+    return 0 <= node <= MAX_FRAME_NODE
+
+def hello(node_id: int, name: str, ip: str, proto: str, shm: str = "") -> bytes:
+    obj = {"hello": 1, "node": int(node_id), "name": name, "ip": ip, "proto": proto}
+    if shm:
+        obj["shm"] = shm
+    return (json.dumps(obj) + "\n").encode("utf-8")
+
+def hello_ack(proto: str, shm: str = "") -> bytes:
+    obj = {"cmd": "hello", "proto": proto}
+    if shm:
+        obj["shm"] = shm
+    return (json.dumps(obj) + "\n").encode("utf-8")
+
+def is_hello(obj: Any) -> bool:
+    return isinstance(obj, dict) and obj.get("hello") is not None
+
+def accept_proto(obj: Dict[str, Any]) -> str:
+    proto = obj.get("proto", PROTO_JSON)
+    if proto == PROTO_BIN and not frame_node_ok(obj.get("node")):
+        return PROTO_JSON
+    return proto if proto in PROTOCOLS else PROTO_JSON
+
+def accept_shm(obj: Dict[str, Any], name: str) -> str:
+    return name if name and obj.get("shm") == name else ""
+
+def encode_frame(node_id: int, ts: float, value: float, spike: bool, suppressed_total: int, radio: int = 0) -> bytes:
+    node = int(node_id)
+    sup = int(suppressed_total)
+    if not 0 <= node <= MAX_FRAME_NODE:
+        raise ValueError(f"node id {node} does not fit a binary frame")
+    if not 0 <= sup <= MAX_FRAME_SUPPRESSED:
+        raise ValueError(f"suppressed_total {sup} does not fit a binary frame")
+    flags = FLAG_SPIKE if spike else 0
+    return FRAME.pack(node, flags, radio & 0xFF, float(ts), float(value), sup)
+
+class FrameDecoder:
+    def __init__(self, name: Optional[str] = None, ip: Optional[str] = None, capacity: int = 65536) -> None:
+        self.name = name
+        self.ip = ip
+        capacity = max(FRAME.size, capacity - capacity % FRAME.size)
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._len = 0
+
+    def writable(self) -> memoryview:
+        return self._view[self._len :]
+
+    def commit(self, n: int) -> List[Dict[str, Any]]:
+        self._len += n
+        size = FRAME.size
+        usable = self._len - self._len % size
+        if usable == 0:
+            return []
+        name = self.name
+        ip = self.ip
+        out = [
+            {
+                "ts": ts if math.isfinite(ts) else None,
+                "node": node,
+                "name": name,
+                "ip": ip,
+                "value": value,
+                "spike": flags & FLAG_SPIKE,
+                "suppressed_total": sup,
+                "sf": (radio & 0x0F) or None,
+                "ch": radio >> 4 if radio else None,
+            }
+            for node, flags, radio, ts, value, sup in FRAME.iter_unpack(self._view[:usable])
+        ]
+        rem = self._len - usable
+        if rem:
+            self._buf[:rem] = self._buf[usable : self._len]
+        self._len = rem
+        return out
+
+    def feed(self, data: bytes) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        src = memoryview(data)
+        while src:
+            dst = self.writable()
+            n = min(len(dst), len(src))
+            dst[:n] = src[:n]
+            src = src[n:]
+            out.extend(self.commit(n))
+        return out
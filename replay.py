@@ -0,0 +1,243 @@
+from __future__ import annotations
+import argparse
+import gzip
+import json
+import os
+import random
+import time
+from queue import Queue
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from gateway import TIME_MODES, Gateway
+from history import to_epoch
+from inhibition import InhibitionState, VirtualClock
+from msglog import scan
+
+class CaptureWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        opener = gzip.open if path.endswith(".gz") else open
+        self._f = opener(path, "at", encoding="utf-8")
+        self._lock = Lock()
+        self.written = 0
+
+    def write(self, msg: Dict[str, Any], recv_s: Optional[float] = None) -> None:
+        rec = dict(msg)
+        rec["recv_s"] = time.time() if recv_s is None else recv_s
+        line = json.dumps(rec) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self.written += 1
+
+    def write_many(self, msgs: List[Dict[str, Any]]) -> None:
+        recv_s = time.time()
+        lines = []
+        for msg in msgs:
+            rec = dict(msg)
+            rec["recv_s"] = recv_s
+            lines.append(json.dumps(rec) + "\n")
+        with self._lock:
+            self._f.writelines(lines)
+            self.written += len(lines)
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+class Reservoir:
+    def __init__(self, size: int = 10000, seed: int = 0) -> None:
+        self.size = max(1, int(size))
+        self.samples: List[float] = []
+        self.count = 0
+        self._rng = random.Random(seed)
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if len(self.samples) < self.size:
+            self.samples.append(x)
+            return
+        j = self._rng.randrange(self.count)
+        if j < self.size:
+            self.samples[j] = x
+
+    def percentiles(self, qs: Tuple[float, ...] = (50.0, 90.0, 99.0, 99.9)) -> Dict[str, float]:
+        if not self.samples:
+            return {f"p{q:g}": 0.0 for q in qs}
+        data = sorted(self.samples)
+        n = len(data)
+        return {f"p{q:g}": data[min(n - 1, int(q / 100.0 * n))] for q in qs}
+
+def iter_capture(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except Exception:
+                continue
+            if not isinstance(obj, dict):
+                continue
+            recv_s = obj.pop("recv_s", None)
+            if recv_s is None:
+                recv_s = to_epoch(obj.get("ts"), 0.0)
+            yield float(recv_s), obj
+
+def iter_log(directory: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    for rec in scan(directory):
+        yield rec["start_s"], {
+            "ts": rec["ts"],
+            "node": rec["node"],
+            "value": rec["value"],
+            "spike": rec["spike"],
+            "suppressed_total": rec["suppressed_total"],
+        }
+
+def iter_source(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    if os.path.isdir(path):
+        return iter_log(path)
+    return iter_capture(path)
+
+class Replay:
+    def __init__(
+        self,
+        speed: float = 0.0,
+        agg_leak: float = 0.995,
+        agg_theta: float = 10.0,
+        beta: float = 2.0,
+        t_inh: int = 5,
+        step_real_s: float = 5.0,
+        collision_mode: str = "spikes",
+        max_recent: int = 5000,
+        reservoir: int = 10000,
+        seed: int = 0,
+        time_mode: str = "arrival",
+        reorder_window_s: float = 0.5,
+    ) -> None:
+        self.speed = max(0.0, float(speed))
+        self.clock = VirtualClock()
+        self.gateway = Gateway(
+            inq=Queue(),
+            inhibition=InhibitionState(step_s=float(step_real_s), clock=self.clock),
+            agg_leak=agg_leak,
+            agg_theta=agg_theta,
+            beta=beta,
+            t_inh_steps=t_inh,
+            collision_mode=collision_mode,
+            max_recent=max_recent,
+            clock=self.clock,
+            time_mode=time_mode,
+            reorder_window_s=reorder_window_s,
+        )
+        self.latency = Reservoir(reservoir, seed)
+        self.lag = Reservoir(reservoir, seed + 1)
+        self.messages = 0
+        self.out_of_order = 0
+
+    def run(self, source: Iterator[Tuple[float, Dict[str, Any]]], limit: int = 0) -> Dict[str, Any]:
+        clock = self.clock
+        gw = self.gateway
+        latency = self.latency
+        perf = time.perf_counter
+        speed = self.speed
+        first: Optional[float] = None
+        last = -float("inf")
+        wall0 = perf()
+        busy = 0.0
+        event_time = gw.time_mode == "event"
+        for recv_s, msg in source:
+            if first is None:
+                first = recv_s
+            if recv_s < last:
+                self.out_of_order += 1
+            else:
+                last = recv_s
+            if speed > 0:
+                due = wall0 + (recv_s - first) / speed
+                delay = due - perf()
+                if delay > 0:
+                    time.sleep(delay)
+                self.lag.add(max(0.0, perf() - due))
+            clock.now = recv_s if recv_s > clock.now else clock.now
+            t0 = perf()
+            if event_time:
+                gw.process_many((msg,))
+            else:
+                gw._process_message(msg)
+            dt = perf() - t0
+            busy += dt
+            latency.add(dt)
+            self.messages += 1
+            if limit and self.messages >= limit:
+                break
+        if event_time:
+            gw.flush_reorder(force=True)
+        wall = perf() - wall0
+        n = self.messages
+        span = (last - first) if first is not None else 0.0
+        report: Dict[str, Any] = {
+            "messages": n,
+            "out_of_order": self.out_of_order,
+            "speed": speed if speed > 0 else "max",
+            "trace_span_s": span,
+            "wall_s": wall,
+            "msgs_per_sec": n / wall if wall > 0 else 0.0,
+            "process_msgs_per_sec": n / busy if busy > 0 else 0.0,
+            "latency_us": {k: 1e6 * v for k, v in latency.percentiles().items()},
+        }
+        if speed > 0:
+            report["lag_ms"] = {k: 1000.0 * v for k, v in self.lag.percentiles().items()}
+        metrics = gw.snapshot_metrics()
+        metrics["replay"] = report
+        return metrics
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("source", type=str)
+    p.add_argument("--speed", type=float, default=0.0)
+    p.add_argument("--limit", type=int, default=0)
+    p.add_argument("--agg-leak", type=float, default=0.995)
+    p.add_argument("--agg-theta", type=float, default=10.0)
+    p.add_argument("--beta", type=float, default=2.0)
+    p.add_argument("--t-inh", type=int, default=5)
+    p.add_argument("--step-real-s", type=float, default=5.0)
+    p.add_argument("--collision-mode", type=str, default="spikes", choices=["spikes", "all"])
+    p.add_argument("--max-recent", type=int, default=5000)
+    p.add_argument("--reservoir", type=int, default=10000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--time-mode", type=str, default="arrival", choices=list(TIME_MODES))
+    p.add_argument("--reorder-window-ms", type=float, default=500.0)
+    p.add_argument("--out", type=str, default="")
+    p.add_argument("--full", action="store_true")
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    replay = Replay(
+        speed=args.speed,
+        agg_leak=args.agg_leak,
+        agg_theta=args.agg_theta,
+        beta=args.beta,
+        t_inh=args.t_inh,
+        step_real_s=args.step_real_s,
+        collision_mode=args.collision_mode,
+        max_recent=args.max_recent,
+        reservoir=args.reservoir,
+        seed=args.seed,
+        time_mode=args.time_mode,
+        reorder_window_s=args.reorder_window_ms / 1000.0,
+    )
+    metrics = replay.run(iter_source(args.source), limit=args.limit)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(metrics, f)
+    if args.full:
+        print(json.dumps(metrics))
+        return
+    brief: Dict[str, Any] = {k: v for k, v in metrics.items() if k not in ("nodes", "timestamps", "summary")}
+    print(json.dumps(brief, indent=2))
+
+if __name__ == "__main__":
+    main()
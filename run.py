@@ -1,29 +1,60 @@
 from __future__ import annotations
 import argparse
+import asyncio
 import json
 import signal
 import socketserver
 import sys
 import threading
 import time
-from queue import Queue
-from typing import Dict
-from inhibition import InhibitionState
-from gateway import Gateway
+from queue import Empty, Queue
+from typing import Optional
+from inhibition import InhibitionState, SharedInhibitionState
+from gateway import TIME_MODES, Gateway
 from dashboard import run_http
+from fanout import POLICIES, Fanout
+from msglog import MessageLog
+from phy import BANDWIDTHS, CODING_RATES, SPREADING_FACTORS, PhyModel, assignments_from_specs
+from replay import CaptureWriter
+from protocol import MAX_LINE, PROTO_BIN, FrameDecoder, accept_proto, accept_shm, hello_ack, is_hello
 
-_clients_lock = threading.Lock()
-_clients: Dict[int, "GatewayHandler"] = {}
+_fanout = Fanout()
 _inq: Queue = Queue()
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+_capture: Optional[CaptureWriter] = None
+_shm_name = ""
+_shm_nodes: set = set()
+
+def _ingest(msg: dict) -> None:
+    if _capture is not None:
+        _capture.write(msg)
+    msg["recv_mono"] = time.perf_counter()
+    _inq.put(msg)
+
+def _ingest_many(msgs: list) -> None:
+    if _capture is not None:
+        _capture.write_many(msgs)
+    now = time.perf_counter()
+    for msg in msgs:
+        msg["recv_mono"] = now
+    _inq.put(msgs)
 
 class GatewayHandler(socketserver.StreamRequestHandler):
     def handle(self) -> None:
-        global _clients
         node_id = None
+        outbox = None
+        decoder = None
+        shm = ""
         peer = self.client_address
         print(f"gateway: connection from {peer}")
         try:
-            for raw in self.rfile:
+            while True:
+                raw = self.rfile.readline(MAX_LINE + 1)
+                if not raw:
+                    break
+                if len(raw) > MAX_LINE:
+                    print(f"gateway: dropping {peer}: line exceeds {MAX_LINE} bytes")
+                    break
                 try:
                     line = raw.decode("utf-8").strip()
                     if not line:
@@ -31,31 +62,173 @@ class GatewayHandler(socketserver.StreamRequestHandler):
                     obj = json.loads(line)
                 except Exception:
                     continue
+                if not isinstance(obj, dict):
+                    continue
                 try:
                     nid = int(obj.get("node"))
                 except Exception:
                     nid = None
+                if is_hello(obj):
+                    proto = accept_proto(obj)
+                    shm = accept_shm(obj, _shm_name)
+                    self.wfile.write(hello_ack(proto, shm))
+                    self.wfile.flush()
+                    if proto == PROTO_BIN:
+                        decoder = FrameDecoder(obj.get("name"), obj.get("ip"))
                 if nid is not None and node_id is None:
                     node_id = nid
-                    with _clients_lock:
-                        _clients[nid] = self
-                _inq.put(obj)
+                    if shm:
+                        _shm_nodes.add(nid)
+                    else:
+                        outbox = _fanout.add_thread_client(nid, self.connection)
+                if decoder is not None:
+                    break
+                if is_hello(obj):
+                    continue
+                _ingest(obj)
+            if decoder is not None:
+                while True:
+                    n = self.rfile.readinto1(decoder.writable())
+                    if not n:
+                        break
+                    for msg in decoder.commit(n):
+                        _ingest(msg)
+        except (ConnectionError, OSError):
+            pass
         finally:
             if node_id is not None:
-                with _clients_lock:
-                    _clients.pop(node_id, None)
+                if outbox is not None:
+                    _fanout.remove(node_id, outbox)
+                if shm:
+                    _shm_nodes.discard(node_id)
                 print(f"gateway: node {node_id} disconnected")
 
+class GatewayServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def _shm_snapshot() -> dict:
+    return {"name": _shm_name, "nodes": len(_shm_nodes)}
+
 def _broadcast_inhibit(beta: float, t_inh: int) -> None:
     cmd = json.dumps({"cmd": "inhibit", "beta": float(beta), "t_inh": int(t_inh)}) + "\n"
-    data = cmd.encode("utf-8")
-    with _clients_lock:
-        for nid, handler in list(_clients.items()):
-            try:
-                handler.wfile.write(data)
-                handler.wfile.flush()
-            except Exception:
-                pass
+    _fanout.broadcast(cmd.encode("utf-8"), kind="inhibit")
+
+async def _handle_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    node_id = None
+    outbox = None
+    peer = writer.get_extra_info("peername")
+    print(f"gateway: connection from {peer}")
+    decoder = None
+    shm = ""
+    buf = b""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            if decoder is not None:
+                msgs = decoder.feed(data)
+                if msgs:
+                    _ingest_many(msgs)
+                continue
+            buf += data
+            batch = []
+            pos = 0
+            while decoder is None:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
+                    break
+                line = buf[pos:nl].strip()
+                pos = nl + 1
+                if not line:
+                    continue
+                try:
+                    obj = json.loads(line)
+                except Exception:
+                    continue
+                if not isinstance(obj, dict):
+                    continue
+                if is_hello(obj):
+                    proto = accept_proto(obj)
+                    shm = accept_shm(obj, _shm_name)
+                    writer.write(hello_ack(proto, shm))
+                    if proto == PROTO_BIN:
+                        decoder = FrameDecoder(obj.get("name"), obj.get("ip"))
+                if node_id is None:
+                    try:
+                        node_id = int(obj.get("node"))
+                    except Exception:
+                        node_id = None
+                    if node_id is not None and shm:
+                        _shm_nodes.add(node_id)
+                    elif node_id is not None:
+                        outbox = _fanout.add_async_client(node_id, writer)
+                if is_hello(obj):
+                    continue
+                batch.append(obj)
+            buf = buf[pos:]
+            if decoder is not None and buf:
+                batch.extend(decoder.feed(buf))
+                buf = b""
+            if batch:
+                _ingest_many(batch)
+            if decoder is None and len(buf) > MAX_LINE:
+                print(f"gateway: dropping {peer}: line exceeds {MAX_LINE} bytes")
+                break
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        if node_id is not None:
+            if outbox is not None:
+                _fanout.remove(node_id, outbox)
+            if shm:
+                _shm_nodes.discard(node_id)
+            print(f"gateway: node {node_id} disconnected")
+        writer.close()
+
+def _serve_asyncio(host: str, port: int) -> None:
+    global _async_loop
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    _async_loop = loop
+
+    server = loop.run_until_complete(asyncio.start_server(_handle_async, host, port, limit=MAX_LINE))
+    try:
+        loop.run_forever()
+    finally:
+        server.close()
+        loop.close()
+
+def drain_queue(gateway: Gateway) -> int:
+    msgs = []
+    while True:
+        try:
+            msgs.append(_inq.get_nowait())
+        except Empty:
+            break
+    n = gateway.process_many(msgs)
+    gateway.flush_reorder(force=True)
+    return n
+
+def open_log(args: argparse.Namespace, directory: str = "") -> Optional[MessageLog]:
+    directory = directory or args.log_dir
+    if not directory:
+        return None
+    return MessageLog(
+        directory,
+        segment_s=args.log_segment_s,
+        segment_records=args.log_segment_records,
+        retention_s=args.log_retention_s,
+        flush_interval_s=args.log_flush_ms / 1000.0,
+    )
+
+def make_phy(args: argparse.Namespace) -> PhyModel:
+    assignments = {}
+    if args.radio_spec:
+        from nodehost import node_specs
+        assignments = assignments_from_specs(node_specs(spec_file=args.radio_spec))
+    return PhyModel(bw=args.bw, cr=args.cr, payload=12, sf=args.sf, channel=args.channel, assignments=assignments)
 
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser()
@@ -68,11 +241,51 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--beta", type=float, default=2.0)
     p.add_argument("--t-inh", type=int, default=5)
     p.add_argument("--step-real-s", type=float, default=5.0)
+    p.add_argument("--history-capacity", type=int, default=5000)
+    p.add_argument("--batch-max", type=int, default=1)
+    p.add_argument("--batch-wait-ms", type=float, default=0.0)
+    p.add_argument("--fanout-queue", type=int, default=16)
+    p.add_argument("--fanout-policy", type=str, default="drop_oldest", choices=list(POLICIES))
+    p.add_argument("--fanout-timeout-s", type=float, default=1.0)
+    p.add_argument("--transport", type=str, default="threads", choices=["threads", "asyncio"])
+    p.add_argument("--shards", type=int, default=1)
+    p.add_argument("--spike-flush-ms", type=float, default=2.0)
+    p.add_argument("--log-dir", type=str, default="")
+    p.add_argument("--log-segment-s", type=float, default=3600.0)
+    p.add_argument("--log-segment-records", type=int, default=1 << 16)
+    p.add_argument("--log-retention-s", type=float, default=7 * 86400.0)
+    p.add_argument("--log-flush-ms", type=float, default=200.0)
+    p.add_argument("--capture", type=str, default="")
+    p.add_argument("--metrics-cache-ms", type=float, default=500.0)
+    p.add_argument("--sf", type=int, default=7, choices=list(SPREADING_FACTORS))
+    p.add_argument("--bw", type=int, default=125000, choices=list(BANDWIDTHS))
+    p.add_argument("--cr", type=int, default=1, choices=list(CODING_RATES))
+    p.add_argument("--channel", type=int, default=0)
+    p.add_argument("--radio-spec", type=str, default="")
+    p.add_argument("--shm-inhibit", type=str, default="")
+    p.add_argument("--time-mode", type=str, default="arrival", choices=list(TIME_MODES))
+    p.add_argument("--reorder-window-ms", type=float, default=500.0)
+    p.add_argument("--reorder-max", type=int, default=10000)
+    p.add_argument("--dense-max-cells", type=int, default=1 << 20)
+    p.add_argument("--auto-points", type=int, default=1000)
     return p.parse_args()
 
 def main() -> None:
+    global _fanout, _capture, _shm_name
     args = parse_args()
-    inhibition = InhibitionState(step_s=float(args.step_real_s))
+    if args.shards > 1:
+        from sharded import serve_sharded
+        serve_sharded(args)
+        return
+    _fanout = Fanout(maxlen=args.fanout_queue, policy=args.fanout_policy, write_timeout_s=args.fanout_timeout_s)
+    if args.shm_inhibit:
+        inhibition = SharedInhibitionState(args.shm_inhibit, create=True, step_s=float(args.step_real_s))
+        _shm_name = args.shm_inhibit
+    else:
+        inhibition = InhibitionState(step_s=float(args.step_real_s))
+    log = open_log(args)
+    if args.capture:
+        _capture = CaptureWriter(args.capture)
     gateway = Gateway(
         inq=_inq,
         inhibition=inhibition,
@@ -83,25 +296,65 @@ def main() -> None:
         tx_power_w=0.396,
         payload_bytes=12,
         collision_mode="spikes",
+        max_recent=args.history_capacity,
         on_fire=_broadcast_inhibit,
+        batch_max=args.batch_max,
+        batch_wait_s=args.batch_wait_ms / 1000.0,
+        log=log,
+        phy=make_phy(args),
+        time_mode=args.time_mode,
+        reorder_window_s=args.reorder_window_ms / 1000.0,
+        reorder_max=args.reorder_max,
+        dense_max_cells=args.dense_max_cells,
+        auto_points=args.auto_points,
+    )
+    gateway.add_metrics_source("fanout", _fanout.snapshot)
+    if _shm_name:
+        gateway.add_metrics_source("shm_inhibit", _shm_snapshot)
+    gateway.prom.register(_fanout.broadcast_hist)
+    gateway.prom.register(_fanout.latency_hist)
+    if log is not None:
+        print(f"gateway: restored counters and {gateway.restore_from_log(log)} history records from {args.log_dir}")
+        gateway.add_metrics_source("log", log.snapshot)
+        log.start()
+    http_thread = threading.Thread(
+        target=run_http,
+        args=(gateway, args.dashboard_host, args.dashboard_port, args.metrics_cache_ms / 1000.0),
+        daemon=True,
     )
+    http_thread.start()
+    server = None
     gw_thread = threading.Thread(target=gateway.run, kwargs={"timeout": 0.5}, daemon=True)
     gw_thread.start()
-    http_thread = threading.Thread(target=run_http, args=(gateway, args.dashboard_host, args.dashboard_port), daemon=True)
-    http_thread.start()
-    server = socketserver.ThreadingTCPServer((args.listen_host, args.listen_port), GatewayHandler)
-    srv_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    if args.transport == "asyncio":
+        srv_thread = threading.Thread(target=_serve_asyncio, args=(args.listen_host, args.listen_port), daemon=True)
+    else:
+        server = GatewayServer((args.listen_host, args.listen_port), GatewayHandler)
+        srv_thread = threading.Thread(target=server.serve_forever, daemon=True)
     srv_thread.start()
-    print(f"gateway: TCP listen on {args.listen_host}:{args.listen_port}")
+    print(f"gateway: TCP listen on {args.listen_host}:{args.listen_port} ({args.transport})")
     print(f"gateway: dashboard http://{args.dashboard_host}:{args.dashboard_port}/")
     def shutdown(signum=None, frame=None) -> None:
         print("gateway: shutting down")
+        if server is not None:
+            try:
+                server.shutdown()
+                server.server_close()
+            except Exception:
+                pass
+        if _async_loop is not None:
+            _async_loop.call_soon_threadsafe(_async_loop.stop)
+        srv_thread.join(timeout=2.0)
         gateway.stop()
-        try:
-            server.shutdown()
-        except Exception:
-            pass
-        time.sleep(0.5)
+        gw_thread.join(timeout=2.0)
+        if log is not None:
+            drain_queue(gateway)
+            gateway.checkpoint_log()
+            log.close()
+        if isinstance(inhibition, SharedInhibitionState):
+            inhibition.close()
+        if _capture is not None:
+            _capture.close()
         sys.exit(0)
     signal.signal(signal.SIGINT, shutdown)
     signal.signal(signal.SIGTERM, shutdown)
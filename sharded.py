@@ -0,0 +1,413 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.reduction import recv_handle, send_handle
+from typing import Any, Dict, List, Optional
+from dashboard import run_http
+from fanout import Fanout
+from gateway import Gateway, GatewayStats
+from history import to_epoch, to_iso
+from inhibition import InhibitionState, SharedInhibitionState
+from lif import LIFAggregator
+from promstats import Registry
+from protocol import MAX_LINE
+from replay import CaptureWriter
+
+def shard_for(node_id: int, shards: int) -> int:
+    return int(node_id) % shards
+
+def peek_node_id(conn: socket.socket, timeout: float = 5.0) -> Optional[int]:
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        ready, _, _ = select.select([conn], [], [], remaining)
+        if not ready:
+            return None
+        data = conn.recv(4096, socket.MSG_PEEK)
+        if not data:
+            return None
+        nl = data.find(b"\n")
+        if nl >= 0:
+            try:
+                return int(json.loads(data[:nl]).get("node"))
+            except Exception:
+                return None
+        if len(data) >= 4096:
+            return None
+        time.sleep(0.002)
+
+def merge_snapshots(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if any(part.get("timestamps") is None for part in parts):
+        merged = _merge_common(parts)
+        merged["nodes"] = {k: v for part in parts for k, v in part.get("nodes", {}).items()}
+        merged["timestamps"] = None
+        merged["downsample"] = parts[0].get("downsample")
+        return merged
+    order = sorted(
+        ((ts, p, i) for p, part in enumerate(parts) for i, ts in enumerate(part.get("timestamps", []))),
+        key=lambda x: x[0],
+    )
+    timestamps = [ts for ts, _, _ in order]
+    pos: List[List[int]] = [[0] * len(part.get("timestamps", [])) for part in parts]
+    for j, (_, p, i) in enumerate(order):
+        pos[p][i] = j
+    n = len(timestamps)
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for p, part in enumerate(parts):
+        mapping = pos[p]
+        for key, ent in part.get("nodes", {}).items():
+            out = nodes.get(key)
+            if out is None:
+                out = nodes[key] = {"values": [None] * n}
+            values = out["values"]
+            for i, v in enumerate(ent.get("values", [])):
+                if v is not None:
+                    values[mapping[i]] = v
+    merged = _merge_common(parts)
+    merged["nodes"] = nodes
+    merged["timestamps"] = timestamps
+    return merged
+
+def _merge_common(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Dict[str, Any]] = {}
+    for part in parts:
+        summary.update(part.get("summary", {}))
+    last = [to_epoch(part.get("last_updated_iso"), 0.0) for part in parts if part.get("last_updated_iso")]
+    return {
+        "summary": summary,
+        "msgs_per_sec": sum(part.get("msgs_per_sec", 0.0) for part in parts),
+        "total_messages": sum(part.get("total_messages", 0) for part in parts),
+        "total_collided_messages": sum(part.get("total_collided_messages", 0) for part in parts),
+        "total_pairwise_overlaps": sum(part.get("total_pairwise_overlaps", 0) for part in parts),
+        "total_energy_j": sum(part.get("total_energy_j", 0.0) for part in parts),
+        "collision_mode": parts[0].get("collision_mode") if parts else None,
+        "last_updated_iso": to_iso(max(last)) if last else None,
+        "phy": _merge_phy(parts),
+    }
+
+def _merge_phy(parts: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    phys = [part["phy"] for part in parts if part.get("phy")]
+    if not phys:
+        return None
+    buckets: Dict[str, Dict[str, Any]] = {}
+    for phy in phys:
+        for key, b in phy.get("buckets", {}).items():
+            out = buckets.get(key)
+            if out is None:
+                buckets[key] = dict(b)
+                continue
+            for field in ("tx", "collided", "inflight"):
+                out[field] += b.get(field, 0)
+    return {**phys[0], "buckets": dict(sorted(buckets.items()))}
+
+def _worker_main(shard: int, conn, ctrl_q, reply_q, spike_q, args: argparse.Namespace) -> None:
+    import run as gwrun
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    gwrun._fanout = Fanout(maxlen=args.fanout_queue, policy=args.fanout_policy, write_timeout_s=args.fanout_timeout_s)
+    gwrun._shm_name = args.shm_inhibit
+    if args.capture:
+        gwrun._capture = CaptureWriter(f"{args.capture}.shard-{shard}")
+    pending = [0]
+    pending_lock = threading.Lock()
+
+    def on_spike(msg: Dict[str, Any]) -> None:
+        with pending_lock:
+            pending[0] += 1
+
+    log = gwrun.open_log(args, os.path.join(args.log_dir, f"shard-{shard}") if args.log_dir else "")
+    gateway = Gateway(
+        inq=gwrun._inq,
+        inhibition=InhibitionState(step_s=float(args.step_real_s)),
+        agg_leak=args.agg_leak,
+        agg_theta=args.agg_theta,
+        beta=args.beta,
+        t_inh_steps=args.t_inh,
+        tx_power_w=0.396,
+        payload_bytes=12,
+        collision_mode="spikes",
+        max_recent=args.history_capacity,
+        batch_max=args.batch_max,
+        batch_wait_s=args.batch_wait_ms / 1000.0,
+        on_spike=on_spike,
+        log=log,
+        phy=gwrun.make_phy(args),
+        time_mode=args.time_mode,
+        reorder_window_s=args.reorder_window_ms / 1000.0,
+        reorder_max=args.reorder_max,
+        dense_max_cells=args.dense_max_cells,
+        auto_points=args.auto_points,
+    )
+    gateway.add_metrics_source("fanout", gwrun._fanout.snapshot)
+    if args.shm_inhibit:
+        gateway.add_metrics_source("shm_inhibit", gwrun._shm_snapshot)
+    gateway.prom.register(gwrun._fanout.broadcast_hist)
+    gateway.prom.register(gwrun._fanout.latency_hist)
+    if log is not None:
+        gateway.restore_from_log(log)
+        gateway.add_metrics_source("log", log.snapshot)
+        log.start()
+    loop = None
+    loop_thread = None
+    gw_thread = threading.Thread(target=gateway.run, kwargs={"timeout": 0.5}, daemon=True)
+    gw_thread.start()
+    if args.transport == "asyncio":
+        loop = asyncio.new_event_loop()
+        gwrun._async_loop = loop
+        loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+        loop_thread.start()
+
+    def forward_spikes() -> None:
+        interval = max(0.0005, args.spike_flush_ms / 1000.0)
+        while True:
+            time.sleep(interval)
+            with pending_lock:
+                n = pending[0]
+                pending[0] = 0
+            if n:
+                spike_q.put((shard, n))
+
+    def control() -> None:
+        while True:
+            cmd = ctrl_q.get()
+            if cmd[0] == "inhibit":
+                gwrun._broadcast_inhibit(cmd[1], cmd[2])
+            elif cmd[0] == "snapshot":
+                reply_q.put((cmd[1], shard, gateway.snapshot_metrics(**cmd[2])))
+            elif cmd[0] == "stop":
+                if loop is not None:
+                    loop.call_soon_threadsafe(loop.stop)
+                    loop_thread.join(timeout=2.0)
+                gateway.stop()
+                gw_thread.join(timeout=2.0)
+                if log is not None:
+                    gwrun.drain_queue(gateway)
+                    gateway.checkpoint_log()
+                    log.close()
+                if gwrun._capture is not None:
+                    gwrun._capture.close()
+                return
+
+    def serve(sock: socket.socket) -> None:
+        try:
+            gwrun.GatewayHandler(sock, sock.getpeername(), None)
+        except Exception:
+            pass
+        finally:
+            sock.close()
+
+    async def serve_async(sock: socket.socket) -> None:
+        try:
+            reader, writer = await asyncio.open_connection(sock=sock, limit=MAX_LINE)
+        except OSError:
+            sock.close()
+            return
+        await gwrun._handle_async(reader, writer)
+
+    threading.Thread(target=forward_spikes, daemon=True).start()
+    threading.Thread(target=control, daemon=True).start()
+    while True:
+        try:
+            fd = recv_handle(conn)
+        except (EOFError, OSError):
+            break
+        sock = socket.socket(fileno=fd)
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(serve_async(sock), loop)
+        else:
+            threading.Thread(target=serve, args=(sock,), daemon=True).start()
+
+class ShardedGateway:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.shards = max(1, int(args.shards))
+        self.aggregator = LIFAggregator(leak=args.agg_leak, theta=args.agg_theta)
+        if args.shm_inhibit:
+            self.inhibition = SharedInhibitionState(args.shm_inhibit, create=True, step_s=float(args.step_real_s))
+        else:
+            self.inhibition = InhibitionState(step_s=float(args.step_real_s))
+        self.beta = float(args.beta)
+        self.t_inh_steps = int(args.t_inh)
+        self.stats = GatewayStats()
+        self.routed = [0] * self.shards
+        self.unrouted = 0
+        self._spike_q = multiprocessing.Queue()
+        self._reply_q = multiprocessing.Queue()
+        self._ctrl_qs = [multiprocessing.Queue() for _ in range(self.shards)]
+        self._conns: List[Any] = []
+        self._conn_locks = [threading.Lock() for _ in range(self.shards)]
+        self._procs: List[multiprocessing.Process] = []
+        self._snap_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._req = 0
+        self._stop = threading.Event()
+        self._listener: Optional[socket.socket] = None
+        self.prom = Registry()
+        self.prom.family("neuroedge_aggregator_fires_total", "Aggregator fires.", "counter", (), lambda: {(): self.stats.fires})
+        self.prom.family(
+            "neuroedge_shard_connections_total",
+            "Connections routed per shard.",
+            "counter",
+            ("shard",),
+            lambda: {(s,): n for s, n in enumerate(self.routed)},
+        )
+        self.prom.family(
+            "neuroedge_unrouted_connections_total",
+            "Connections without a node id, sent to shard 0.",
+            "counter",
+            (),
+            lambda: {(): self.unrouted},
+        )
+        self.prom.gauge("neuroedge_inhibition_beta", "Current inhibition factor.", self.inhibition.current_beta)
+
+    def start(self) -> None:
+        for shard in range(self.shards):
+            parent, child = multiprocessing.Pipe(duplex=True)
+            p = multiprocessing.Process(
+                target=_worker_main,
+                args=(shard, child, self._ctrl_qs[shard], self._reply_q, self._spike_q, self.args),
+                daemon=True,
+            )
+            p.start()
+            self._conns.append(parent)
+            self._procs.append(p)
+        threading.Thread(target=self._coordinate, daemon=True).start()
+        self._listener = socket.create_server((self.args.listen_host, self.args.listen_port), reuse_port=False)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _coordinate(self) -> None:
+        while not self._stop.is_set():
+            try:
+                _, n = self._spike_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            for _ in range(n):
+                with self._lock:
+                    fired = self.aggregator.step(1.0)
+                    if fired:
+                        self.stats.fires += 1
+                        self.inhibition.activate(self.beta, self.t_inh_steps)
+                if fired:
+                    for q in self._ctrl_qs:
+                        q.put(("inhibit", self.beta, self.t_inh_steps))
+
+    def _accept_loop(self) -> None:
+        assert self._listener is not None
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._route, args=(conn,), daemon=True).start()
+
+    def _route(self, conn: socket.socket) -> None:
+        try:
+            nid = peek_node_id(conn)
+            shard = shard_for(nid, self.shards) if nid is not None else 0
+            with self._conn_locks[shard]:
+                if nid is None:
+                    self.unrouted += 1
+                self.routed[shard] += 1
+                send_handle(self._conns[shard], conn.fileno(), self._procs[shard].pid)
+        except Exception as e:
+            print(f"gateway: dispatch failed: {e}")
+        finally:
+            conn.close()
+
+    def snapshot_metrics(self, timeout: float = 5.0, **kwargs: Any) -> Dict[str, Any]:
+        with self._snap_lock:
+            self._req += 1
+            req = self._req
+            for q in self._ctrl_qs:
+                q.put(("snapshot", req, kwargs))
+            parts: Dict[int, Dict[str, Any]] = {}
+            deadline = time.monotonic() + timeout
+            while len(parts) < self.shards:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rid, shard, snap = self._reply_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if rid == req:
+                    parts[shard] = snap
+        ordered = [parts[s] for s in sorted(parts)]
+        merged = merge_snapshots(ordered)
+        with self._lock:
+            merged["aggregator"] = {
+                "fires": self.stats.fires,
+                "theta": self.aggregator.theta,
+                "suppressed_total": sum(p.get("aggregator", {}).get("suppressed_total", 0) for p in ordered),
+            }
+        merged["inhibition"] = self.inhibition.snapshot()
+        merged["shards"] = [
+            {
+                "shard": s,
+                "connections_routed": self.routed[s],
+                "total_messages": parts[s].get("total_messages", 0) if s in parts else None,
+                "ingest": parts[s].get("ingest") if s in parts else None,
+                "fanout": parts[s].get("fanout") if s in parts else None,
+                "log": parts[s].get("log") if s in parts else None,
+                "event_time": parts[s].get("event_time") if s in parts else None,
+                "shm_inhibit": parts[s].get("shm_inhibit") if s in parts else None,
+            }
+            for s in range(self.shards)
+        ]
+        merged["ingest"] = None
+        merged["event_time"] = None
+        merged["shards_reporting"] = len(parts)
+        merged["unrouted_connections"] = self.unrouted
+        return merged
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._listener is not None:
+            try:
+                self._listener.close()
+            except OSError:
+                pass
+        for q in self._ctrl_qs:
+            q.put(("stop",))
+        for p in self._procs:
+            p.join(timeout=1.0)
+            if p.is_alive():
+                p.terminate()
+        if isinstance(self.inhibition, SharedInhibitionState):
+            self.inhibition.close()
+
+def serve_sharded(args: argparse.Namespace) -> None:
+    gateway = ShardedGateway(args)
+    gateway.start()
+    http_thread = threading.Thread(
+        target=run_http,
+        args=(gateway, args.dashboard_host, args.dashboard_port, args.metrics_cache_ms / 1000.0),
+        daemon=True,
+    )
+    http_thread.start()
+    print(f"gateway: TCP listen on {args.listen_host}:{args.listen_port} ({gateway.shards} shards, {args.transport})")
+    print(f"gateway: dashboard http://{args.dashboard_host}:{args.dashboard_port}/")
+
+    def shutdown(signum=None, frame=None) -> None:
+        print("gateway: shutting down")
+        gateway.stop()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        shutdown()
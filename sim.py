@@ -0,0 +1,249 @@
+from __future__ import annotations
+import argparse
+import heapq
+import json
+import math
+import time
+from queue import Queue
+from typing import Any, Dict, List, Sequence
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from lif import LIFPopulation
+from inhibition import InhibitionState, VirtualClock
+from gateway import Gateway
+from phy import PhyModel
+
+EV_INHIBIT = 0
+EV_TICK = 1
+EV_MSG = 2
+
+class _NodeGroup:
+    def __init__(self, ids: np.ndarray, phase_s: float, lif: LIFPopulation) -> None:
+        self.ids = ids
+        self.phase_s = float(phase_s)
+        self.lif = lif
+        n = len(ids)
+        self.beta = np.ones(n, dtype=np.float64)
+        self.inhibited_steps = np.zeros(n, dtype=np.int64)
+        self.total_spikes = np.zeros(n, dtype=np.int64)
+        self.suppressed_total = np.zeros(n, dtype=np.int64)
+
+class Simulation:
+    def __init__(
+        self,
+        n_nodes: int,
+        seed: int = 0,
+        first_id: int = 0,
+        step_s: float = 300.0,
+        accelerate: float = 60.0,
+        lif_scale: float = 1.0,
+        lif_theta: float = 50.0,
+        lif_leak: float = 0.99,
+        lif_refractory: int = 0,
+        baseline_interval: int = 0,
+        agg_leak: float = 0.995,
+        agg_theta: float = 10.0,
+        beta: float = 2.0,
+        t_inh: int = 5,
+        collision_mode: str = "spikes",
+        uplink_latency_s: float = 0.005,
+        uplink_jitter_s: float = 0.002,
+        downlink_latency_s: float = 0.005,
+        phase_groups: int = 64,
+        start_ts: float = 1700000000.0,
+        max_recent: int = 5000,
+        sfs: Sequence[int] = (7,),
+        channels: int = 1,
+    ) -> None:
+        if np is None:
+            raise RuntimeError("Simulation requires numpy")
+        self.n_nodes = int(n_nodes)
+        self.step_s = float(step_s)
+        self.tick_s = self.step_s / max(1.0, float(accelerate))
+        self.lif_scale = float(lif_scale)
+        self.baseline_interval = int(baseline_interval)
+        self.uplink_latency_s = float(uplink_latency_s)
+        self.uplink_jitter_s = float(uplink_jitter_s)
+        self.downlink_latency_s = float(downlink_latency_s)
+        self.rng = np.random.default_rng(seed)
+        self.clock = VirtualClock(start_ts)
+        self.inhibition = InhibitionState(step_s=self.tick_s, clock=self.clock)
+        ids = np.arange(first_id, first_id + self.n_nodes, dtype=np.int64)
+        sfs = [int(sf) for sf in sfs] or [7]
+        channels = max(1, int(channels))
+        assignments = {
+            int(nid): ((int(nid) // len(sfs)) % channels, sfs[int(nid) % len(sfs)]) for nid in ids
+        }
+        self.gateway = Gateway(
+            inq=Queue(),
+            inhibition=self.inhibition,
+            agg_leak=agg_leak,
+            agg_theta=agg_theta,
+            beta=beta,
+            t_inh_steps=t_inh,
+            collision_mode=collision_mode,
+            max_recent=max_recent,
+            on_fire=self._on_fire,
+            clock=self.clock,
+            phy=PhyModel(sf=sfs[0], assignments=assignments),
+        )
+        self.rng.shuffle(ids)
+        n_groups = max(1, min(int(phase_groups), self.n_nodes))
+        self.groups: List[_NodeGroup] = []
+        for g, chunk in enumerate(np.array_split(ids, n_groups)):
+            chunk = np.sort(chunk)
+            lif = LIFPopulation(len(chunk), leak=lif_leak, theta=lif_theta, refractory=lif_refractory)
+            self.groups.append(_NodeGroup(chunk, g * self.tick_s / n_groups, lif))
+        self._events: list = []
+        self._seq = 0
+        self._tick: List[int] = [0] * len(self.groups)
+        self.events_processed = 0
+        self.messages_sent = 0
+        self.inhibits_delivered = 0
+        for gi, grp in enumerate(self.groups):
+            self._push(self.clock.now + grp.phase_s, EV_TICK, gi)
+
+    def _push(self, t: float, kind: int, data: Any) -> None:
+        self._seq += 1
+        heapq.heappush(self._events, (t, kind, self._seq, data))
+
+    def _on_fire(self, beta: float, t_inh: int) -> None:
+        self._push(self.clock.now + self.downlink_latency_s, EV_INHIBIT, (float(beta), int(t_inh)))
+
+    def _step_group(self, gi: int) -> None:
+        grp = self.groups[gi]
+        k = self._tick[gi]
+        t = k * self.step_s
+        base = 50.0 + 10.0 * math.sin(2.0 * math.pi * (t / 3600.0))
+        values = base + self.rng.standard_normal(len(grp.ids))
+        spikes, suppressed = grp.lif.step(values * self.lif_scale, grp.beta)
+        grp.total_spikes += spikes
+        grp.suppressed_total += suppressed
+        send = spikes.copy()
+        if self.baseline_interval > 0 and k % self.baseline_interval == 0:
+            send[:] = True
+        idx = np.flatnonzero(send)
+        if len(idx):
+            now = self.clock.now
+            delays = self.uplink_latency_s + self.rng.uniform(0.0, self.uplink_jitter_s, len(idx))
+            for j, d in zip(idx.tolist(), delays.tolist()):
+                nid = int(grp.ids[j])
+                msg = {
+                    "ts": now,
+                    "node": nid,
+                    "name": f"node-{nid}",
+                    "ip": f"10.0.0.{10 + nid}",
+                    "value": float(values[j]),
+                    "spike": int(spikes[j]),
+                    "suppressed_total": int(grp.suppressed_total[j]),
+                }
+                self._push(now + d, EV_MSG, msg)
+            self.messages_sent += len(idx)
+        active = grp.inhibited_steps > 0
+        grp.inhibited_steps[active] -= 1
+        grp.beta[active & (grp.inhibited_steps == 0)] = 1.0
+        self._tick[gi] = k + 1
+        self._push(self.clock.now + self.tick_s, EV_TICK, gi)
+
+    def _deliver_inhibit(self, beta: float, t_inh: int) -> None:
+        for grp in self.groups:
+            grp.beta.fill(beta)
+            grp.inhibited_steps.fill(t_inh)
+        self.inhibits_delivered += 1
+
+    def run_until(self, t_end: float) -> None:
+        events = self._events
+        process = self.gateway.process_many
+        while events and events[0][0] <= t_end:
+            t, kind, _, data = heapq.heappop(events)
+            self.clock.now = t
+            if kind == EV_MSG:
+                process((data,))
+            elif kind == EV_TICK:
+                self._step_group(data)
+            else:
+                self._deliver_inhibit(*data)
+            self.events_processed += 1
+        self.clock.now = max(self.clock.now, t_end)
+
+    def run(self, duration_s: float) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        start = self.clock.now
+        self.run_until(start + float(duration_s))
+        wall = time.perf_counter() - t0
+        metrics = self.gateway.snapshot_metrics()
+        metrics["sim"] = {
+            "nodes": self.n_nodes,
+            "sim_seconds": self.clock.now - start,
+            "wall_seconds": wall,
+            "events": self.events_processed,
+            "messages_sent": self.messages_sent,
+            "inhibits_delivered": self.inhibits_delivered,
+            "spikes_total": int(sum(int(g.total_spikes.sum()) for g in self.groups)),
+            "suppressed_total": int(sum(int(g.suppressed_total.sum()) for g in self.groups)),
+        }
+        return metrics
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--nodes", type=int, default=5)
+    p.add_argument("--first-id", type=int, default=0)
+    p.add_argument("--duration-s", type=float, default=86400.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--step-s", type=float, default=300.0)
+    p.add_argument("--accelerate", type=float, default=60.0)
+    p.add_argument("--lif-theta", type=float, default=50.0)
+    p.add_argument("--lif-leak", type=float, default=0.99)
+    p.add_argument("--lif-scale", type=float, default=1.0)
+    p.add_argument("--lif-refractory", type=int, default=0)
+    p.add_argument("--baseline-interval", type=int, default=0)
+    p.add_argument("--agg-leak", type=float, default=0.995)
+    p.add_argument("--agg-theta", type=float, default=10.0)
+    p.add_argument("--beta", type=float, default=2.0)
+    p.add_argument("--t-inh", type=int, default=5)
+    p.add_argument("--collision-mode", type=str, default="spikes", choices=["spikes", "all"])
+    p.add_argument("--phase-groups", type=int, default=64)
+    p.add_argument("--max-recent", type=int, default=5000)
+    p.add_argument("--sfs", type=str, default="7")
+    p.add_argument("--channels", type=int, default=1)
+    p.add_argument("--out", type=str, default="")
+    p.add_argument("--full", action="store_true")
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    sim = Simulation(
+        n_nodes=args.nodes,
+        seed=args.seed,
+        first_id=args.first_id,
+        step_s=args.step_s,
+        accelerate=args.accelerate,
+        lif_scale=args.lif_scale,
+        lif_theta=args.lif_theta,
+        lif_leak=args.lif_leak,
+        lif_refractory=args.lif_refractory,
+        baseline_interval=args.baseline_interval,
+        agg_leak=args.agg_leak,
+        agg_theta=args.agg_theta,
+        beta=args.beta,
+        t_inh=args.t_inh,
+        collision_mode=args.collision_mode,
+        phase_groups=args.phase_groups,
+        max_recent=args.max_recent,
+        sfs=[int(x) for x in args.sfs.split(",") if x],
+        channels=args.channels,
+    )
+    metrics = sim.run(args.duration_s)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(metrics, f)
+    if args.full:
+        print(json.dumps(metrics))
+        return
+    brief: Dict[str, Any] = {k: v for k, v in metrics.items() if k not in ("nodes", "timestamps", "summary")}
+    print(json.dumps(brief, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+from __future__ import annotations
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from sim import Simulation
+
+CACHE_VERSION = 2
+
+PARAMS: Dict[str, type] = {
+    "lif_theta": float,
+    "lif_leak": float,
+    "lif_scale": float,
+    "lif_refractory": int,
+    "baseline_interval": int,
+    "agg_leak": float,
+    "agg_theta": float,
+    "beta": float,
+    "t_inh": int,
+}
+
+DEFAULT_GRID = "lif_theta=40,50,60;lif_leak=0.98,0.99;agg_theta=5,10,20;beta=2;t_inh=5"
+
+COLUMNS = (
+    "messages_sent",
+    "energy_j",
+    "collided",
+    "pairwise",
+    "suppressed",
+    "fires",
+    "spikes",
+    "wall_s",
+)
+
+def _values(spec: str, kind: type) -> List[Any]:
+    out: List[Any] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            a, b, *rest = part.split(":")
+            lo, hi = kind(a), kind(b)
+            step = kind(rest[0]) if rest else kind(1)
+            if step <= 0:
+                raise ValueError(f"non-positive step in {part!r}")
+            n = int(round((hi - lo) / step))
+            out.extend(kind(round(lo + i * step, 10)) for i in range(n + 1))
+        else:
+            out.append(kind(part))
+    return out
+
+def parse_grid(specs: Sequence[str]) -> Dict[str, List[Any]]:
+    grid: Dict[str, List[Any]] = {}
+    for spec in specs:
+        for item in spec.split(";"):
+            item = item.strip()
+            if not item:
+                continue
+            name, sep, values = item.partition("=")
+            name = name.strip().lstrip("-").replace("-", "_")
+            if not sep or name not in PARAMS:
+                raise ValueError(f"bad grid entry {item!r} (parameters: {', '.join(PARAMS)})")
+            grid[name] = _values(values, PARAMS[name])
+            if not grid[name]:
+                raise ValueError(f"no values for {name}")
+    return grid
+
+def expand(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    names = list(grid)
+    return [dict(zip(names, combo)) for combo in itertools.product(*(grid[n] for n in names))]
+
+def config_key(config: Dict[str, Any]) -> str:
+    blob = json.dumps({"v": CACHE_VERSION, **config}, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+def evaluate(config: Dict[str, Any]) -> Dict[str, Any]:
+    kwargs = dict(config)
+    duration_s = kwargs.pop("duration_s")
+    t0 = time.perf_counter()
+    sim = Simulation(**kwargs)
+    m = sim.run(duration_s)
+    return {
+        "messages_sent": m["sim"]["messages_sent"],
+        "energy_j": m["total_energy_j"],
+        "collided": m["total_collided_messages"],
+        "pairwise": m["total_pairwise_overlaps"],
+        "suppressed": m["sim"]["suppressed_total"],
+        "fires": m["aggregator"]["fires"],
+        "spikes": m["sim"]["spikes_total"],
+        "inhibits": m["sim"]["inhibits_delivered"],
+        "wall_s": time.perf_counter() - t0,
+    }
+
+class ResultCache:
+    def __init__(self, directory: str) -> None:
+        self.dir = Path(directory) if directory else None
+        if self.dir is not None:
+            self.dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Optional[Path]:
+        return self.dir / f"{key}.json" if self.dir is not None else None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)["result"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, config: Dict[str, Any], result: Dict[str, Any]) -> None:
+        path = self._path(key)
+        if path is None:
+            return
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"config": config, "result": result}, f)
+        os.replace(tmp, path)
+
+def sweep(
+    base: Dict[str, Any],
+    points: List[Dict[str, Any]],
+    cache: ResultCache,
+    workers: int = 0,
+    progress: bool = True,
+) -> Tuple[List[Dict[str, Any]], int]:
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(points)
+    todo: List[Tuple[int, str, Dict[str, Any]]] = []
+    for i, point in enumerate(points):
+        config = {**base, **point}
+        key = config_key(config)
+        result = cache.get(key)
+        if result is None:
+            todo.append((i, key, config))
+        else:
+            rows[i] = {**point, **result, "cached": True}
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = {pool.submit(evaluate, config): (i, key, config) for i, key, config in todo}
+            for done, fut in enumerate(as_completed(futures), 1):
+                i, key, config = futures[fut]
+                result = fut.result()
+                cache.put(key, config, result)
+                rows[i] = {**points[i], **result, "cached": False}
+                if progress:
+                    print(f"sweep: {done}/{len(todo)} {json.dumps(points[i])} {result['wall_s']:.1f}s", file=sys.stderr)
+    return [r for r in rows if r is not None], len(todo)
+
+def _fmt(v: Any) -> str:
+    if isinstance(v, float):
+        return f"{v:.4g}"
+    return str(v)
+
+def format_table(rows: List[Dict[str, Any]], names: Sequence[str]) -> str:
+    cols = list(names) + list(COLUMNS) + ["cached"]
+    cells = [cols] + [[_fmt(r.get(c, "")) for c in cols] for r in rows]
+    widths = [max(len(row[j]) for row in cells) for j in range(len(cols))]
+    return "\n".join("  ".join(c.rjust(w) for c, w in zip(row, widths)) for row in cells)
+
+def parse_args() -> argparse.Namespace:
+    p = argparse.ArgumentParser()
+    p.add_argument("--grid", type=str, action="append", default=[])
+    p.add_argument("--nodes", type=int, default=50)
+    p.add_argument("--duration-s", type=float, default=86400.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--step-s", type=float, default=300.0)
+    p.add_argument("--accelerate", type=float, default=60.0)
+    p.add_argument("--collision-mode", type=str, default="spikes", choices=["spikes", "all"])
+    p.add_argument("--phase-groups", type=int, default=64)
+    p.add_argument("--sfs", type=str, default="7")
+    p.add_argument("--channels", type=int, default=1)
+    p.add_argument("--workers", type=int, default=0)
+    p.add_argument("--cache-dir", type=str, default=".sweep-cache")
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--sort", type=str, default="")
+    p.add_argument("--desc", action="store_true")
+    p.add_argument("--format", type=str, default="table", choices=["table", "csv", "json"])
+    p.add_argument("--out", type=str, default="")
+    return p.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    try:
+        grid = parse_grid(args.grid or [DEFAULT_GRID])
+    except ValueError as e:
+        print(f"sweep: {e}")
+        sys.exit(2)
+    base = {
+        "n_nodes": args.nodes,
+        "duration_s": args.duration_s,
+        "seed": args.seed,
+        "step_s": args.step_s,
+        "accelerate": args.accelerate,
+        "collision_mode": args.collision_mode,
+        "phase_groups": args.phase_groups,
+        "sfs": [int(x) for x in args.sfs.split(",") if x],
+        "channels": args.channels,
+    }
+    points = expand(grid)
+    cache = ResultCache("" if args.no_cache else args.cache_dir)
+    t0 = time.perf_counter()
+    rows, computed = sweep(base, points, cache, args.workers)
+    print(
+        f"sweep: {len(rows)} points, {computed} computed, {len(rows) - computed} cached in {time.perf_counter() - t0:.1f}s",
+        file=sys.stderr,
+    )
+    if args.sort:
+        rows.sort(key=lambda r: r.get(args.sort, 0), reverse=args.desc)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"base": base, "grid": grid, "results": rows}, f, indent=2)
+    if args.format == "json":
+        print(json.dumps(rows))
+    elif args.format == "csv":
+        w = csv.DictWriter(sys.stdout, fieldnames=list(grid) + list(COLUMNS) + ["inhibits", "cached"], extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rows)
+    else:
+        print(format_table(rows, list(grid)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collisions import BucketedTxIndex, TxEntry, TxIndex
+
+def _linear(entries, start, end, exclude_node):
+    return [e for e in entries if e.end > start and e.start < end and e.node != exclude_node]
+
+def test_overlapping_matches_linear_scan():
+    rng = random.Random(3)
+    index = TxIndex()
+    live = []
+    t = 0.0
+    for _ in range(2000):
+        t += rng.expovariate(20.0)
+        start = t + rng.uniform(-0.2, 0.05)
+        end = start + rng.choice((0.05, 0.1, 0.4))
+        node = rng.randrange(30)
+        got = index.overlapping(start, end, exclude_node=node)
+        want = _linear(live, start, end, node)
+        assert {id(e) for e in got} == {id(e) for e in want}
+        entry = TxEntry(node, start, end)
+        index.add(entry)
+        live.append(entry)
+        cutoff = t - 1.0
+        expired = index.expire(cutoff)
+        assert expired == sum(1 for e in live if e.end < cutoff)
+        live = [e for e in live if e.end >= cutoff]
+        assert len(index) == len(live)
+
+def test_out_of_order_add_keeps_end_order():
+    index = TxIndex()
+    for start, end in ((0.0, 3.0), (0.0, 1.0), (0.0, 2.0)):
+        index.add(TxEntry(0, start, end))
+    assert [e.end for e in index] == [1.0, 2.0, 3.0]
+    assert index.expire(1.5) == 1
+
+def test_touching_intervals_do_not_overlap():
+    index = TxIndex()
+    index.add(TxEntry(1, 0.0, 1.0))
+    assert index.overlapping(1.0, 2.0) == []
+    assert index.overlapping(-1.0, 0.0) == []
+    assert len(index.overlapping(0.5, 1.5)) == 1
+
+def test_buckets_are_independent():
+    idx = BucketedTxIndex()
+    idx.bucket((0, 7)).add(TxEntry(1, 0.0, 1.0))
+    idx.bucket((1, 7)).add(TxEntry(2, 0.0, 1.0))
+    assert len(idx.bucket((0, 7)).overlapping(0.5, 1.5)) == 1
+    assert idx.buckets() == {(0, 7): 1, (1, 7): 1}
+    assert idx.expire(2.0) == 2
+    assert len(idx) == 0
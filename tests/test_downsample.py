@@ -0,0 +1,52 @@
+import math
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downsample import downsample, lttb, minmax
+
+def _series(n):
+    xs = [float(i) for i in range(n)]
+    ys = [math.sin(i / 7.0) for i in range(n)]
+    ys[n // 3] = 50.0
+    ys[2 * n // 3] = -50.0
+    return xs, ys
+
+@pytest.mark.parametrize("n,threshold", [(1000, 100), (101, 3), (500, 499), (10, 7)])
+def test_lttb_keeps_endpoints_and_threshold(n, threshold):
+    xs, ys = _series(n)
+    ox, oy = lttb(xs, ys, threshold)
+    assert len(ox) == len(oy) == threshold
+    assert (ox[0], oy[0]) == (xs[0], ys[0])
+    assert (ox[-1], oy[-1]) == (xs[-1], ys[-1])
+    assert all(a < b for a, b in zip(ox, ox[1:]))
+    assert all(ys[int(x)] == y for x, y in zip(ox, oy))
+    if threshold >= 10:
+        assert 50.0 in oy and -50.0 in oy
+
+def test_short_series_is_returned_unchanged():
+    xs, ys = _series(20)
+    assert lttb(xs, ys, 20) == (xs, ys)
+    assert minmax(xs, ys, 50) == (xs, ys)
+    assert lttb([], [], 10) == ([], [])
+
+@pytest.mark.parametrize("n,threshold", [(1000, 100), (1000, 101), (37, 10)])
+def test_minmax_keeps_extremes_per_bucket(n, threshold):
+    xs, ys = _series(n)
+    ox, oy = minmax(xs, ys, threshold)
+    buckets = threshold // 2
+    assert buckets <= len(ox) <= 2 * buckets <= threshold
+    assert all(a < b for a, b in zip(ox, ox[1:]))
+    assert max(oy) == max(ys) and min(oy) == min(ys)
+    size = n / buckets
+    for b in range(buckets):
+        lo, hi = int(b * size), int((b + 1) * size)
+        kept = [y for x, y in zip(ox, oy) if lo <= x < hi]
+        assert max(kept) == max(ys[lo:hi]) and min(kept) == min(ys[lo:hi])
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample([1.0], [1.0], 10, method="mean")
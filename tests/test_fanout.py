@@ -0,0 +1,110 @@
+import os
+import socket
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fanout import Fanout, ThreadOutbox, _Outbox
+
+class HeldOutbox(_Outbox):
+    def __init__(self, fanout, key):
+        super().__init__(fanout, key)
+        self.closes = 0
+
+    def put(self, kind, data, t):
+        if not self.closed:
+            self._enqueue(kind, data, t)
+
+    def close(self):
+        self.closes += 1
+        self.closed = True
+        self._items.clear()
+
+def _held(policy, maxlen=3):
+    f = Fanout(maxlen=maxlen, policy=policy)
+    box = f._add(HeldOutbox(f, "n1"))
+    return f, box
+
+def _payloads(box):
+    return [item[1] for item in box._items]
+
+def test_drop_oldest_keeps_newest():
+    f, box = _held("drop_oldest")
+    for i in range(5):
+        f.broadcast(b"%d" % i, kind="msg")
+    assert _payloads(box) == [b"2", b"3", b"4"]
+    assert (f.stats.enqueued, f.stats.dropped, f.stats.disconnects) == (5, 2, 0)
+
+def test_drop_new_keeps_oldest():
+    f, box = _held("drop_new")
+    for i in range(5):
+        f.broadcast(b"%d" % i, kind="msg")
+    assert _payloads(box) == [b"0", b"1", b"2"]
+    assert (f.stats.enqueued, f.stats.dropped, f.stats.disconnects) == (3, 2, 0)
+
+def test_disconnect_closes_slow_client():
+    f, box = _held("disconnect")
+    for i in range(5):
+        f.broadcast(b"%d" % i, kind="msg")
+    assert box.closed and box.closes == 1
+    assert _payloads(box) == []
+    assert (f.stats.dropped, f.stats.disconnects) == (1, 1)
+
+def test_inhibit_is_coalesced():
+    f, box = _held("drop_new", maxlen=2)
+    f.broadcast(b"msg", kind="msg")
+    for i in range(4):
+        f.broadcast(b"inh%d" % i)
+    assert _payloads(box) == [b"msg", b"inh3"]
+    assert (f.stats.coalesced, f.stats.dropped) == (3, 0)
+    assert f.snapshot()["queue_depth_max"] == 2
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        Fanout(policy="block")
+
+def _recv_all(sock, n, timeout=2.0):
+    sock.settimeout(timeout)
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+def test_thread_writer_delivers_to_all_clients():
+    f = Fanout(maxlen=16)
+    pairs = [socket.socketpair() for _ in range(5)]
+    try:
+        for i, (a, _) in enumerate(pairs):
+            assert isinstance(f.add_thread_client(i, a), ThreadOutbox)
+        f.broadcast(b"inhibit\n")
+        for _, b in pairs:
+            assert _recv_all(b, 8) == b"inhibit\n"
+        deadline = time.monotonic() + 2.0
+        while f.stats.sent < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert f.stats.sent == 5
+    finally:
+        for a, b in pairs:
+            a.close()
+            b.close()
+
+def test_thread_writer_disconnects_client_that_stops_reading():
+    f = Fanout(maxlen=4, write_timeout_s=0.2)
+    a, b = socket.socketpair()
+    try:
+        box = f.add_thread_client("slow", a)
+        f.broadcast(b"x" * (8 << 20), kind="msg")
+        deadline = time.monotonic() + 3.0
+        while not box.closed and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert box.closed
+        assert f.stats.disconnects == 1
+    finally:
+        a.close()
+        b.close()
@@ -0,0 +1,59 @@
+import os
+import sys
+from queue import Queue
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway import Gateway
+from history import MessageHistory
+from inhibition import InhibitionState
+
+def _fill(hist, n):
+    return [hist.append(float(i), i % 2, float(i), 0, float(i), 0.1, 10.0 + i) for i in range(n)]
+
+def test_eviction_returns_oldest_node_and_energy():
+    hist = MessageHistory(3)
+    evicted = _fill(hist, 5)
+    assert evicted[:3] == [None, None, None]
+    assert evicted[3:] == [(0, 10.0), (1, 11.0)]
+    assert len(hist) == 3
+    assert hist.seq == 5
+    assert hist.column("ts").tolist() == [2.0, 3.0, 4.0]
+    assert hist.tail("value", 2).tolist() == [3.0, 4.0]
+    assert hist.tail("value", 10).tolist() == [2.0, 3.0, 4.0]
+    assert hist.last("energy_j") == 14.0
+
+def test_partial_fill_and_clear():
+    hist = MessageHistory(4)
+    _fill(hist, 2)
+    assert hist.column("node").tolist() == [0, 1]
+    hist.clear()
+    assert len(hist) == 0
+    assert hist.last("ts") is None
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_recent_summary_tracks_evicted_energy():
+    clock = Clock(1000.0)
+    gw = Gateway(Queue(), InhibitionState(clock=clock), max_recent=4, clock=clock)
+    sent = []
+    for i in range(11):
+        clock.now += 1.0
+        node = "a" if i % 3 else "b"
+        gw.process_many(({"node": node, "ts": clock.now, "value": 1.0, "spike": 0},))
+        sent.append(node)
+    summary = gw.snapshot_metrics()["summary"]
+    kept = sent[-4:]
+    assert {k: v["count"] for k, v in summary.items()} == {n: kept.count(n) for n in set(kept)}
+    for key, entry in summary.items():
+        idx = gw._history.nodes.lookup(key)
+        retained = [e for n, e in zip(gw._history.column("node"), gw._history.column("energy_j")) if n == idx]
+        assert entry["energy_total"] > 0.0
+        assert entry["energy_total"] == pytest.approx(sum(retained))
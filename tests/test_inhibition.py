@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inhibition import _SEQ, READ_DEADLINE_S, SharedInhibitionState, VirtualClock
+
+@pytest.fixture
+def shm_pair():
+    name = "nei-test-" + uuid.uuid4().hex[:12]
+    clock = VirtualClock(100.0)
+    writer = SharedInhibitionState(name, create=True, step_s=0.5, clock=clock)
+    reader = SharedInhibitionState(name, clock=clock)
+    yield clock, writer, reader
+    reader.close()
+    writer.close()
+
+def test_reader_sees_writes_and_expiry(shm_pair):
+    clock, writer, reader = shm_pair
+    assert reader.read() == (0, 1.0, 0.0, 0)
+    writer.activate(2.0, 4)
+    assert reader.read() == (1, 2.0, 102.0, 4)
+    assert reader.current_beta() == 2.0
+    clock.now = 102.0
+    assert reader.current_beta() == 1.0
+    writer.restore(1.5, 110.0, 3)
+    snap = reader.snapshot()
+    assert (snap["generation"], snap["beta"], snap["expiry_ts"]) == (2, 1.5, 110.0)
+    assert _SEQ.unpack_from(writer._buf, 0)[0] == 4
+
+def test_torn_write_returns_last_value_after_deadline(shm_pair):
+    _, writer, reader = shm_pair
+    writer.activate(2.0, 4)
+    good = reader.read()
+    _SEQ.pack_into(writer._buf, 0, 5)
+    t0 = time.monotonic()
+    assert reader.read() == good
+    assert time.monotonic() - t0 >= READ_DEADLINE_S
+    assert reader.stale_reads == 1
+    assert reader.retries > 0
+    writer.activate(3.0, 1)
+    assert _SEQ.unpack_from(writer._buf, 0)[0] == 8
+    assert reader.read()[1] == 3.0
+
+def test_concurrent_reads_are_never_torn(shm_pair):
+    _, writer, reader = shm_pair
+    stop = threading.Event()
+
+    def write():
+        k = 1
+        while not stop.is_set():
+            writer.restore(float(k), float(k) * 10.0, k)
+            k += 1
+
+    writer.restore(0.0, 0.0, 0)
+    t = threading.Thread(target=write)
+    t.start()
+    try:
+        for _ in range(20000):
+            _, beta, expiry, steps = reader.read()
+            assert expiry == beta * 10.0 and steps == int(beta)
+    finally:
+        stop.set()
+        t.join()
+    assert reader.stale_reads == 0
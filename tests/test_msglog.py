@@ -0,0 +1,102 @@
+import os
+import sys
+from queue import Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway import Gateway
+from inhibition import InhibitionState
+from msglog import FLAG_UPDATE, MessageLog, list_segments, read_header, records_after, scan, tail
+
+RESTORED_KEYS = (
+    "nodes",
+    "summary",
+    "aggregator",
+    "total_messages",
+    "total_collided_messages",
+    "total_pairwise_overlaps",
+    "total_energy_j",
+    "inhibition",
+    "last_updated_iso",
+)
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def _gateway(clock: Clock, log: MessageLog) -> Gateway:
+    return Gateway(
+        Queue(),
+        InhibitionState(clock=clock),
+        agg_theta=3.0,
+        collision_mode="all",
+        max_recent=1000,
+        clock=clock,
+        log=log,
+        checkpoint_s=0.0,
+    )
+
+def test_restore_matches_snapshot(tmp_path):
+    clock = Clock(1.7e9)
+    log = MessageLog(str(tmp_path))
+    gw = _gateway(clock, log)
+    for i in range(400):
+        clock.now += 0.013
+        gw.process_many([{"node": i % 7, "ts": clock.now, "value": float(i % 11), "spike": i % 3 == 0, "suppressed_total": i // 50}])
+        if i == 250:
+            gw.checkpoint_log()
+    log.close()
+    before = gw.snapshot_metrics()
+    assert before["aggregator"]["fires"] > 0
+    assert before["total_collided_messages"] > 0
+
+    log = MessageLog(str(tmp_path))
+    restored = _gateway(clock, log)
+    assert restored.restore_from_log(log) == 400
+    after = restored.snapshot_metrics()
+    log.close()
+    for key in RESTORED_KEYS:
+        assert after[key] == before[key], key
+
+def _append(log: MessageLog, t: float, node: int = 1) -> int:
+    return log.append(t, node, t, 0, t, 0.1, 0.5)
+
+def test_rotation_by_time_and_record_count(tmp_path):
+    log = MessageLog(str(tmp_path), segment_s=10.0, segment_records=4, retention_s=0.0)
+    for i in range(12):
+        _append(log, 1000.0 + i)
+    log.flush()
+    log.close()
+    segs = list_segments(str(tmp_path))
+    assert [read_header(path)[0] for _, path in segs] == [4, 4, 2, 2]
+    assert [rec["ts"] for rec in scan(str(tmp_path))] == [1000.0 + i for i in range(12)]
+    assert [rec["ts"] for rec in scan(str(tmp_path), 1004.5, 1007.0)] == [1005.0, 1006.0, 1007.0]
+    assert [rec["ts"] for rec in tail(str(tmp_path), 3)] == [1009.0, 1010.0, 1011.0]
+
+def test_update_patches_active_and_closed_segments(tmp_path):
+    log = MessageLog(str(tmp_path), segment_s=10.0, retention_s=0.0)
+    first = _append(log, 1000.0)
+    log.flush()
+    second = _append(log, 1015.0)
+    log.update(first, 1015.0, 1, 1000.0, True)
+    log.update(second, 1015.5, 1, 1015.0, True)
+    log.update(second, 1015.5, 1, 1015.0, False)
+    log.flush()
+    log.close()
+    assert log.stats.patched == 2
+    assert len(list_segments(str(tmp_path))) == 2
+    assert [(rec["ts"], rec["collided"]) for rec in scan(str(tmp_path))] == [(1000.0, 1), (1015.0, 1)]
+    flags = [rec[7] for rec in records_after(str(tmp_path))]
+    assert sum(1 for f in flags if f & FLAG_UPDATE) == 3
+
+def test_retention_deletes_old_segments(tmp_path):
+    log = MessageLog(str(tmp_path), segment_s=10.0, retention_s=30.0)
+    for t in (1000.0, 1010.0, 1020.0, 1060.0):
+        _append(log, t)
+        log.flush()
+    log.close()
+    assert [start for start, _ in list_segments(str(tmp_path))] == [1020.0, 1060.0]
+    assert log.stats.segments_deleted == 2
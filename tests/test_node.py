@@ -0,0 +1,102 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from node import NodeClient
+from protocol import FRAME, PROTO_BIN, FrameDecoder
+
+class FakeSock:
+    def __init__(self) -> None:
+        self.limit = 0
+        self.data = bytearray()
+
+    def send(self, data) -> int:
+        if self.limit <= 0:
+            raise BlockingIOError()
+        n = min(self.limit, len(data))
+        self.limit -= n
+        self.data += bytes(data[:n])
+        return n
+
+    def close(self) -> None:
+        pass
+
+class FakeSelector:
+    def __init__(self) -> None:
+        self.events = None
+
+    def modify(self, sock, events) -> None:
+        self.events = events
+
+    def unregister(self, sock) -> None:
+        pass
+
+def _node(**kwargs) -> NodeClient:
+    node = NodeClient(1, "127.0.0.1", 9, "n1", "127.0.0.1", 0.1, 1.0, 1.0, 50.0, 0.99, 0, 0, **kwargs)
+    node._proto = PROTO_BIN
+    node.sock = FakeSock()
+    node._sel = FakeSelector()
+    return node
+
+def _msg(i: int) -> dict:
+    return {"ts": 1000.0 + i, "value": float(i), "spike": 0, "suppressed_total": 0}
+
+def _sent_ts(sock: FakeSock) -> list:
+    return [msg["ts"] - 1000.0 for msg in FrameDecoder().feed(bytes(sock.data))]
+
+def test_partial_write_tracks_unsent_messages():
+    node = _node(max_write_buffer=10 * FRAME.size)
+    sock = node.sock
+    sock.limit = FRAME.size + 5
+    for i in range(4):
+        node._send(_msg(i), 0.0)
+    assert node.loop_stats.write_stalls == 1
+    assert node._sel.events is not None
+    assert [int(m["ts"] - 1000.0) for _, m in node._wpending] == [1, 2, 3]
+    assert len(node._wbuf) == 3 * FRAME.size - 5
+    sock.limit = FRAME.size
+    node._on_writable()
+    assert [int(m["ts"] - 1000.0) for _, m in node._wpending] == [2, 3]
+    sock.limit = 1 << 20
+    node._on_writable()
+    assert not node._wpending and not node._wbuf
+    assert _sent_ts(sock) == [0.0, 1.0, 2.0, 3.0]
+
+def test_drop_requeues_unacknowledged_messages_in_order():
+    node = _node(max_write_buffer=2 * FRAME.size, offline_buffer=100)
+    node.sock.limit = FRAME.size // 2
+    for i in range(6):
+        node._send(_msg(i), 0.0)
+    assert node.loop_stats.backpressured == 3
+    node._close_link()
+    assert [int(m["ts"] - 1000.0) for m in node._backlog] == [0, 1, 2, 3, 4, 5]
+    assert node.link_stats.disconnects == 1
+    assert not node._wpending and not node._wbuf
+
+def test_offline_ring_drops_oldest():
+    node = _node(offline_buffer=3)
+    node.sock = None
+    for i in range(5):
+        node._buffer(_msg(i))
+    assert [int(m["ts"] - 1000.0) for m in node._backlog] == [2, 3, 4]
+    assert (node.link_stats.buffered, node.link_stats.dropped) == (5, 2)
+    node._requeue([_msg(10), _msg(11)])
+    assert [int(m["ts"] - 1000.0) for m in node._backlog] == [2, 3, 4]
+    assert node.link_stats.dropped == 4
+
+def test_zero_offline_buffer_drops_everything():
+    node = _node(offline_buffer=0)
+    node._buffer(_msg(0))
+    assert not node._backlog
+    assert node.link_stats.dropped == 1
+
+def test_backlog_replays_after_drain():
+    node = _node(offline_buffer=10)
+    for i in range(3):
+        node._buffer(_msg(i))
+    node.sock.limit = 1 << 20
+    node._replay_backlog()
+    assert not node._backlog
+    assert node.link_stats.replayed == 3
+    assert _sent_ts(node.sock) == [0.0, 1.0, 2.0]
@@ -0,0 +1,30 @@
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import FrameDecoder, encode_frame
+
+def test_frame_roundtrip():
+    frame = encode_frame(7, 1700000000.5, 1.25, True, 3, radio=0x27)
+    (msg,) = FrameDecoder("n7", "10.0.0.7").feed(frame)
+    assert msg["ts"] == 1700000000.5
+    assert msg["node"] == 7
+    assert msg["value"] == 1.25
+    assert msg["spike"] == 1
+    assert msg["suppressed_total"] == 3
+    assert (msg["ch"], msg["sf"]) == (2, 7)
+
+def test_non_finite_ts_is_dropped():
+    data = b"".join(encode_frame(1, ts, 0.0, False, 0) for ts in (math.nan, math.inf, -math.inf))
+    msgs = FrameDecoder().feed(data)
+    assert len(msgs) == 3
+    assert all(msg["ts"] is None for msg in msgs)
+
+def test_partial_frames_are_buffered():
+    frame = encode_frame(1, 1.0, 0.0, False, 0)
+    dec = FrameDecoder()
+    assert dec.feed(frame[:5]) == []
+    (msg,) = dec.feed(frame[5:])
+    assert msg["ts"] == 1.0
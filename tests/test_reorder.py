@@ -0,0 +1,80 @@
+import os
+import sys
+from queue import Queue
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gateway import Gateway
+from inhibition import InhibitionState
+
+T0 = 1.7e9
+
+class Clock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def _gateway(clock: Clock, **kwargs) -> Gateway:
+    kwargs.setdefault("reorder_window_s", 1.0)
+    return Gateway(Queue(), InhibitionState(clock=clock), clock=clock, time_mode="event", **kwargs)
+
+def _send(gw, *offsets):
+    return gw.process_many([{"node": 1, "ts": T0 + off, "value": 0.0, "spike": 0} for off in offsets])
+
+def _processed(gw):
+    return [ts - T0 for ts in gw._history.column("start_s").tolist()]
+
+def test_released_in_event_order_behind_watermark():
+    clock = Clock(T0 + 10.0)
+    gw = _gateway(clock)
+    assert _send(gw, 0.3, 0.1, 0.2) == 0
+    assert _send(gw, 1.25) == 2
+    assert _processed(gw) == pytest.approx([0.1, 0.2])
+    assert _send(gw, 3.0) == 2
+    assert _processed(gw) == pytest.approx([0.1, 0.2, 0.3, 1.25])
+    rs = gw.reorder_stats
+    assert (rs.admitted, rs.released, rs.reordered) == (5, 4, 1)
+
+def test_late_messages_are_dropped():
+    clock = Clock(T0 + 10.0)
+    gw = _gateway(clock)
+    _send(gw, 0.0, 2.0)
+    assert gw._watermark == pytest.approx(T0 + 1.0)
+    assert _send(gw, 0.5) == 0
+    assert gw.reorder_stats.late_dropped == 1
+    _send(gw, 1.5)
+    assert len(gw._reorder) == 2
+
+def test_overflow_forces_release_and_advances_watermark():
+    clock = Clock(T0 + 10.0)
+    gw = _gateway(clock, reorder_max=2)
+    assert _send(gw, 0.4, 0.2, 0.3) == 1
+    assert _processed(gw) == pytest.approx([0.2])
+    assert gw.reorder_stats.forced == 1
+    assert gw._watermark == pytest.approx(T0 + 0.2)
+    assert _send(gw, 0.1) == 0
+    assert gw.reorder_stats.late_dropped == 1
+
+def test_future_timestamps_fall_back_to_arrival():
+    clock = Clock(T0)
+    gw = _gateway(clock, reorder_window_s=0.0)
+    _send(gw, 60.0)
+    assert gw.reorder_stats.clamped == 1
+    assert _processed(gw) == [0.0]
+
+def test_idle_flush_after_window():
+    clock = Clock(T0 + 10.0)
+    gw = _gateway(clock)
+    _send(gw, 0.2, 0.1)
+    assert gw.flush_reorder() == 0
+    clock.now += 1.5
+    assert gw.flush_reorder() == 2
+    assert _processed(gw) == pytest.approx([0.1, 0.2])
+    assert gw.reorder_stats.idle_flushes == 1
+    _send(gw, 0.15)
+    assert gw.flush_reorder(force=True) == 0
+    assert gw.reorder_stats.late_dropped == 1
@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard import SnapshotCache
+
+class FakeGateway:
+    def __init__(self) -> None:
+        self.generation = 0
+        self.calls = 0
+
+    def snapshot_metrics(self, **kwargs):
+        self.calls += 1
+        return {"generation": self.generation, "args": kwargs, "pad": "x" * 4000}
+
+def _request(cache, query="", **headers):
+    environ = {"QUERY_STRING": query}
+    environ.update(headers)
+    seen = {}
+
+    def start_response(status, hdrs):
+        seen["status"] = status
+        seen["headers"] = dict(hdrs)
+
+    body = b"".join(cache.respond(environ, start_response))
+    return seen["status"], seen["headers"], body
+
+def test_hits_until_generation_changes():
+    gw = FakeGateway()
+    cache = SnapshotCache(gw, ttl_s=60.0)
+    first = cache.get({})
+    assert cache.get({}) is first
+    assert cache.get({"points": 10}) is not first
+    assert gw.calls == 2
+    gw.generation += 1
+    assert cache.get({}) is not first
+    assert gw.calls == 3
+    snap = cache.snapshot()
+    assert (snap["hits"], snap["misses"], snap["entries"]) == (1, 3, 2)
+
+def test_zero_ttl_always_recomputes():
+    gw = FakeGateway()
+    cache = SnapshotCache(gw, ttl_s=0.0)
+    cache.get({})
+    cache.get({})
+    assert gw.calls == 2
+
+def test_etag_and_not_modified():
+    gw = FakeGateway()
+    cache = SnapshotCache(gw, ttl_s=60.0)
+    status, headers, body = _request(cache)
+    assert status == "200 OK"
+    assert json.loads(body)["generation"] == 0
+    etag = headers["ETag"]
+    status, headers, body = _request(cache, HTTP_IF_NONE_MATCH=etag)
+    assert status.startswith("304") and body == b""
+    status, _, _ = _request(cache, HTTP_IF_NONE_MATCH='"other", ' + etag)
+    assert status.startswith("304")
+    gw.generation += 1
+    status, headers, _ = _request(cache, HTTP_IF_NONE_MATCH=etag)
+    assert status == "200 OK" and headers["ETag"] != etag
+    assert cache.snapshot()["not_modified"] == 2
+
+def test_gzip_when_accepted():
+    cache = SnapshotCache(FakeGateway(), ttl_s=60.0, gzip_min_bytes=100)
+    status, headers, body = _request(cache, HTTP_ACCEPT_ENCODING="br, gzip")
+    assert headers["Content-Encoding"] == "gzip"
+    assert int(headers["Content-Length"]) == len(body)
+    assert json.loads(gzip.decompress(body))["generation"] == 0
+    _, headers, body = _request(cache)
+    assert "Content-Encoding" not in headers
+    json.loads(body)
+
+def test_bad_query_is_400():
+    status, _, body = _request(SnapshotCache(FakeGateway()), "points=10&method=mean")
+    assert status.startswith("400")
+    assert "mean" in json.loads(body)["error"]
+
+def test_concurrent_misses_share_one_encode():
+    release = threading.Event()
+
+    class SlowGateway(FakeGateway):
+        def snapshot_metrics(self, **kwargs):
+            release.wait(5.0)
+            return super().snapshot_metrics(**kwargs)
+
+    gw = SlowGateway()
+    cache = SnapshotCache(gw, ttl_s=60.0)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get({}))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join()
+    assert gw.calls == 1
+    assert len({id(r) for r in results}) == 1
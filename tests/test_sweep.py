@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sweep import ResultCache, config_key, expand, parse_grid, sweep
+
+BASE = {"n_nodes": 3, "duration_s": 3600.0, "seed": 1, "step_s": 300.0, "accelerate": 60.0}
+
+def test_config_key_is_order_independent_and_value_sensitive():
+    assert config_key({"a": 1, "b": 2.0}) == config_key({"b": 2.0, "a": 1})
+    assert config_key({"a": 1, "b": 2.0}) != config_key({"a": 1, "b": 2.5})
+
+def test_cache_hit_miss_and_corrupt_entry(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    key = config_key(BASE)
+    assert cache.get(key) is None
+    cache.put(key, BASE, {"energy_j": 1.5})
+    assert cache.get(key) == {"energy_j": 1.5}
+    assert ResultCache(str(tmp_path)).get(key) == {"energy_j": 1.5}
+    (tmp_path / f"{key}.json").write_text("{not json")
+    assert cache.get(key) is None
+    assert not list(tmp_path.glob("*.tmp"))
+
+def test_disabled_cache_never_hits():
+    cache = ResultCache("")
+    cache.put("k", {}, {"energy_j": 1.0})
+    assert cache.get("k") is None
+
+def test_grid_ranges_and_expansion():
+    grid = parse_grid(["lif_theta=40:60:10;t_inh=5,10", "beta=2"])
+    assert grid == {"lif_theta": [40.0, 50.0, 60.0], "t_inh": [5, 10], "beta": [2.0]}
+    assert len(expand(grid)) == 6
+    with pytest.raises(ValueError):
+        parse_grid(["unknown=1"])
+
+def test_sweep_serves_cached_points_without_simulating(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    points = [{"beta": 1.5}, {"beta": 2.0}]
+    for point, energy in zip(points, (1.0, 2.0)):
+        config = {**BASE, **point}
+        cache.put(config_key(config), config, {"energy_j": energy})
+    rows, simulated = sweep(BASE, points, cache, progress=False)
+    assert simulated == 0
+    assert [(r["beta"], r["energy_j"], r["cached"]) for r in rows] == [(1.5, 1.0, True), (2.0, 2.0, True)]
+
+def test_sweep_simulates_misses_once(tmp_path):
+    pytest.importorskip("numpy")
+    cache = ResultCache(str(tmp_path))
+    points = [{"beta": 2.0}]
+    rows, simulated = sweep(BASE, points, cache, workers=1, progress=False)
+    assert simulated == 1 and rows[0]["cached"] is False
+    again, simulated = sweep(BASE, points, cache, workers=1, progress=False)
+    assert simulated == 0 and again[0]["cached"] is True
+    assert again[0]["energy_j"] == rows[0]["energy_j"]